@@ -0,0 +1,551 @@
+"""Offline performance benchmarks on a synthetic model.
+
+The benchmark builds a tiny Transformer with random weights using CTranslate2's
+model spec API, along with a SentencePiece model trained on a synthetic corpus,
+so it runs without network access or a Hugging Face download. Translations are
+meaningless, but the amount of work per token matches a real model of the same
+shape, which is what matters to catch performance regressions.
+
+Usage:
+    quickmt-benchmark --output results.json
+    quickmt-benchmark --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from difflib import SequenceMatcher
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import ctranslate2
+import numpy as np
+import sentencepiece
+from blingfire import text_to_sentences
+from ctranslate2.specs import TransformerSpec, model_spec
+from pydantic import validate_call
+
+from quickmt.translator import Translator, TranslatorABC
+from quickmt.vmap import build_vmap, save_vmap
+
+# Input length distributions, as (min words, max words) per sentence
+LENGTH_DISTRIBUTIONS: Dict[str, Tuple[int, int]] = {
+    "short": (3, 8),
+    "medium": (10, 25),
+    "long": (30, 60),
+    "mixed": (3, 60),
+}
+
+
+def synthetic_words(num_words: int = 500, seed: int = 0) -> List[str]:
+    """Generate a vocabulary of pronounceable pseudo-words."""
+    rng = random.Random(seed)
+    onsets = ["b", "d", "f", "g", "k", "l", "m", "n", "p", "r", "s", "t", "v", "z"]
+    vowels = ["a", "e", "i", "o", "u", "ai", "ou"]
+    words = set()
+    while len(words) < num_words:
+        syllables = rng.randint(1, 4)
+        words.add(
+            "".join(rng.choice(onsets) + rng.choice(vowels) for _ in range(syllables))
+        )
+    return sorted(words)
+
+
+def synthetic_sentences(
+    num_sentences: int,
+    distribution: str = "mixed",
+    words: Optional[List[str]] = None,
+    seed: int = 0,
+) -> List[str]:
+    """Generate random sentences with a length distribution from `LENGTH_DISTRIBUTIONS`."""
+    rng = random.Random(seed)
+    words = words or synthetic_words(seed=seed)
+    min_words, max_words = LENGTH_DISTRIBUTIONS[distribution]
+    sentences = []
+    for _ in range(num_sentences):
+        length = rng.randint(min_words, max_words)
+        sentence = " ".join(rng.choice(words) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+    return sentences
+
+
+def build_synthetic_model(
+    output_dir: str,
+    num_layers: int = 2,
+    num_heads: int = 4,
+    d_model: int = 256,
+    ffn_dim: int = 1024,
+    vocab_size: int = 1000,
+    seed: int = 0,
+) -> Path:
+    """Build a quickmt model folder with random weights.
+
+    The folder holds a CTranslate2 Transformer and a joint SentencePiece model,
+    so it can be loaded with `Translator(output_dir)`.
+
+    Args:
+        output_dir: Folder to write the model to.
+        num_layers: Number of encoder and decoder layers.
+        num_heads: Number of attention heads.
+        d_model: Model dimension.
+        ffn_dim: Feed-forward dimension.
+        vocab_size: SentencePiece vocabulary size (upper bound).
+        seed: Random seed for the corpus and the weights.
+
+    Returns:
+        Path to the model folder.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    corpus_path = output_dir / "corpus.txt"
+    corpus_path.write_text("\n".join(synthetic_sentences(5000, seed=seed)) + "\n")
+    sentencepiece.SentencePieceTrainer.train(
+        input=str(corpus_path),
+        model_prefix=str(output_dir / "joint.spm"),
+        vocab_size=vocab_size,
+        hard_vocab_limit=False,
+        unk_id=0,
+        bos_id=1,
+        eos_id=2,
+        pad_id=-1,
+        minloglevel=2,
+    )
+    corpus_path.unlink()
+    tokenizer = sentencepiece.SentencePieceProcessor(
+        model_file=str(output_dir / "joint.spm.model")
+    )
+    vocabulary = [tokenizer.id_to_piece(i) for i in range(tokenizer.get_piece_size())]
+
+    rng = np.random.default_rng(seed)
+    shapes = {
+        "embeddings": (len(vocabulary), d_model),
+        "projection": (len(vocabulary), d_model),
+        "ffn/linear_0": (ffn_dim, d_model),
+        "ffn/linear_1": (d_model, ffn_dim),
+        # Fused query/key/value projection
+        "self_attention/linear_0": (3 * d_model, d_model),
+        # Fused key/value projection of the encoder-decoder attention
+        "/attention/linear_1": (2 * d_model, d_model),
+    }
+
+    def set_weight(spec, name, value):
+        if value is not None:
+            return
+        scope, attr = model_spec._parent_scope(name)
+        if attr == "gamma":
+            weight = np.ones(d_model, dtype=np.float32)
+        elif attr == "beta" or attr == "bias":
+            weight = np.zeros(d_model, dtype=np.float32)
+        else:
+            shape = next(
+                (shape for key, shape in shapes.items() if key in scope),
+                (d_model, d_model),
+            )
+            weight = rng.normal(0, 0.02, shape).astype(np.float32)
+        setattr(spec, attr, weight)
+
+    spec = TransformerSpec.from_config(num_layers, num_heads)
+    model_spec.visit_spec(spec, set_weight)
+    spec.register_source_vocabulary(vocabulary)
+    spec.register_target_vocabulary(vocabulary)
+    spec.validate()
+    spec.optimize()
+    spec.save(str(output_dir))
+    return output_dir
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def benchmark_translation(
+    translator: Translator,
+    sentences: List[str],
+    batch_size: int,
+    beam_size: int,
+    max_decoding_length: int = 64,
+    latency_samples: int = 20,
+) -> Dict[str, float]:
+    """Measure throughput of a large call and latency of single-sentence calls."""
+    translator.counters.clear()
+    start = perf_counter()
+    translator(
+        sentences,
+        max_batch_size=batch_size,
+        beam_size=beam_size,
+        max_decoding_length=max_decoding_length,
+    )
+    elapsed = perf_counter() - start
+    target_tokens = translator.counters["target_tokens"]
+
+    latencies = []
+    for sentence in sentences[:latency_samples]:
+        start = perf_counter()
+        translator(
+            sentence, beam_size=beam_size, max_decoding_length=max_decoding_length
+        )
+        latencies.append(perf_counter() - start)
+
+    return {
+        "sentences_per_sec": len(sentences) / elapsed,
+        "tokens_per_sec": target_tokens / elapsed,
+        "latency_p50_ms": 1000 * median(latencies),
+        "latency_p95_ms": 1000 * _percentile(latencies, 0.95),
+    }
+
+
+@validate_call
+def _baseline_sentence_split(src: List[str]):
+    """Former `TranslatorABC._sentence_split`, kept as the baseline of `benchmark_split_join`"""
+    input_ids = []
+    paragraph_ids = []
+    sentences = []
+    for idx, i in enumerate(src):
+        for paragraph, j in enumerate(i.splitlines(keepends=True)):
+            sents = text_to_sentences(j).splitlines()
+            for sent in sents:
+                stripped_sent = sent.strip()
+                if len(stripped_sent) > 0:
+                    if (
+                        len(stripped_sent) < 5
+                        and len(paragraph_ids) > 0
+                        and paragraph == paragraph_ids[-1]
+                        and len(input_ids) > 0
+                        and input_ids[-1] == idx
+                    ):
+                        sentences[-1] += " " + stripped_sent
+                    else:
+                        input_ids.append(idx)
+                        paragraph_ids.append(paragraph)
+                        sentences.append(stripped_sent)
+
+    return input_ids, paragraph_ids, sentences
+
+
+@validate_call
+def _baseline_sentence_join(
+    input_ids: List[int],
+    paragraph_ids: List[int],
+    sentences: List[str],
+    paragraph_join_str: str = "\n",
+    sent_join_str: str = " ",
+    length: Optional[int] = None,
+):
+    """Former `TranslatorABC._sentence_join`, quadratic in the length of each input"""
+    if not input_ids:
+        return [""] * (length or 0)
+
+    target_len = length if length is not None else (max(input_ids) + 1)
+    ret = [""] * target_len
+    last_paragraph = 0
+    for idx, paragraph, text in zip(input_ids, paragraph_ids, sentences):
+        if len(ret[idx]) > 0:
+            if paragraph == last_paragraph:
+                ret[idx] += sent_join_str + text
+            else:
+                ret[idx] += paragraph_join_str + text
+            last_paragraph = paragraph
+        else:
+            ret[idx] = text
+            last_paragraph = paragraph
+    return ret
+
+
+def benchmark_split_join(num_sentences: int = 100_000) -> Dict[str, float]:
+    """Measure sentence splitting and joining on large inputs.
+
+    `split_*` and `join_*` metrics time the `_split_sentences` and `_join_sentences`
+    used by the translation pipeline, on inputs of 10 paragraphs of 10 sentences.
+    `document_join_*` joins a single input holding all the sentences. `baseline_*`
+    metrics time the list based splitter and `+=` joiner they replaced on the same
+    inputs, and `*_speedup` how many times faster the current ones are.
+    """
+    sentences = synthetic_sentences(num_sentences, distribution="short")
+    # Paragraphs of 10 sentences, inputs of 10 paragraphs
+    paragraphs = [" ".join(sentences[i : i + 10]) for i in range(0, len(sentences), 10)]
+    src = ["\n".join(paragraphs[i : i + 10]) for i in range(0, len(paragraphs), 10)]
+
+    metrics = {}
+    for prefix, split, join in (
+        ("", TranslatorABC._split_sentences, TranslatorABC._join_sentences),
+        ("baseline_", _baseline_sentence_split, _baseline_sentence_join),
+    ):
+        start = perf_counter()
+        input_ids, paragraph_ids, split_sentences = split(src)
+        split_time = perf_counter() - start
+
+        start = perf_counter()
+        join(input_ids, paragraph_ids, split_sentences, length=len(src))
+        join_time = perf_counter() - start
+
+        # All sentences in one input
+        document_ids = [0] * len(split_sentences)
+        start = perf_counter()
+        join(document_ids, list(paragraph_ids), split_sentences)
+        document_join_time = perf_counter() - start
+
+        count = len(split_sentences)
+        metrics[f"{prefix}split_sentences_per_sec"] = count / split_time
+        metrics[f"{prefix}join_sentences_per_sec"] = count / join_time
+        metrics[f"{prefix}document_join_sentences_per_sec"] = count / document_join_time
+
+    for metric in ("split", "join", "document_join"):
+        metrics[f"{metric}_speedup"] = (
+            metrics[f"{metric}_sentences_per_sec"]
+            / metrics[f"baseline_{metric}_sentences_per_sec"]
+        )
+    return metrics
+
+
+def benchmark_vmap(
+    model_dir: str,
+    sentences: List[str],
+    batch_size: int = 32,
+    beam_size: int = 2,
+    max_decoding_length: int = 64,
+    inter_threads: int = 1,
+    intra_threads: int = 4,
+) -> Dict[str, float]:
+    """Compare decoding with and without the model's vocabulary map (vmap.txt).
+
+    Returns:
+        Throughput with and without the vocabulary map, the speedup, and how close
+        the translations are: the share of identical translations and the mean
+        token-level similarity (difflib ratio) to the unrestricted translations.
+    """
+    metrics = {}
+    translations = {}
+    for use_vmap in (False, True):
+        translator = Translator(
+            model_dir,
+            inter_threads=inter_threads,
+            intra_threads=intra_threads,
+            use_vmap=use_vmap,
+        )
+        start = perf_counter()
+        translations[use_vmap] = translator(
+            sentences,
+            max_batch_size=batch_size,
+            beam_size=beam_size,
+            max_decoding_length=max_decoding_length,
+        )
+        elapsed = perf_counter() - start
+        translator.unload()
+        key = "sentences_per_sec" if use_vmap else "full_vocab_sentences_per_sec"
+        metrics[key] = len(sentences) / elapsed
+
+    pairs = list(zip(translations[False], translations[True]))
+    metrics["speedup"] = (
+        metrics["sentences_per_sec"] / metrics["full_vocab_sentences_per_sec"]
+    )
+    metrics["exact_match"] = sum(a == b for a, b in pairs) / len(pairs)
+    metrics["similarity"] = sum(
+        SequenceMatcher(None, a.split(), b.split()).ratio() for a, b in pairs
+    ) / len(pairs)
+    return metrics
+
+
+def run_benchmark(
+    model_dir: str,
+    batch_sizes: Sequence[int] = (1, 8, 32),
+    beam_sizes: Sequence[int] = (1, 4),
+    threads: Sequence[Tuple[int, int]] = ((1, 4),),
+    distributions: Sequence[str] = ("short", "mixed", "long"),
+    num_sentences: int = 256,
+    split_join_sentences: int = 100_000,
+    max_decoding_length: int = 64,
+    vmap: bool = False,
+) -> Dict:
+    """Run the benchmark grid against a model folder.
+
+    Args:
+        model_dir: Model folder, e.g. from `build_synthetic_model`.
+        batch_sizes: Values of `max_batch_size` to measure.
+        beam_sizes: Values of `beam_size` to measure.
+        threads: (inter_threads, intra_threads) pairs to measure.
+        distributions: Input length distributions, see `LENGTH_DISTRIBUTIONS`.
+        num_sentences: Number of sentences per throughput measurement.
+        split_join_sentences: Number of sentences for the split/join measurement.
+            0 to skip it.
+        max_decoding_length: Maximum translation length. Random weights rarely
+            produce an end of sentence, so this sets the output length.
+        vmap: Also compare decoding with and without the model's vmap.txt, for
+            each distribution with the largest batch and beam sizes.
+
+    Returns:
+        Dict with environment metadata and a list of results, each with a
+        unique `name` and its `metrics`.
+    """
+    results = []
+    for inter_threads, intra_threads in threads:
+        translator = Translator(
+            model_dir, inter_threads=inter_threads, intra_threads=intra_threads
+        )
+        for distribution in distributions:
+            sentences = synthetic_sentences(num_sentences, distribution, seed=1)
+            for batch_size in batch_sizes:
+                for beam_size in beam_sizes:
+                    metrics = benchmark_translation(
+                        translator,
+                        sentences,
+                        batch_size=batch_size,
+                        beam_size=beam_size,
+                        max_decoding_length=max_decoding_length,
+                    )
+                    results.append(
+                        {
+                            "name": f"translate/{distribution}/batch={batch_size}/beam={beam_size}/threads={inter_threads}x{intra_threads}",
+                            "metrics": metrics,
+                        }
+                    )
+        translator.unload()
+
+    if vmap:
+        inter_threads, intra_threads = threads[0]
+        for distribution in distributions:
+            results.append(
+                {
+                    "name": f"vmap/{distribution}/batch={max(batch_sizes)}/beam={max(beam_sizes)}/threads={inter_threads}x{intra_threads}",
+                    "metrics": benchmark_vmap(
+                        model_dir,
+                        synthetic_sentences(num_sentences, distribution, seed=1),
+                        batch_size=max(batch_sizes),
+                        beam_size=max(beam_sizes),
+                        max_decoding_length=max_decoding_length,
+                        inter_threads=inter_threads,
+                        intra_threads=intra_threads,
+                    ),
+                }
+            )
+
+    if split_join_sentences:
+        results.append(
+            {
+                "name": f"split_join/sentences={split_join_sentences}",
+                "metrics": benchmark_split_join(split_join_sentences),
+            }
+        )
+
+    return {
+        "metadata": {
+            "ctranslate2": ctranslate2.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float = 0.1) -> List[str]:
+    """Compare benchmark results against a baseline.
+
+    Metrics ending in `_per_sec` are better when higher, `_ms` metrics are better
+    when lower. Results missing from either side are ignored.
+
+    Args:
+        current: Output of `run_benchmark`.
+        baseline: Output of an earlier `run_benchmark`.
+        tolerance: Relative change allowed before a metric counts as a regression.
+
+    Returns:
+        Description of each regression.
+    """
+    baseline_metrics = {r["name"]: r["metrics"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        for metric, value in result["metrics"].items():
+            reference = baseline_metrics.get(result["name"], {}).get(metric)
+            if not reference:
+                continue
+            change = (value - reference) / reference
+            if metric.endswith("_ms"):
+                change = -change
+            if change < -tolerance:
+                regressions.append(
+                    f"{result['name']} {metric}: {reference:.4g} -> {value:.4g} ({change:+.1%})"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for the quickmt-benchmark CLI."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", default="benchmark.json", help="Results JSON file")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--model-dir", help="Use this model instead of a synthetic one")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--beam-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument(
+        "--threads",
+        nargs="+",
+        default=["1x4"],
+        help="inter_threads x intra_threads pairs, e.g. 1x4 2x2",
+    )
+    parser.add_argument(
+        "--distributions",
+        nargs="+",
+        default=["short", "mixed", "long"],
+        choices=sorted(LENGTH_DISTRIBUTIONS),
+    )
+    parser.add_argument("--num-sentences", type=int, default=256)
+    parser.add_argument("--split-join-sentences", type=int, default=100_000)
+    parser.add_argument(
+        "--vmap",
+        action="store_true",
+        help="Compare decoding with and without a vocabulary map (built for the synthetic model, see quickmt-vmap otherwise)",
+    )
+    args = parser.parse_args(argv)
+    if args.vmap and args.model_dir and not Path(args.model_dir, "vmap.txt").exists():
+        parser.error(f"No vmap.txt in {args.model_dir}, create one with quickmt-vmap")
+
+    threads = [tuple(int(n) for n in pair.split("x")) for pair in args.threads]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = args.model_dir
+        if model_dir is None:
+            model_dir = build_synthetic_model(tmp_dir)
+            if args.vmap:
+                vmap = build_vmap(
+                    Translator(model_dir),
+                    synthetic_sentences(2000, seed=2),
+                    max_decoding_length=16,
+                )
+                save_vmap(vmap, model_dir / "vmap.txt")
+        results = run_benchmark(
+            str(model_dir),
+            batch_sizes=args.batch_sizes,
+            beam_sizes=args.beam_sizes,
+            threads=threads,
+            distributions=args.distributions,
+            num_sentences=args.num_sentences,
+            split_join_sentences=args.split_join_sentences,
+            vmap=args.vmap,
+        )
+
+    with open(args.output, "wt") as myfile:
+        json.dump(results, myfile, indent=2)
+    for result in results["results"]:
+        metrics = ", ".join(f"{k}={v:.4g}" for k, v in result["metrics"].items())
+        print(f"{result['name']}: {metrics}")
+
+    if args.baseline:
+        with open(args.baseline, "rt") as myfile:
+            regressions = compare(results, json.load(myfile), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Multi-process bulk translation of large corpora.
+
+A single `Translator` spends a large share of its time in pure-Python stages
+(sentence splitting, SentencePiece and joining) that hold the GIL. For bulk jobs
+the input is sharded in chunks across worker processes, each with its own
+`Translator` and its own share of the machine's threads, and the translated
+chunks are merged back in input order.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from huggingface_hub import snapshot_download
+
+from quickmt.translator import Translator
+
+# Global translator instance for process pool workers
+_translator: Optional[Translator] = None
+
+
+def init_worker(
+    model_path: str,
+    inter_threads: int = 1,
+    intra_threads: int = 0,
+    translator_kwargs: Optional[dict] = None,
+):
+    """Initialize the global translator instance for a worker process."""
+    global _translator
+    _translator = Translator(
+        model_path,
+        inter_threads=inter_threads,
+        intra_threads=intra_threads,
+        **(translator_kwargs or {}),
+    )
+
+
+def translate_worker(src: List[str], kwargs: dict) -> Tuple[List[str], Dict]:
+    """Translate one chunk of lines in a worker process.
+
+    Returns:
+        The translations and the worker's statistics for this chunk.
+    """
+    source_tokens = _translator.counters["source_tokens"]
+    target_tokens = _translator.counters["target_tokens"]
+    start = perf_counter()
+    translations = _translator(src, **kwargs)
+    return translations, {
+        "pid": os.getpid(),
+        "lines": len(src),
+        "source_tokens": _translator.counters["source_tokens"] - source_tokens,
+        "target_tokens": _translator.counters["target_tokens"] - target_tokens,
+        "busy_time": perf_counter() - start,
+    }
+
+
+class BulkTranslator:
+    """Translate large inputs by sharding them across worker processes.
+
+    Each worker loads its own `Translator`. Chunks of `chunk_size` lines are
+    dispatched to the workers and their translations are yielded in the original
+    order, with at most `max_pending` chunks in flight so memory stays bounded.
+
+    Example:
+        with BulkTranslator("quickmt/quickmt-fr-en", num_workers=4) as bulk:
+            stats = bulk.translate_file("corpus.fr", "corpus.en", beam_size=2)
+            print(stats["lines_per_sec"])
+    """
+
+    def __init__(
+        self,
+        model_path: Union[str, Path],
+        num_workers: int = 2,
+        inter_threads: int = 1,
+        intra_threads: Optional[int] = None,
+        chunk_size: int = 256,
+        max_pending: Optional[int] = None,
+        **kwargs,
+    ):
+        """Start the worker processes.
+
+        Args:
+            model_path: Quickmt Model ID or path to quickmt model folder.
+            num_workers: Number of worker processes.
+            inter_threads: Number of simultaneous translations in each worker.
+            intra_threads: Number of threads for each translation in each worker.
+                Defaults to an even split of the machine's cores across workers.
+            chunk_size: Number of lines sent to a worker at a time.
+            max_pending: Maximum number of chunks in flight. Defaults to twice the
+                number of workers.
+            **kwargs: Other `Translator` arguments (device, compute_type, ...).
+        """
+        # Download once in the main process rather than once per worker
+        if not Path(model_path).exists():
+            model_path = snapshot_download(
+                repo_id=str(model_path),
+                ignore_patterns=["eole-model/*", "eole_model/*"],
+            )
+
+        if intra_threads is None:
+            intra_threads = max(
+                1, (os.cpu_count() or 1) // (num_workers * inter_threads)
+            )
+
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * num_workers
+        self.stats: Dict = {}
+        # CTranslate2 starts its own threads, so workers must not be forked
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(str(model_path), inter_threads, intra_threads, kwargs),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown()
+
+    def translate_iterable(self, src: Iterable[str], **kwargs) -> Iterator[str]:
+        """Translate an iterable of strings, yielding translations in input order.
+
+        Statistics for the run are kept up to date in `self.stats`: totals,
+        lines/sec and tokens/sec (decoded target tokens) overall, and the same
+        per worker process based on its busy time.
+
+        Args:
+            src: Strings to translate, e.g. the lines of a file.
+            **kwargs: Translation args, see `Translator.__call__`.
+
+        Yields:
+            One translation per input string.
+        """
+        self._reset_stats()
+        src = iter(src)
+        pending = deque()
+        start = perf_counter()
+        while True:
+            while len(pending) < self.max_pending:
+                chunk = list(islice(src, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append(self.executor.submit(translate_worker, chunk, kwargs))
+
+            if not pending:
+                break
+
+            translations, chunk_stats = pending.popleft().result()
+            self._update_stats(chunk_stats, perf_counter() - start)
+            yield from translations
+
+    def translate_file(self, input_file: str, output_file: str, **kwargs) -> Dict:
+        """Translate a plain-text file, one output line per input line.
+
+        Args:
+            input_file: Path to plain-text file to translate.
+            output_file: Path to write translations to.
+            **kwargs: Translation args, see `Translator.__call__`.
+
+        Returns:
+            Statistics for the run, see `self.stats`.
+        """
+        with open(input_file, "rt") as infile, open(output_file, "wt") as outfile:
+            lines = (i.strip() for i in infile)
+            for translation in self.translate_iterable(lines, **kwargs):
+                outfile.write(translation.replace("\n", "\t") + "\n")
+        return self.stats
+
+    def _reset_stats(self):
+        self.stats = {
+            "lines": 0,
+            "source_tokens": 0,
+            "target_tokens": 0,
+            "elapsed": 0.0,
+            "lines_per_sec": 0.0,
+            "tokens_per_sec": 0.0,
+            "workers": {},
+        }
+
+    def _update_stats(self, chunk_stats: Dict, elapsed: float):
+        worker = self.stats["workers"].setdefault(
+            chunk_stats["pid"],
+            {"lines": 0, "source_tokens": 0, "target_tokens": 0, "busy_time": 0.0},
+        )
+        for key in ("lines", "source_tokens", "target_tokens"):
+            self.stats[key] += chunk_stats[key]
+            worker[key] += chunk_stats[key]
+        worker["busy_time"] += chunk_stats["busy_time"]
+        worker["lines_per_sec"] = worker["lines"] / max(worker["busy_time"], 1e-9)
+        worker["tokens_per_sec"] = worker["target_tokens"] / max(
+            worker["busy_time"], 1e-9
+        )
+
+        self.stats["elapsed"] = elapsed
+        self.stats["lines_per_sec"] = self.stats["lines"] / max(elapsed, 1e-9)
+        self.stats["tokens_per_sec"] = self.stats["target_tokens"] / max(elapsed, 1e-9)
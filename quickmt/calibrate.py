@@ -0,0 +1,281 @@
+"""Pick the fastest thread split, batch size and compute type for a model.
+
+The best values of `inter_threads`, `intra_threads`, `max_batch_size` and
+`compute_type` depend on the core count, the instruction set and the model size.
+Calibration times a short workload across a grid of these settings and
+persists the fastest configuration, by target tokens decoded per second, per
+model and device, so it only runs once per machine.
+
+Usage:
+    quickmt-calibrate quickmt/quickmt-fr-en
+    quickmt-calibrate /path/to/model --compute-types int8 float32 --batch-sizes 16 32
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import ctranslate2
+from huggingface_hub import snapshot_download
+
+from quickmt.benchmark import synthetic_sentences
+from quickmt.translator import Translator
+
+logger = logging.getLogger(__name__)
+
+# Candidate compute types, filtered by what the device supports
+COMPUTE_TYPES = {
+    "cpu": ("int8", "int16", "float32"),
+    "cuda": ("int8_float16", "float16", "bfloat16", "float32"),
+}
+
+
+def _resolve_device(device: str) -> str:
+    if device == "auto":
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    return device
+
+
+def default_compute_types(device: str = "cpu") -> List[str]:
+    """Candidate compute types supported by the device."""
+    device = _resolve_device(device)
+    supported = ctranslate2.get_supported_compute_types(device)
+    return [i for i in COMPUTE_TYPES[device] if i in supported]
+
+
+def default_thread_splits(cpu_count: Optional[int] = None) -> List[Tuple[int, int]]:
+    """(inter_threads, intra_threads) pairs that use all cores."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return [(inter, cpu_count // inter) for inter in (1, 2, 4) if inter <= cpu_count]
+
+
+def machine_info(device: str = "cpu") -> Dict:
+    """Describe the machine, so calibrations are not reused on other hardware."""
+    device = _resolve_device(device)
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "cuda_devices": ctranslate2.get_cuda_device_count(),
+        "compute_types": sorted(ctranslate2.get_supported_compute_types(device)),
+        "ctranslate2": ctranslate2.__version__,
+    }
+
+
+def calibration_path(
+    model_path: str, device: str = "cpu", cache_dir: Optional[str] = None
+) -> Path:
+    """Location of the persisted calibration for a model and device."""
+    if cache_dir is None:
+        cache_dir = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache"))
+        cache_dir = cache_dir / "quickmt" / "calibration"
+    model_path = Path(model_path).resolve()
+    digest = hashlib.sha1(str(model_path).encode()).hexdigest()[:12]
+    return (
+        Path(cache_dir) / f"{model_path.name}-{digest}-{_resolve_device(device)}.json"
+    )
+
+
+def calibrate(
+    model_path: str,
+    device: str = "cpu",
+    compute_types: Optional[Sequence[str]] = None,
+    thread_splits: Optional[Sequence[Tuple[int, int]]] = None,
+    batch_sizes: Sequence[int] = (8, 16, 32, 64),
+    sentences: Optional[List[str]] = None,
+    num_sentences: int = 128,
+    beam_size: int = 2,
+    max_decoding_length: int = 256,
+) -> Dict:
+    """Time a workload across a grid of settings and pick the fastest.
+
+    Args:
+        model_path: Path to quickmt model folder.
+        device: Device to calibrate, 'cpu', 'cuda' or 'auto'.
+        compute_types: Compute types to try. Defaults to `default_compute_types`.
+            Quantized types can lower quality, leave them out if that matters.
+        thread_splits: (inter_threads, intra_threads) pairs to try. Defaults to
+            `default_thread_splits`.
+        batch_sizes: Values of `max_batch_size` to try.
+        sentences: Workload to translate. Defaults to synthetic sentences of
+            mixed lengths.
+        num_sentences: Number of synthetic sentences, if `sentences` is None.
+        beam_size: Beam size used for the workload.
+        max_decoding_length: Maximum translation length used for the workload.
+
+    Returns:
+        Dict with the `best` configuration (compute_type, inter_threads,
+        intra_threads, max_batch_size), the one decoding the most target tokens
+        per second, the timing of every configuration in `results` and the
+        `machine` it was measured on.
+    """
+    compute_types = compute_types or default_compute_types(device)
+    thread_splits = thread_splits or default_thread_splits()
+    sentences = sentences or synthetic_sentences(num_sentences, "mixed")
+
+    results = []
+    for compute_type in compute_types:
+        for inter_threads, intra_threads in thread_splits:
+            translator = Translator(
+                model_path,
+                device=device,
+                compute_type=compute_type,
+                inter_threads=inter_threads,
+                intra_threads=intra_threads,
+            )
+            # Warm up
+            translator(sentences[:4], beam_size=beam_size, max_decoding_length=8)
+            for max_batch_size in batch_sizes:
+                target_tokens = translator.counters["target_tokens"]
+                start = perf_counter()
+                translator(
+                    sentences,
+                    max_batch_size=max_batch_size,
+                    beam_size=beam_size,
+                    max_decoding_length=max_decoding_length,
+                )
+                elapsed = perf_counter() - start
+                target_tokens = translator.counters["target_tokens"] - target_tokens
+                result = {
+                    "compute_type": compute_type,
+                    "inter_threads": inter_threads,
+                    "intra_threads": intra_threads,
+                    "max_batch_size": max_batch_size,
+                    "sentences_per_sec": len(sentences) / elapsed,
+                    "tokens_per_sec": target_tokens / elapsed,
+                }
+                logger.info(f"Calibration: {result}")
+                results.append(result)
+            translator.unload()
+
+    # Compute types translate the workload to outputs of different lengths, so
+    # configurations are compared by decoded tokens rather than sentences per second
+    best = max(results, key=lambda x: x["tokens_per_sec"])
+    return {
+        "model_path": str(model_path),
+        "device": _resolve_device(device),
+        "machine": machine_info(device),
+        "best": {
+            k: v
+            for k, v in best.items()
+            if k not in ("sentences_per_sec", "tokens_per_sec")
+        },
+        "results": results,
+    }
+
+
+def save_calibration(calibration: Dict, path: Path):
+    """Write a calibration to a JSON file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wt") as myfile:
+        json.dump(calibration, myfile, indent=2)
+
+
+def load_calibration(
+    model_path: str, device: str = "cpu", cache_dir: Optional[str] = None
+) -> Optional[Dict]:
+    """Load the persisted calibration for a model.
+
+    Returns:
+        The calibration, or None if there is none for this machine.
+    """
+    path = calibration_path(model_path, device, cache_dir)
+    if not path.exists():
+        return None
+    with open(path, "rt") as myfile:
+        calibration = json.load(myfile)
+    if calibration.get("machine") != machine_info(device):
+        logger.info(f"Ignoring calibration from other hardware: {path}")
+        return None
+    return calibration
+
+
+def load_or_calibrate(
+    model_path: str, device: str = "cpu", cache_dir: Optional[str] = None, **kwargs
+) -> Dict:
+    """Load the persisted calibration for a model, calibrating it first if needed.
+
+    Args:
+        model_path: Path to quickmt model folder.
+        device: Device to calibrate, 'cpu', 'cuda' or 'auto'.
+        cache_dir: Folder of persisted calibrations. Defaults to ~/.cache/quickmt/calibration.
+        **kwargs: Other `calibrate` args.
+
+    Returns:
+        The calibration, see `calibrate`.
+    """
+    calibration = load_calibration(model_path, device, cache_dir)
+    if calibration is None:
+        logger.info(f"Calibrating {model_path} on {device}")
+        calibration = calibrate(model_path, device=device, **kwargs)
+        save_calibration(calibration, calibration_path(model_path, device, cache_dir))
+    return calibration
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for the quickmt-calibrate CLI."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "model", help="Quickmt Model ID or path to quickmt model folder"
+    )
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--compute-types", nargs="+")
+    parser.add_argument(
+        "--threads",
+        nargs="+",
+        help="inter_threads x intra_threads pairs, e.g. 1x4 2x2",
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--beam-size", type=int, default=2)
+    parser.add_argument("--num-sentences", type=int, default=128)
+    parser.add_argument(
+        "--input", help="Plain-text file of sentences to use as the workload"
+    )
+    parser.add_argument("--cache-dir", help="Folder of persisted calibrations")
+    args = parser.parse_args(argv)
+
+    model_path = args.model
+    if not Path(model_path).exists():
+        model_path = snapshot_download(
+            repo_id=model_path, ignore_patterns=["eole-model/*", "eole_model/*"]
+        )
+
+    sentences = None
+    if args.input:
+        with open(args.input, "rt") as myfile:
+            sentences = [i.strip() for i in myfile if i.strip()]
+    thread_splits = None
+    if args.threads:
+        thread_splits = [tuple(int(n) for n in i.split("x")) for i in args.threads]
+
+    calibration = calibrate(
+        model_path,
+        device=args.device,
+        compute_types=args.compute_types,
+        thread_splits=thread_splits,
+        batch_sizes=args.batch_sizes,
+        sentences=sentences,
+        num_sentences=args.num_sentences,
+        beam_size=args.beam_size,
+    )
+    path = calibration_path(model_path, args.device, args.cache_dir)
+    save_calibration(calibration, path)
+
+    for result in sorted(calibration["results"], key=lambda x: -x["tokens_per_sec"]):
+        print(
+            f"{result['compute_type']:>12} threads={result['inter_threads']}x{result['intra_threads']}"
+            f" batch={result['max_batch_size']:<4} {result['tokens_per_sec']:.1f} tokens/sec"
+            f" {result['sentences_per_sec']:.1f} sentences/sec"
+        )
+    print(f"Best: {calibration['best']}")
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
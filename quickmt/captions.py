@@ -0,0 +1,186 @@
+"""Translate live captions, text that arrives as a growing stream of fragments.
+
+Speech recognition sends its transcript a few words at a time. `SentenceStream` collects
+the fragments and finds the sentence boundaries that later text can no longer move: a
+boundary found by Blingfire is final once a complete word follows it, and a line break ends
+a sentence straight away. An unfinished sentence that grows past `max_chars` is cut at its
+last clause or word boundary, which bounds the latency of each caption.
+
+`CaptionTranslator` translates each final sentence once, as soon as it is final, instead of
+the whole running transcript. It can also translate the unfinished end of the transcript
+on every fragment, as a provisional caption that is replaced as more text arrives.
+
+Usage:
+    captions = CaptionTranslator(translator, provisional=True)
+    for fragment in transcript:
+        update = captions.feed(fragment)
+        show(update["translations"], update["provisional"])
+    captions.flush()
+"""
+
+import re
+from typing import Callable, List, Optional
+
+from blingfire import text_to_sentences_and_offsets
+
+# Ends of complete words, and ends of clauses where over-long sentences are cut
+_WORD_END_RE = re.compile(r"(?<=\S)\s")
+_CLAUSE_END_RE = re.compile(r"[,;:](?=\s)|\s(?=[—–]\s)")
+
+
+def _sentence_offsets(text: str) -> List[tuple]:
+    if not text.strip():
+        return []
+    return text_to_sentences_and_offsets(text)[1]
+
+
+def _sentences(text: str) -> List[str]:
+    return [text[start:end].strip() for start, end in _sentence_offsets(text)]
+
+
+def _complete_words(text: str) -> int:
+    """Number of words of `text`, not counting a last word that may still grow"""
+    words = len(text.split())
+    if words and not text[-1].isspace():
+        words -= 1
+    return words
+
+
+class SentenceStream:
+    """Split a stream of text fragments into sentences as soon as they are final
+
+    Attributes:
+        pending (str): Text of the unfinished sentence(s) at the end of the stream
+    """
+
+    def __init__(self, lookahead_words: int = 1, max_chars: int = 200):
+        """Create an empty stream
+
+        Args:
+            lookahead_words (int, optional): Number of complete words that must follow a sentence boundary before it is final. Defaults to 1.
+            max_chars (int, optional): Length of unfinished text above which it is cut at its last clause or word boundary. Defaults to 200.
+        """
+        self.lookahead_words = lookahead_words
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    @property
+    def pending(self) -> str:
+        return self._buffer.strip()
+
+    def feed(self, fragment: str) -> List[str]:
+        """Append a fragment to the stream
+
+        Fragments are appended as they are, so words must be separated by whitespace in the
+        fragments themselves.
+
+        Args:
+            fragment (str): Next piece of text
+
+        Returns:
+            List[str]: Sentences that became final, in order
+        """
+        self._buffer += fragment
+        final = []
+        if "\n" in self._buffer:
+            head, _, self._buffer = self._buffer.rpartition("\n")
+            final.extend(_sentences(head))
+
+        offsets = _sentence_offsets(self._buffer)
+        cut = 0
+        for (start, end), (next_start, _) in zip(offsets, offsets[1:]):
+            if _complete_words(self._buffer[next_start:]) < self.lookahead_words:
+                break
+            final.append(self._buffer[start:end].strip())
+            cut = next_start
+        self._buffer = self._buffer[cut:]
+
+        while len(self.pending) > self.max_chars:
+            sentence = self._cut()
+            if sentence is None:
+                break
+            final.append(sentence)
+        return final
+
+    def _cut(self) -> Optional[str]:
+        """Cut the unfinished text at its last clause boundary, or else its last word"""
+        text = self._buffer[: self._buffer.rstrip().rfind(" ") + 1]
+        if not text.strip():
+            # A single word longer than max_chars
+            return None
+        clauses = [m.end() for m in _CLAUSE_END_RE.finditer(text)]
+        words = [m.start() for m in _WORD_END_RE.finditer(text)]
+        end = clauses[-1] if clauses else words[-1]
+        sentence = self._buffer[:end].strip()
+        self._buffer = self._buffer[end:].lstrip()
+        return sentence
+
+    def flush(self) -> List[str]:
+        """End the stream, for example at a pause in speech
+
+        Returns:
+            List[str]: Sentences of the unfinished text
+        """
+        text, self._buffer = self._buffer, ""
+        return _sentences(text)
+
+
+class CaptionTranslator:
+    """Translate a stream of caption fragments, one final sentence at a time"""
+
+    def __init__(
+        self,
+        translator: Callable,
+        provisional: bool = False,
+        lookahead_words: int = 1,
+        max_chars: int = 200,
+        **kwargs,
+    ):
+        """Create a caption stream
+
+        Args:
+            translator (Callable): Translator, or any callable translating a list of strings
+            provisional (bool, optional): Also translate the unfinished sentence on every fragment. Defaults to False.
+            lookahead_words (int, optional): Words that must follow a sentence boundary before it is final, see `SentenceStream`. Defaults to 1.
+            max_chars (int, optional): Length of unfinished text above which it is cut, see `SentenceStream`. Defaults to 200.
+            **kwargs: Translation args, see `Translator.__call__`
+        """
+        self.translator = translator
+        self.provisional = provisional
+        self.segmenter = SentenceStream(
+            lookahead_words=lookahead_words, max_chars=max_chars
+        )
+        self.kwargs = kwargs
+
+    def feed(self, fragment: str) -> dict:
+        """Append a fragment to the captions and translate the sentences it completes
+
+        Args:
+            fragment (str): Next piece of the transcript
+
+        Returns:
+            dict: Sentences that became final (`sentences`) and their `translations`, the unfinished text (`pending`) and its translation if `provisional` is set (`provisional`, else None)
+        """
+        return self._translate(self.segmenter.feed(fragment))
+
+    def flush(self) -> dict:
+        """Translate the unfinished text as final, for example at a pause in speech
+
+        Returns:
+            dict: Same as `feed`
+        """
+        return self._translate(self.segmenter.flush())
+
+    def _translate(self, sentences: List[str]) -> dict:
+        pending = self.segmenter.pending
+        src = list(sentences)
+        if self.provisional and pending:
+            src.append(pending)
+        # Final sentences and the provisional caption are translated in one batch
+        translations = self.translator(src, **self.kwargs) if src else []
+        return {
+            "sentences": sentences,
+            "translations": translations[: len(sentences)],
+            "pending": pending,
+            "provisional": (translations[-1] if self.provisional and pending else None),
+        }
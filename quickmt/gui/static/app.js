@@ -21,6 +21,9 @@ document.addEventListener('DOMContentLoaded', () => {
     let languages = {};
     let languageNames = {};
     let activeController = null;
+    // The text box is an as-you-type session, so the server only re-translates what changed
+    const sessionId = Math.random().toString(36).slice(2);
+    let revision = 0;
 
     let settings = {
         beam_size: 2,
@@ -226,15 +229,12 @@ document.addEventListener('DOMContentLoaded', () => {
         if (activeController) activeController.abort();
         activeController = new AbortController();
         const { signal } = activeController;
+        const currentRevision = ++revision;
 
-        const lines = fullText.split('\n');
-        const translatedLines = new Array(lines.length).fill('');
         let srcLang = srcLangSelect.value || null;
         const tgtLang = tgtLangSelect.value;
 
         loader.classList.remove('hidden');
-        let completedLines = 0;
-        let totalToTranslate = lines.filter(l => l.trim()).length;
 
         try {
             // Step 1: If auto-detect mode, detect language for entire input first
@@ -262,54 +262,30 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             }
 
-            // Step 2: Translate all lines with known source language
-            const updateTgtUI = () => {
-                tgtText.value = translatedLines.join('\n');
-            };
-
-            const translateParagraph = async (line, index) => {
-                if (!line.trim()) {
-                    translatedLines[index] = line;
-                    updateTgtUI();
-                    return;
-                }
-
-                try {
-                    const response = await fetch('/api/translate', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({
-                            src: line,
-                            src_lang: srcLang,  // Now we always have a source language
-                            tgt_lang: tgtLang,
-                            ...settings
-                        }),
-                        signal
-                    });
-
-                    if (response.ok) {
-                        const data = await response.json();
-                        translatedLines[index] = data.translation;
-
-                        completedLines++;
-                        updateTgtUI();
-                        timingInfo.textContent = `Translating: ${Math.round((completedLines / totalToTranslate) * 100)}%`;
-                    }
-                } catch (e) {
-                    if (e.name !== 'AbortError') {
-                        console.error("Line translation error", e);
-                        translatedLines[index] = `[[Error: ${line}]]`;
-                    }
-                } finally {
-                    if (completedLines === totalToTranslate) {
-                        loader.classList.add('hidden');
-                        timingInfo.textContent = 'Done';
-                    }
-                }
-            };
+            // Step 2: Translate the whole text box as one session, so the server batches the
+            // changed sentences of all lines together and only re-translates what changed
+            const response = await fetch('/api/translate', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    src: fullText,
+                    src_lang: srcLang,  // Now we always have a source language
+                    tgt_lang: tgtLang,
+                    session_id: sessionId,
+                    revision: currentRevision,
+                    ...settings
+                }),
+                signal
+            });
 
-            // Fire all translation requests in parallel
-            lines.forEach((line, i) => translateParagraph(line, i));
+            if (response.ok) {
+                const data = await response.json();
+                tgtText.value = data.translation;
+                timingInfo.textContent = 'Done';
+            } else {
+                timingInfo.textContent = 'Error';
+            }
+            loader.classList.add('hidden');
 
         } catch (e) {
             if (e.name !== 'AbortError') {
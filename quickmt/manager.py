@@ -1,15 +1,17 @@
 import asyncio
 import logging
+import threading
 import time
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional
 from collections import OrderedDict
-from functools import lru_cache
+from functools import lru_cache, partial
 
 from fastapi import HTTPException
 from huggingface_hub import HfApi, snapshot_download
 from cachetools import TTLCache, cached, LRUCache
 
+from quickmt.calibrate import load_or_calibrate
 from quickmt.translator import Translator
 from quickmt.settings import settings
 
@@ -25,6 +27,8 @@ class BatchTranslator:
         compute_type: str = "default",
         inter_threads: int = 1,
         intra_threads: int = 0,
+        max_batch_size: Optional[int] = None,
+        max_decoding_length_ratio: Optional[float] = None,
     ):
         self.model_id = model_id
         self.model_path = model_path
@@ -32,6 +36,10 @@ class BatchTranslator:
         self.compute_type = compute_type
         self.inter_threads = inter_threads
         self.intra_threads = intra_threads
+        self.max_batch_size = max_batch_size or settings.max_batch_size
+        self.max_decoding_length_ratio = (
+            max_decoding_length_ratio or settings.max_decoding_length_ratio
+        )
         self.translator: Optional[Translator] = None
         self.queue: asyncio.Queue = asyncio.Queue()
         self.worker_task: Optional[asyncio.Task] = None
@@ -52,6 +60,12 @@ class BatchTranslator:
             compute_type=self.compute_type,
             inter_threads=self.inter_threads,
             intra_threads=self.intra_threads,
+            sentence_cache_size=settings.sentence_cache_size,
+            quantized_cache=settings.quantized_model_cache,
+            max_decoding_length_ratio=self.max_decoding_length_ratio,
+            max_decoding_length_offset=settings.max_decoding_length_offset,
+            use_vmap=settings.use_vmap,
+            document_cache_size=settings.document_cache_size,
         )
         self.worker_task = asyncio.create_task(self._worker())
         logger.info(f"Started translation worker for model: {self.model_id}")
@@ -69,6 +83,29 @@ class BatchTranslator:
             self.translator = None
         logger.info(f"Stopped translation worker for model: {self.model_id}")
 
+    def _settings_kwargs(self) -> Dict[str, Any]:
+        """Translation args set by the server settings rather than by requests"""
+        return dict(
+            max_batch_size=self.max_batch_size,
+            max_batch_tokens=settings.max_batch_tokens,
+            adaptive_beam_threshold=settings.adaptive_beam_threshold,
+            max_sentence_tokens=settings.max_sentence_tokens,
+            mask_placeholders=settings.mask_placeholders,
+        )
+
+    async def _run_in_executor(self, method: str, *args, **kwargs) -> Any:
+        """Call a method of the translator in the default executor, loading it if needed
+
+        Running in the executor avoids blocking the asyncio loop during inference.
+        """
+        if not self.worker_task:
+            await self.start_worker()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, partial(getattr(self.translator, method), *args, **kwargs)
+        )
+
     async def _worker(self):
         while True:
             item = await self.queue.get()
@@ -82,9 +119,9 @@ class BatchTranslator:
                 batch_texts = [src]
                 futures = [future]
 
-                # Try to grab more items up to MAX_BATCH_SIZE or timeout
+                # Try to grab more items up to max_batch_size (calibrated per model) or timeout
                 start_time = time.time()
-                while len(batch_texts) < settings.max_batch_size:
+                while len(batch_texts) < self.max_batch_size:
                     wait_time = (settings.batch_timeout_ms / 1000.0) - (
                         time.time() - start_time
                     )
@@ -112,13 +149,13 @@ class BatchTranslator:
                         break
 
                 # 2. Process batch
-                # Run in executor to avoid blocking the asyncio loop during inference
-                loop = asyncio.get_running_loop()
-                results = await loop.run_in_executor(
-                    None,
-                    lambda: self.translator(
-                        batch_texts, src_lang=src_lang, tgt_lang=tgt_lang, **kwargs
-                    ),
+                results = await self._run_in_executor(
+                    "__call__",
+                    batch_texts,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    **self._settings_kwargs(),
+                    **kwargs,
                 )
 
                 # result can be string or list
@@ -164,6 +201,130 @@ class BatchTranslator:
         self.translation_cache[cache_key] = result
         return result
 
+    async def translate_document(
+        self,
+        src: str,
+        document_id: Hashable,
+        src_lang: str = None,
+        tgt_lang: str = None,
+        **kwargs,
+    ) -> str:
+        """Translate a new version of a document, reusing the translation of its last version
+
+        Documents are not batched with other requests, see `Translator.translate_document`.
+        """
+        return await self._run_in_executor(
+            "translate_document",
+            src,
+            document_id,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            **self._settings_kwargs(),
+            **kwargs,
+        )
+
+    async def translate_segments(
+        self,
+        src: List,
+        src_lang: str = None,
+        tgt_lang: str = None,
+        **kwargs,
+    ) -> List:
+        """Translate pre-segmented or pre-tokenized input in one call, see `Translator.translate_segments`"""
+        settings_kwargs = self._settings_kwargs()
+        # Each input is translated as one sentence
+        del settings_kwargs["max_sentence_tokens"]
+        return await self._run_in_executor(
+            "translate_segments",
+            src,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            **settings_kwargs,
+            **kwargs,
+        )
+
+    async def translate_markup(
+        self,
+        src: List[str],
+        markup_format: str = "html",
+        src_lang: str = None,
+        tgt_lang: str = None,
+        **kwargs,
+    ) -> List[str]:
+        """Translate the text of HTML or XML documents in one call, see `Translator.translate_markup`"""
+        return await self._run_in_executor(
+            "translate_markup",
+            src,
+            markup_format,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            **self._settings_kwargs(),
+            **kwargs,
+        )
+
+    async def translate_json(
+        self,
+        src: Any,
+        selectors: Optional[List[str]] = None,
+        src_lang: str = None,
+        tgt_lang: str = None,
+        **kwargs,
+    ) -> Any:
+        """Translate the selected strings of a JSON document in one call, see `Translator.translate_json`"""
+        return await self._run_in_executor(
+            "translate_json",
+            src,
+            selectors,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            **self._settings_kwargs(),
+            **kwargs,
+        )
+
+    async def translate_tokens_stream(
+        self,
+        src: str,
+        src_lang: str = None,
+        tgt_lang: str = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """Translate a string, yielding pieces of the translation as they are decoded
+
+        Decoding runs in a thread of the default executor, see
+        `Translator.translate_tokens_stream`, and stops at the next token once the consumer
+        stops iterating.
+        """
+        if not self.worker_task:
+            await self.start_worker()
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for piece in self.translator.translate_tokens_stream(
+                    src, src_lang=src_lang, tgt_lang=tgt_lang, **kwargs
+                ):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                piece = await queue.get()
+                if piece is None:
+                    break
+                if isinstance(piece, Exception):
+                    raise piece
+                yield piece
+        finally:
+            stop.set()
+
 
 class ModelManager:
     def __init__(
@@ -173,12 +334,14 @@ class ModelManager:
         compute_type: str = "default",
         inter_threads: int = 1,
         intra_threads: int = 0,
+        calibrate: bool = False,
     ):
         self.max_loaded = max_loaded
         self.device = device
         self.compute_type = compute_type
         self.inter_threads = inter_threads
         self.intra_threads = intra_threads
+        self.calibrate = calibrate
         # cache key: src-tgt string
         self.models: OrderedDict[str, BatchTranslator] = OrderedDict()
         self.pending_loads: Dict[str, asyncio.Event] = {}
@@ -303,17 +466,31 @@ class ModelManager:
                 if evicted_model:
                     await evicted_model.stop_worker()
 
+                config = {
+                    "compute_type": self.compute_type,
+                    "inter_threads": self.inter_threads,
+                    "intra_threads": self.intra_threads,
+                    # Translations into some languages run longer than their source
+                    "max_decoding_length_ratio": settings.max_decoding_length_ratios.get(
+                        model_name
+                    ),
+                }
+                if self.calibrate:
+                    # Runs once per model and machine, then loads from disk
+                    calibration = await loop.run_in_executor(
+                        None, lambda: load_or_calibrate(model_path, device=self.device)
+                    )
+                    config.update(calibration["best"])
+
                 # Load new model (SLOW, outside lock)
                 logger.info(
-                    f"Loading model: {hf_model['model_id']} (device: {self.device}, compute: {self.compute_type})"
+                    f"Loading model: {hf_model['model_id']} (device: {self.device}, compute: {config['compute_type']})"
                 )
                 new_model = BatchTranslator(
                     model_id=hf_model["model_id"],
                     model_path=str(model_path),
                     device=self.device,
-                    compute_type=self.compute_type,
-                    inter_threads=self.inter_threads,
-                    intra_threads=self.intra_threads,
+                    **config,
                 )
                 await new_model.start_worker()
 
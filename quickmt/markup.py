@@ -0,0 +1,257 @@
+"""Translate the text of HTML and XML documents without translating their markup.
+
+Documents are parsed with the standard library `html.parser` and cut into blocks of text
+at block-level elements (paragraphs, headings, list items, table cells, ...). Inline
+elements such as `<b>` or `<a href="...">` become numbered placeholders inside their
+block, so each block is translated as a whole and its inline tags are put back around the
+translated words. Elements that are not translated (`<code>`, `<script>`, `<style>`,
+`<pre>`, `translate="no"`, ...) and comments are never sent to the model, and all markup
+is copied to the output byte for byte.
+
+Usage:
+    document = MarkupDocument("<p>Hello <b>world</b></p>")
+    translations = translator(document.segments)
+    document.rebuild(translations)
+"""
+
+import html
+import re
+from html.parser import HTMLParser
+from typing import List, Tuple, Union
+
+FORMATS = ("html", "xml")
+
+# Elements that are part of the text around them, everything else starts a new block
+INLINE_TAGS = set(
+    "a abbr b bdi bdo big br cite code data del dfn em font i img ins kbd "
+    "mark q s samp small span strike strong sub sup time tt u var wbr".split()
+)
+
+# Elements copied as they are
+SKIPPED_TAGS = set(
+    "code kbd math noscript pre samp script style svg template textarea var".split()
+)
+
+# Elements without an end tag
+VOID_TAGS = set(
+    "area base br col embed hr img input link meta param source track wbr".split()
+)
+
+# Placeholders are numbered brackets, which the models copy like citation markers. Also
+# used by `mask_placeholders`, see `quickmt.translator`
+PLACEHOLDER = "[{}]"
+PLACEHOLDER_RE = re.compile(r"\[\s*(\d+)\s*\]")
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r\f]+")
+_LITERAL_PLACEHOLDER_RE = re.compile(r"\[\d+\]")
+
+
+class _EventParser(HTMLParser):
+    """Record the parsed constructs of a document with their offsets in it"""
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=False)
+        # getpos() counts lines by "\n" only
+        self.line_offsets = [0] + [m.end() for m in re.finditer("\n", source)]
+        # (kind, tag, attrs, offset)
+        self.events: List[tuple] = []
+
+    def _add(self, kind: str, tag: str = "", attrs: tuple = ()):
+        line, column = self.getpos()
+        self.events.append((kind, tag, attrs, self.line_offsets[line - 1] + column))
+
+    def handle_starttag(self, tag, attrs):
+        self._add("start", tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self._add("startend", tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._add("end", tag)
+
+    def handle_data(self, data):
+        self._add("text")
+
+    def handle_entityref(self, name):
+        self._add("text")
+
+    def handle_charref(self, name):
+        self._add("text")
+
+    def handle_comment(self, data):
+        self._add("comment")
+
+    def handle_decl(self, decl):
+        self._add("decl")
+
+    def handle_pi(self, data):
+        self._add("decl")
+
+    def unknown_decl(self, data):
+        # CDATA sections
+        self._add("comment")
+
+
+class MarkupDocument:
+    """An HTML or XML document split into the text blocks to translate
+
+    Attributes:
+        segments (List[str]): Text of each block to translate, with its inline tags replaced by placeholders `[1]`, `[2]`, ...
+        missing_tags (int): Number of inline tags missing from the translations given to the last `rebuild`, which are appended to the end of their block
+    """
+
+    def __init__(self, source: str, markup_format: str = "html"):
+        """Parse a document
+
+        Args:
+            source (str): HTML or XML document, or fragment of one
+            markup_format (str, optional): 'html' or 'xml'. In XML, every element is a block and only elements with `translate="no"` are skipped. Defaults to "html".
+        """
+        if markup_format not in FORMATS:
+            raise ValueError(f"Unsupported markup format {markup_format!r}")
+        self.markup_format = markup_format
+        self.segments: List[str] = []
+        self.missing_tags = 0
+        # Markup copied as is, or the index of a translated block
+        self._parts: List[Union[str, int]] = []
+        # Raw text of the placeholders of each block
+        self._spans: List[List[str]] = []
+
+        parser = _EventParser(source)
+        parser.feed(source)
+        parser.close()
+        self._build(parser.events, source)
+
+    def _is_block(self, tag: str) -> bool:
+        return self.markup_format == "xml" or tag not in INLINE_TAGS
+
+    def _is_skipped(self, tag: str, attrs: List[Tuple[str, str]]) -> bool:
+        attrs = dict(attrs)
+        if attrs.get("translate") == "no" or attrs.get("its:translate") == "no":
+            return True
+        if self.markup_format == "xml":
+            return False
+        return (
+            tag in SKIPPED_TAGS or "notranslate" in (attrs.get("class") or "").split()
+        )
+
+    def _build(self, events: List[tuple], source: str):
+        # Items of the current block: (is_text, raw markup)
+        block: List[Tuple[bool, str]] = []
+        skipped: List[str] = []
+        skip_tag, skip_depth = None, 0
+
+        offsets = [event[3] for event in events[1:]] + [len(source)]
+        for (kind, tag, attrs, start), end in zip(events, offsets):
+            raw = source[start:end]
+            if skip_tag is not None:
+                skipped.append(raw)
+                if tag == skip_tag and kind == "start":
+                    skip_depth += 1
+                elif tag == skip_tag and kind == "end":
+                    skip_depth -= 1
+                if skip_depth == 0:
+                    block.append((False, "".join(skipped)))
+                    skipped, skip_tag = [], None
+            elif kind in ("start", "startend", "end"):
+                if self._is_block(tag):
+                    self._flush(block)
+                if (
+                    kind == "start"
+                    and tag not in VOID_TAGS
+                    and self._is_skipped(tag, attrs)
+                ):
+                    skipped, skip_tag, skip_depth = [raw], tag, 1
+                elif self._is_block(tag):
+                    self._parts.append(raw)
+                else:
+                    block.append((False, raw))
+            elif kind == "text":
+                block.append((True, raw))
+            elif kind == "comment":
+                block.append((False, raw))
+            else:
+                self._flush(block)
+                self._parts.append(raw)
+        if skipped:
+            block.append((False, "".join(skipped)))
+        self._flush(block)
+
+    def _flush(self, block: List[Tuple[bool, str]]):
+        """Close the current block, adding it to the segments if it has text to translate"""
+        if not block:
+            return
+        text = html.unescape("".join(raw for is_text, raw in block if is_text))
+        if not any(c.isalnum() for c in text):
+            self._parts.append("".join(raw for _, raw in block))
+            block.clear()
+            return
+
+        spans = []
+        pieces = []
+        for is_text, raw in block:
+            if not is_text:
+                spans.append(raw)
+                pieces.append(PLACEHOLDER.format(len(spans)))
+                continue
+            # Text that looks like a placeholder is masked too, so every placeholder is ours
+            last = 0
+            for match in _LITERAL_PLACEHOLDER_RE.finditer(raw):
+                pieces.append(html.unescape(raw[last : match.start()]))
+                spans.append(match.group())
+                pieces.append(PLACEHOLDER.format(len(spans)))
+                last = match.end()
+            pieces.append(html.unescape(raw[last:]))
+        segment = "".join(pieces)
+
+        # Whitespace around the block is kept as is, whitespace inside it is collapsed
+        stripped = segment.strip(" \t\n\r\f")
+        leading = segment[: len(segment) - len(segment.lstrip(" \t\n\r\f"))]
+        trailing = segment[len(leading) + len(stripped) :]
+        if leading:
+            self._parts.append(leading)
+        self._parts.append(len(self.segments))
+        if trailing:
+            self._parts.append(trailing)
+        self.segments.append(_WHITESPACE_RE.sub(" ", stripped))
+        self._spans.append(spans)
+        block.clear()
+
+    def rebuild(self, translations: List[str]) -> str:
+        """Put translations of `segments` back into the markup
+
+        Args:
+            translations (List[str]): One translation per segment, with its placeholders
+
+        Returns:
+            str: The translated document
+        """
+        if len(translations) != len(self.segments):
+            raise ValueError(
+                f"Expected {len(self.segments)} translations, got {len(translations)}"
+            )
+        self.missing_tags = 0
+        output = []
+        for part in self._parts:
+            if isinstance(part, str):
+                output.append(part)
+                continue
+            spans = self._spans[part]
+            text = translations[part]
+            used = set()
+            last = 0
+            for match in PLACEHOLDER_RE.finditer(text):
+                number = int(match.group(1))
+                if not 0 < number <= len(spans):
+                    continue
+                output.append(html.escape(text[last : match.start()], quote=False))
+                # Placeholders repeated by the model are dropped
+                if number not in used:
+                    output.append(spans[number - 1])
+                    used.add(number)
+                last = match.end()
+            output.append(html.escape(text[last:], quote=False))
+            missing = [span for i, span in enumerate(spans, 1) if i not in used]
+            self.missing_tags += len(missing)
+            output.extend(missing)
+        return "".join(output)
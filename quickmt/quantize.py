@@ -0,0 +1,296 @@
+"""On-disk cache of models converted to a compute type.
+
+When a model is stored as float and loaded with an int8 or int16 compute type,
+CTranslate2 converts every weight at load time, on each load. This module
+converts the `model.bin` once, the same way `ct2-*-converter --quantization`
+would, and keeps the result in ~/.cache/quickmt/quantized so later loads read
+the smaller pre-converted weights directly.
+
+The cache is keyed on the content of the model (the resolved `model.bin`, which
+is named after its hash in the Hugging Face cache, with its size and mtime) and
+the compute type.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Only this version of the model.bin format is handled, other models load as is
+BINARY_VERSION = 6
+
+# Order matches the DataType enum of CTranslate2, bfloat16 is read as raw uint16
+DTYPES = ("float32", "int8", "int16", "int32", "float16", "bfloat16")
+NUMPY_DTYPES = {
+    "float32": np.float32,
+    "int8": np.int8,
+    "int16": np.int16,
+    "int32": np.int32,
+    "float16": np.float16,
+    "bfloat16": np.uint16,
+}
+
+# Compute type -> (dtype of quantized weights, dtype of other float variables)
+COMPUTE_TYPES = {
+    "int8": ("int8", "float32"),
+    "int8_float32": ("int8", "float32"),
+    "int8_float16": ("int8", "float16"),
+    "int8_bfloat16": ("int8", "bfloat16"),
+    "int16": ("int16", "float32"),
+    "float32": ("float32", "float32"),
+    "float16": ("float16", "float16"),
+    "bfloat16": ("bfloat16", "bfloat16"),
+}
+
+
+class _Reader:
+    def __init__(self, path: Path):
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.offset = 0
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values[0]
+
+    def string(self) -> str:
+        length = self.unpack("H")
+        value = bytes(self.data[self.offset : self.offset + length - 1])
+        self.offset += length
+        return value.decode("utf-8")
+
+    def array(self, dtype: str, shape: Tuple[int, ...], num_bytes: int) -> np.ndarray:
+        value = self.data[self.offset : self.offset + num_bytes]
+        self.offset += num_bytes
+        return value.view(NUMPY_DTYPES[dtype]).reshape(shape)
+
+
+def read_model(path: Path) -> Tuple[str, int, Iterator, Dict[str, str]]:
+    """Read a CTranslate2 model.bin without loading it all in memory.
+
+    Returns:
+        The model name, the spec revision, an iterator of (name, dtype, array)
+        variables and the aliases. The aliases are only filled in once the
+        variables are consumed.
+    """
+    reader = _Reader(path)
+    version = reader.unpack("I")
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported model.bin version {version}")
+    name = reader.string()
+    revision = reader.unpack("I")
+    aliases: Dict[str, str] = {}
+
+    def variables():
+        for _ in range(reader.unpack("I")):
+            var_name = reader.string()
+            shape = tuple(reader.unpack("I") for _ in range(reader.unpack("B")))
+            dtype = DTYPES[reader.unpack("B")]
+            num_bytes = reader.unpack("I")
+            yield var_name, dtype, reader.array(dtype, shape, num_bytes)
+        for _ in range(reader.unpack("I")):
+            alias = reader.string()
+            aliases[alias] = reader.string()
+
+    return name, revision, variables(), aliases
+
+
+def _write_string(model: BinaryIO, string: str):
+    model.write(struct.pack("H", len(string) + 1))
+    model.write(string.encode("utf-8"))
+    model.write(struct.pack("B", 0))
+
+
+def _write_variable(model: BinaryIO, name: str, dtype: str, value: np.ndarray):
+    _write_string(model, name)
+    model.write(struct.pack("B", value.ndim))
+    for dim in value.shape:
+        model.write(struct.pack("I", dim))
+    model.write(struct.pack("B", DTYPES.index(dtype)))
+    model.write(struct.pack("I", value.nbytes))
+    model.write(np.ascontiguousarray(value).tobytes())
+
+
+def _to_float32(dtype: str, value: np.ndarray) -> np.ndarray:
+    if dtype == "bfloat16":
+        return (value.astype(np.uint32) << 16).view(np.float32)
+    return value.astype(np.float32)
+
+
+def _convert(dtype: str, value: np.ndarray, target: str) -> np.ndarray:
+    if dtype == target:
+        return value
+    value = _to_float32(dtype, value)
+    if target == "bfloat16":
+        # Round to nearest even
+        bits = value.view(np.uint32)
+        return ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype(np.uint16)
+    return value.astype(NUMPY_DTYPES[target])
+
+
+def _quantize(value: np.ndarray, quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize a weight as CTranslate2's converters do, returning it with its scale"""
+    if quantization == "int16":
+        # 10 bits so products take 20 bits and 12 are left for accumulation
+        scale = np.float32(2**10 / np.amax(np.absolute(value)))
+        value = np.clip(np.rint(value * scale), -(2**15), 2**15 - 1)
+        return value.astype(np.int16), scale
+    amax = np.amax(np.absolute(value), axis=1)
+    amax[amax == 0] = 127.0
+    scale = (127.0 / amax).astype(np.float32)
+    return np.rint(value * np.expand_dims(scale, 1)).astype(np.int8), scale
+
+
+def _is_quantizable(name: str, value: np.ndarray) -> bool:
+    # Linear and embedding weights, the layers with a weight_scale in model specs
+    return name.split("/")[-1] == "weight" and value.ndim == 2
+
+
+def needs_conversion(model_path: Path, compute_type: str) -> bool:
+    """Check whether loading the model with this compute type converts its weights."""
+    if compute_type not in COMPUTE_TYPES:
+        return False
+    weight_dtype, float_dtype = COMPUTE_TYPES[compute_type]
+    try:
+        _, _, variables, _ = read_model(Path(model_path) / "model.bin")
+        for name, dtype, value in variables:
+            if name.endswith("_scale") or name.endswith("_zero"):
+                # Already quantized
+                return False
+            if _is_quantizable(name, value):
+                if dtype != weight_dtype:
+                    return True
+            elif value.ndim > 0 and dtype in ("float32", "float16", "bfloat16"):
+                if dtype != float_dtype:
+                    return True
+    except (ValueError, struct.error) as e:
+        logger.warning(f"Cannot read {model_path}/model.bin: {e}")
+    return False
+
+
+def convert_model(model_path: Path, output_dir: Path, compute_type: str):
+    """Write a copy of a model folder with its weights converted to a compute type.
+
+    Args:
+        model_path: Path to the CTranslate2 model folder.
+        output_dir: Folder to write the converted model to.
+        compute_type: One of `COMPUTE_TYPES`.
+    """
+    model_path, output_dir = Path(model_path), Path(output_dir)
+    weight_dtype, float_dtype = COMPUTE_TYPES[compute_type]
+    name, revision, variables, aliases = read_model(model_path / "model.bin")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Variables are converted one at a time, keeping memory use low
+    with open(output_dir / "model.bin", "wb") as model:
+        model.write(struct.pack("I", BINARY_VERSION))
+        _write_string(model, name)
+        model.write(struct.pack("I", revision))
+        count_offset = model.tell()
+        model.write(struct.pack("I", 0))
+        count = 0
+        for var_name, dtype, value in variables:
+            if _is_quantizable(var_name, value) and weight_dtype in ("int8", "int16"):
+                value, scale = _quantize(_to_float32(dtype, value), weight_dtype)
+                _write_variable(model, var_name, weight_dtype, value)
+                _write_variable(model, f"{var_name}_scale", "float32", scale)
+                count += 2
+                continue
+            if _is_quantizable(var_name, value):
+                value, dtype = _convert(dtype, value, weight_dtype), weight_dtype
+            elif value.ndim > 0 and dtype in ("float32", "float16", "bfloat16"):
+                value, dtype = _convert(dtype, value, float_dtype), float_dtype
+            _write_variable(model, var_name, dtype, value)
+            count += 1
+        model.write(struct.pack("I", len(aliases)))
+        for alias, var_name in aliases.items():
+            _write_string(model, alias)
+            _write_string(model, var_name)
+        model.seek(count_offset)
+        model.write(struct.pack("I", count))
+
+    _sync_files(model_path, output_dir)
+
+
+def _sync_files(model_path: Path, output_dir: Path):
+    """Copy the other files of the model folder (config, vocabularies, vmap.txt, ...)"""
+    for path in model_path.iterdir():
+        if not path.is_file() or path.name == "model.bin":
+            continue
+        output = output_dir / path.name
+        stat = path.stat()
+        if (
+            not output.exists()
+            or output.stat().st_mtime_ns != stat.st_mtime_ns
+            or output.stat().st_size != stat.st_size
+        ):
+            shutil.copy2(path, output)
+
+
+def quantized_cache_dir() -> Path:
+    """Default location of the cache of converted models."""
+    cache_dir = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_dir / "quickmt" / "quantized"
+
+
+def cached_model_path(
+    model_path: Path, compute_type: str, cache_dir: Optional[Path] = None
+) -> Path:
+    """Path of the model converted to a compute type, converting it on first use.
+
+    The cache keeps one converted copy per model folder: writing a new one, after the
+    model was updated or to load it with another compute type, removes the older ones.
+
+    Args:
+        model_path: Path to the CTranslate2 model folder.
+        compute_type: CTranslate2 compute type the model will be loaded with.
+        cache_dir: Cache folder. Defaults to ~/.cache/quickmt/quantized.
+
+    Returns:
+        The converted model folder, or `model_path` if loading it with this compute
+        type does not convert its weights ('default', 'auto', already converted).
+    """
+    model_path = Path(model_path)
+    if not needs_conversion(model_path, compute_type):
+        return model_path
+
+    model_bin = (model_path / "model.bin").resolve()
+    stat = model_bin.stat()
+    # Copies of the same model folder share a prefix, and differ by version and compute type
+    source = hashlib.sha1(str(model_bin).encode()).hexdigest()[:12]
+    version = f"{stat.st_size}:{stat.st_mtime_ns}"
+    version = hashlib.sha1(version.encode()).hexdigest()[:8]
+    cache_dir = Path(cache_dir or quantized_cache_dir())
+    prefix = f"{model_path.name}-{source}-"
+    output_dir = cache_dir / f"{prefix}{version}-{compute_type}"
+    if (output_dir / "model.bin").exists():
+        # Files such as vmap.txt may have been added to the model since
+        _sync_files(model_path, output_dir)
+        return output_dir
+
+    logger.info(f"Converting {model_path} to {compute_type} in {output_dir}")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-"))
+    try:
+        convert_model(model_path, tmp_dir, compute_type)
+        try:
+            os.replace(tmp_dir, output_dir)
+        except OSError:
+            # Converted concurrently by another process
+            pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for stale in cache_dir.glob(f"{prefix}*"):
+        if stale != output_dir:
+            logger.info(f"Removing stale converted model {stale}")
+            shutil.rmtree(stale, ignore_errors=True)
+    return output_dir
@@ -1,18 +1,21 @@
 import asyncio
+import json
 import logging
 import os
 import time
 from contextlib import asynccontextmanager
-from typing import List, Optional, Union, Dict
+from typing import Any, List, Literal, Optional, Union, Dict
 from concurrent.futures import ProcessPoolExecutor
 
 from fastapi import FastAPI, HTTPException, APIRouter
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, model_validator
 
 from quickmt.langid import init_worker, predict_worker, ensure_model_exists
 from quickmt.manager import ModelManager
+from quickmt.markup import MarkupDocument
+from quickmt.structured import JsonDocument
 from quickmt.settings import settings
 
 
@@ -23,7 +26,7 @@ logger = logging.getLogger("uvicorn.error")
 
 
 class TranslationRequest(BaseModel):
-    src: Union[str, List[str]]
+    src: Union[str, List[str], List[List[str]]]
     src_lang: Optional[Union[str, List[str]]] = None
     tgt_lang: str = "en"
     beam_size: int = 5
@@ -32,6 +35,85 @@ class TranslationRequest(BaseModel):
     coverage_penalty: float = 0.0
     repetition_penalty: float = 1.0
     max_decoding_length: int = 256
+    # 'html' and 'xml' translate only the text of the documents, see quickmt.markup
+    format: Literal["text", "html", "xml"] = "text"
+    # Re-translate only what changed since the last version of the document(s)
+    document_id: Optional[Union[str, List[str]]] = None
+    # As-you-type sessions: like document_id, also reusing the translation of an extended sentence
+    session_id: Optional[str] = None
+    revision: Optional[int] = None
+    # 'sentences' and 'tokens' (SentencePiece pieces) are translated one item per sentence
+    input_format: Literal["text", "sentences", "tokens"] = "text"
+    output_format: Literal["text", "tokens"] = "text"
+
+    @model_validator(mode="after")
+    def validate_patience(self):
+        if self.patience > self.beam_size:
+            raise ValueError("patience cannot be greater than beam_size")
+        return self
+
+    @model_validator(mode="after")
+    def validate_input_format(self):
+        if self.input_format == "text":
+            if self.output_format != "text":
+                raise ValueError("output_format 'tokens' requires pre-segmented input")
+            if isinstance(self.src, list) and any(
+                not isinstance(i, str) for i in self.src
+            ):
+                raise ValueError("src must be strings with input_format 'text'")
+            return self
+        if self.format != "text" or self.document_id is not None:
+            raise ValueError("input_format is not supported with format or document_id")
+        item_type = list if self.input_format == "tokens" else str
+        if not isinstance(self.src, list) or any(
+            not isinstance(i, item_type) for i in self.src
+        ):
+            raise ValueError(
+                f"src must be a list of {'token lists' if item_type is list else 'sentences'}"
+            )
+        if self.input_format == "tokens" and not self.src_lang:
+            raise ValueError("src_lang is required with input_format 'tokens'")
+        return self
+
+    @model_validator(mode="after")
+    def validate_document_id(self):
+        if self.session_id is not None:
+            if self.document_id is not None or not isinstance(self.src, str):
+                raise ValueError("session_id requires a single src and no document_id")
+            if self.format != "text" or self.input_format != "text":
+                raise ValueError("session_id is only supported with text input")
+        if self.document_id is None:
+            return self
+        if self.format != "text":
+            raise ValueError("document_id is only supported with format 'text'")
+        if isinstance(self.src, str) != isinstance(self.document_id, str) or (
+            isinstance(self.src, list) and len(self.src) != len(self.document_id)
+        ):
+            raise ValueError("document_id must match src")
+        return self
+
+
+class StreamTranslationRequest(BaseModel):
+    src: str
+    src_lang: Optional[str] = None
+    tgt_lang: str = "en"
+    # Streamed translations are decoded greedily, see Translator.translate_tokens_stream
+    repetition_penalty: float = 1.0
+    max_decoding_length: int = 256
+
+
+class JsonTranslationRequest(BaseModel):
+    src: Any
+    # Dotted paths of the strings to translate, with glob parts, see quickmt.structured
+    selectors: Optional[List[str]] = None
+    src_lang: Optional[str] = None
+    tgt_lang: str = "en"
+    beam_size: int = 5
+    patience: int = 1
+    length_penalty: float = 1.0
+    coverage_penalty: float = 0.0
+    repetition_penalty: float = 1.0
+    max_decoding_length: int = 256
 
     @model_validator(mode="after")
     def validate_patience(self):
@@ -41,7 +123,7 @@ class TranslationRequest(BaseModel):
 
 
 class TranslationResponse(BaseModel):
-    translation: Union[str, List[str]]
+    translation: Union[str, List[str], List[List[str]]]
     src_lang: Union[str, List[str]]
     src_lang_score: Union[float, List[float]]
     tgt_lang: str
@@ -49,6 +131,15 @@ class TranslationResponse(BaseModel):
     model_used: Union[str, List[str]]
 
 
+class JsonTranslationResponse(BaseModel):
+    translation: Any
+    src_lang: str
+    src_lang_score: float
+    tgt_lang: str
+    processing_time: float
+    model_used: str
+
+
 class DetectionRequest(BaseModel):
     src: Union[str, List[str]]
     k: int = 1
@@ -98,6 +189,7 @@ async def lifespan(app: FastAPI):
         compute_type=settings.compute_type,
         inter_threads=settings.inter_threads,
         intra_threads=settings.intra_threads,
+        calibrate=settings.calibrate_on_load,
     )
 
     # 1. Fetch available models from Hugging Face
@@ -169,11 +261,18 @@ async def translate_endpoint(request: TranslationRequest):
                 raise HTTPException(
                     status_code=503, detail="Language identification not initialized"
                 )
-            # Batch detect languages
+            # Batch detect languages, from the text of markup documents
+            if request.format != "text":
+                langid_src = [
+                    " ".join(MarkupDocument(s, request.format).segments)
+                    for s in src_list
+                ]
+            else:
+                langid_src = src_list
             raw_langid_results = await loop.run_in_executor(
                 langid_executor,
                 predict_worker,
-                src_list,
+                langid_src,
                 1,  # k=1 (best guess)
                 0.0,  # threshold
             )
@@ -203,7 +302,9 @@ async def translate_endpoint(request: TranslationRequest):
             # Optimization: If src == tgt, skip translation
             if lang == request.tgt_lang:
                 for src_idx, idx in enumerate(indices):
-                    final_translations[idx] = group_src[src_idx]
+                    final_translations[idx] = _identity(
+                        group_src[src_idx], request.input_format, request.output_format
+                    )
                     final_models[idx] = "identity"
                 continue
 
@@ -212,22 +313,58 @@ async def translate_endpoint(request: TranslationRequest):
                 try:
                     translator = await model_manager.get_model(l, request.tgt_lang)
                     used_pairs.add(translator.model_id)
-                    # Call translate for each sentence; BatchTranslator will handle opportunistic batching
-                    translation_tasks = [
-                        translator.translate(
-                            s,
-                            src_lang=l,
-                            tgt_lang=request.tgt_lang,
-                            beam_size=request.beam_size,
-                            patience=request.patience,
-                            length_penalty=request.length_penalty,
-                            coverage_penalty=request.coverage_penalty,
-                            repetition_penalty=request.repetition_penalty,
-                            max_decoding_length=request.max_decoding_length,
+                    kwargs = dict(
+                        src_lang=l,
+                        tgt_lang=request.tgt_lang,
+                        beam_size=request.beam_size,
+                        patience=request.patience,
+                        length_penalty=request.length_penalty,
+                        coverage_penalty=request.coverage_penalty,
+                        repetition_penalty=request.repetition_penalty,
+                        max_decoding_length=request.max_decoding_length,
+                    )
+                    if request.input_format != "text":
+                        results = await translator.translate_segments(
+                            g_src,
+                            input_format=request.input_format,
+                            output_format=request.output_format,
+                            **kwargs,
+                        )
+                    elif request.session_id is not None:
+                        results = [
+                            await translator.translate_document(
+                                g_src[0],
+                                ("session", request.session_id),
+                                reuse_prefix=True,
+                                revision=request.revision,
+                                **kwargs,
+                            )
+                        ]
+                    elif request.document_id is not None:
+                        document_ids = (
+                            [request.document_id]
+                            if isinstance(request.document_id, str)
+                            else request.document_id
                         )
-                        for s in g_src
-                    ]
-                    results = await asyncio.gather(*translation_tasks)
+                        results = await asyncio.gather(
+                            *[
+                                translator.translate_document(
+                                    src_list[i], document_ids[i], **kwargs
+                                )
+                                for i in i_list
+                            ]
+                        )
+                    elif request.format != "text":
+                        # The text blocks of all documents are translated in one call
+                        results = await translator.translate_markup(
+                            g_src, markup_format=request.format, **kwargs
+                        )
+                    else:
+                        # Call translate for each sentence; BatchTranslator will handle opportunistic batching
+                        translation_tasks = [
+                            translator.translate(s, **kwargs) for s in g_src
+                        ]
+                        results = await asyncio.gather(*translation_tasks)
                     for result_idx, original_idx in enumerate(i_list):
                         final_translations[original_idx] = results[result_idx]
                         final_models[original_idx] = translator.model_id
@@ -272,6 +409,147 @@ async def translate_endpoint(request: TranslationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _identify_language(text: str):
+    """Best guess language of a text and its score"""
+    if not langid_executor:
+        raise HTTPException(
+            status_code=503, detail="Language identification not initialized"
+        )
+    loop = asyncio.get_running_loop()
+    raw_langid_results = await loop.run_in_executor(
+        langid_executor, predict_worker, [text], 1, 0.0
+    )
+    result = raw_langid_results[0]
+    if not result:
+        return "unknown", 0.0
+    return result[0][0], float(result[0][1])
+
+
+def _identity(item: Union[str, List[str]], input_format: str, output_format: str):
+    """Untranslated item, in the output format, when the source is the target language"""
+    if input_format == "tokens" and output_format == "text":
+        # Same as SentencePiece's decoding of the pieces
+        return "".join(item).replace("\u2581", " ").strip()
+    if input_format == "sentences" and output_format == "tokens":
+        return ["\u2581" + word for word in item.split()]
+    return item
+
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a server-sent event with a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api_router.post("/translate/stream")
+async def translate_stream_endpoint(request: StreamTranslationRequest):
+    """Translate a string, streaming its translation as server-sent events
+
+    Each `data` event holds the next piece of the translation as it is decoded, and a final
+    `done` event holds the same metadata as `/api/translate`. Errors after the stream has
+    started are sent as an `error` event.
+    """
+    if not model_manager:
+        raise HTTPException(status_code=503, detail="Model manager not initialized")
+
+    start_time = time.time()
+    if request.src_lang:
+        src_lang, src_lang_score = request.src_lang, 1.0
+    else:
+        src_lang, src_lang_score = await _identify_language(request.src)
+
+    # Load the model before streaming, so a missing model is an HTTP error
+    translator = None
+    if src_lang != request.tgt_lang:
+        translator = await model_manager.get_model(src_lang, request.tgt_lang)
+
+    async def events():
+        try:
+            if translator is None:
+                yield _sse_event({"translation": request.src})
+            else:
+                async for piece in translator.translate_tokens_stream(
+                    request.src,
+                    src_lang=src_lang,
+                    tgt_lang=request.tgt_lang,
+                    repetition_penalty=request.repetition_penalty,
+                    max_decoding_length=request.max_decoding_length,
+                ):
+                    yield _sse_event({"translation": piece})
+        except Exception as e:
+            logger.exception("Unexpected error in translate_stream_endpoint")
+            yield _sse_event({"detail": str(e)}, event="error")
+            return
+        yield _sse_event(
+            {
+                "src_lang": src_lang,
+                "src_lang_score": src_lang_score,
+                "tgt_lang": request.tgt_lang,
+                "processing_time": time.time() - start_time,
+                "model_used": translator.model_id if translator else "identity",
+            },
+            event="done",
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@api_router.post("/translate/json", response_model=JsonTranslationResponse)
+async def translate_json_endpoint(request: JsonTranslationRequest):
+    """Translate the selected strings of a JSON document, keeping its structure
+
+    All the selected strings are deduplicated and translated in one batched call, see
+    quickmt.structured.
+    """
+    if not model_manager:
+        raise HTTPException(status_code=503, detail="Model manager not initialized")
+
+    start_time = time.time()
+    try:
+        document = JsonDocument(request.src, request.selectors)
+        if request.src_lang:
+            src_lang, src_lang_score = request.src_lang, 1.0
+        elif document.segments:
+            src_lang, src_lang_score = await _identify_language(
+                " ".join(document.segments)
+            )
+        else:
+            src_lang, src_lang_score = "", 0.0
+
+        if not document.segments or src_lang == request.tgt_lang:
+            translation = request.src
+            model_used = "identity" if document.segments else "none"
+        else:
+            translator = await model_manager.get_model(src_lang, request.tgt_lang)
+            translation = await translator.translate_json(
+                request.src,
+                request.selectors,
+                src_lang=src_lang,
+                tgt_lang=request.tgt_lang,
+                beam_size=request.beam_size,
+                patience=request.patience,
+                length_penalty=request.length_penalty,
+                coverage_penalty=request.coverage_penalty,
+                repetition_penalty=request.repetition_penalty,
+                max_decoding_length=request.max_decoding_length,
+            )
+            model_used = translator.model_id
+
+        return JsonTranslationResponse(
+            translation=translation,
+            src_lang=src_lang,
+            src_lang_score=src_lang_score,
+            tgt_lang=request.tgt_lang,
+            processing_time=time.time() - start_time,
+            model_used=model_used,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error in translate_json_endpoint")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.post("/identify-language", response_model=DetectionResponse)
 async def identify_language_endpoint(request: DetectionRequest):
     if not langid_executor:
@@ -351,10 +629,17 @@ async def get_languages():
 @api_router.get("/health")
 async def health_check():
     loaded_models = list(model_manager.models.keys()) if model_manager else []
+    counters = {}
+    if model_manager:
+        for name, model in model_manager.models.items():
+            if model.translator:
+                with model.translator.counters_lock:
+                    counters[name] = dict(model.translator.counters)
     return {
         "status": "ok",
         "loaded_models": loaded_models,
         "max_models": settings.max_loaded_models,
+        "counters": counters,
     }
 
 
@@ -9,7 +9,7 @@ settings for the quickmt library. Settings can be configured via:
 All environment variables are case-insensitive.
 """
 
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -36,10 +36,40 @@ class Settings(BaseSettings):
     intra_threads: int = 4
     """Number of threads to use for intra-op parallelism (within each translation)"""
 
+    quantized_model_cache: bool = True
+    """Keep a copy of each model converted to compute_type in ~/.cache/quickmt/quantized, so loads skip the conversion. Older copies of the same model are removed when a new one is written"""
+
+    calibrate_on_load: bool = False
+    """Time a short workload when a model is first loaded to pick its compute type, threads and batch size, overriding the settings above. The result is persisted per model in ~/.cache/quickmt/calibration"""
+
     # Batch Processing Settings
     max_batch_size: int = 32
     """Maximum batch size for translation requests"""
 
+    max_batch_tokens: Optional[int] = None
+    """If set, sort sentences by length and batch them by padded token count instead of sentence count"""
+
+    max_sentence_tokens: Optional[int] = None
+    """If set, split sentences longer than this many tokens at clause boundaries, commas, word or token windows before translating them"""
+
+    max_decoding_length_ratio: Optional[float] = None
+    """If set, limit each translation to max_decoding_length_ratio * source tokens + max_decoding_length_offset tokens, so degenerate repeating outputs stop early"""
+
+    max_decoding_length_offset: int = 10
+    """Offset added to the source-length based decoding limit"""
+
+    max_decoding_length_ratios: Dict[str, float] = {}
+    """Per language pair overrides of max_decoding_length_ratio, e.g. MAX_DECODING_LENGTH_RATIOS='{"en-zh": 2.0, "zh-en": 1.2}'"""
+
+    use_vmap: bool = False
+    """Restrict the output vocabulary with the vmap.txt of models that have one (see quickmt-vmap)"""
+
+    adaptive_beam_threshold: Optional[float] = None
+    """If set, decode greedily first and re-decode with the requested beam size only sentences whose mean token log-probability is below this threshold (e.g. -0.5)"""
+
+    mask_placeholders: bool = False
+    """Replace URLs, file paths, inline code, entities, product codes and numbers with placeholders before translating and restore them afterwards"""
+
     batch_timeout_ms: int = 5
     """Timeout in milliseconds to wait for batching additional requests"""
 
@@ -54,6 +84,12 @@ class Settings(BaseSettings):
     translation_cache_size: int = 10000
     """Maximum number of translations to cache (LRU eviction)"""
 
+    sentence_cache_size: int = 10000
+    """Maximum number of sentence translations to memoize per model, shared across requests (LRU eviction). 0 disables it"""
+
+    document_cache_size: int = 1000
+    """Number of documents per model whose last version is kept for incremental re-translation of requests with a document_id (LRU eviction). 0 disables it"""
+
     port: int = 8000
     """Number of threads to use for inter-op parallelism (simultaneous translations)"""
 
@@ -0,0 +1,95 @@
+"""Translate the strings of JSON documents, such as i18n catalogs or API payloads.
+
+Strings are selected with dotted paths whose parts are glob patterns matched against the
+object keys and list indices: `title`, `items.*.name`, `messages.*_label`. A `**` part
+matches any number of levels, so `**.description` selects every `description`, and the
+default `**` selects every string. A path that selects an object or a list selects all the
+strings inside it. Keys, numbers, booleans and strings that are not selected are left as
+they are.
+
+The selected strings are deduplicated, so a string repeated across a catalog is translated
+once, and the document is rebuilt with the same structure.
+
+Usage:
+    document = JsonDocument({"title": "Hello", "id": "x1"}, ["title"])
+    translations = translator(document.segments)
+    document.rebuild(translations)
+"""
+
+import copy
+from fnmatch import fnmatchcase
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+def _strings(data: Any, path: tuple = ()) -> Iterator[Tuple[tuple, str]]:
+    """Path and value of every string of a document, in document order"""
+    if isinstance(data, str):
+        yield path, data
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            yield from _strings(value, path + (key,))
+    elif isinstance(data, list):
+        for idx, value in enumerate(data):
+            yield from _strings(value, path + (idx,))
+
+
+def _matches(pattern: List[str], path: tuple) -> bool:
+    """Whether a selector matches a path or one of its ancestors"""
+    if not pattern:
+        return True
+    head, rest = pattern[0], pattern[1:]
+    if head == "**":
+        return any(_matches(rest, path[i:]) for i in range(len(path) + 1))
+    return bool(path) and fnmatchcase(str(path[0]), head) and _matches(rest, path[1:])
+
+
+class JsonDocument:
+    """A JSON document and the strings of it to translate
+
+    Attributes:
+        segments (List[str]): Unique selected strings, in the order they first appear
+    """
+
+    def __init__(self, data: Any, selectors: Optional[List[str]] = None):
+        """Select the strings to translate
+
+        Args:
+            data (Any): Document, as loaded by `json.loads`
+            selectors (Optional[List[str]], optional): Paths of the strings to translate, see `quickmt.structured`. Defaults to every string.
+        """
+        self.data = data
+        patterns = [selector.split(".") for selector in (selectors or ["**"])]
+        # Path of each selected string, and the index of its text in `segments`
+        self._paths: List[tuple] = []
+        self._segment_ids: List[int] = []
+        segment_ids = {}
+        for path, value in _strings(data):
+            if not value.strip() or not any(_matches(p, path) for p in patterns):
+                continue
+            self._paths.append(path)
+            self._segment_ids.append(segment_ids.setdefault(value, len(segment_ids)))
+        self.segments: List[str] = list(segment_ids)
+
+    def rebuild(self, translations: List[str]) -> Any:
+        """Copy the document with the selected strings replaced by their translations
+
+        Args:
+            translations (List[str]): One translation per segment
+
+        Returns:
+            Any: The translated document
+        """
+        if len(translations) != len(self.segments):
+            raise ValueError(
+                f"Expected {len(self.segments)} translations, got {len(translations)}"
+            )
+        if self._paths == [()]:
+            # The document is a single string
+            return translations[0]
+        data = copy.deepcopy(self.data)
+        for path, idx in zip(self._paths, self._segment_ids):
+            node = data
+            for key in path[:-1]:
+                node = node[key]
+            node[path[-1]] = translations[idx]
+        return data
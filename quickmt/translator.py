@@ -1,58 +1,333 @@
+import asyncio
+import logging
+import os
+import re
 from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, deque
+from difflib import SequenceMatcher
+from itertools import islice
+from math import ceil
 from pathlib import Path
-from time import time
-from typing import List, Optional, Union
+from threading import Lock
+from time import perf_counter
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
 
 import ctranslate2
 import sentencepiece
 from blingfire import text_to_sentences
+from cachetools import LRUCache
 from pydantic import DirectoryPath, validate_call
 from huggingface_hub import snapshot_download
 
+from quickmt.markup import PLACEHOLDER, PLACEHOLDER_RE, MarkupDocument
+from quickmt.quantize import cached_model_path
+from quickmt.structured import JsonDocument
+
+logger = logging.getLogger(__name__)
+
+# Spans that are copied verbatim by translation: URLs, e-mail addresses, UUIDs and hashes
+_VERBATIM_SPAN_RE = re.compile(
+    r"(?:https?://|www\.)\S+"
+    r"|[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+    r"|\b[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}\b"
+    r"|\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{7,}\b"
+)
+
+# Spans replaced by placeholders with `mask_placeholders`, in order of precedence: inline
+# code, URLs, e-mail addresses, file paths, character entities, UUIDs and hashes, product
+# codes, numbers and versions, and text that already looks like a placeholder
+_MASKED_SPAN_RE = re.compile(
+    r"`[^`\n]+`"
+    r"|(?:https?://|www\.)[^\s<>\"]*[^\s<>\".,;:!?'()\[\]]"
+    r"|[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+    r"|(?<![\w/])(?:~|\.{1,2})?(?:/[\w.-]+){2,}/?"
+    r"|\b[A-Za-z]:\\[\w\\.-]+"
+    r"|\b[\w-]+(?:/[\w.-]+)+\.[A-Za-z]\w*\b"
+    r"|&(?:#\d+|#x[0-9a-fA-F]+|[A-Za-z]\w*);"
+    r"|\b[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}\b"
+    r"|\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{7,}\b"
+    r"|\b(?=[\w-]*\d)(?=[\w-]*[A-Za-z])[A-Za-z0-9]+(?:[-_][A-Za-z0-9]+)+\b"
+    r"|\b[A-Z]{2,}\d+[A-Z0-9]*\b"
+    r"|(?<![\w.,])v?\d+(?:[.,]\d+)+\b|(?<![\w.,])\d{3,}\b"
+    r"|\[\d+\]"
+)
+
+# Tokens dropped from the end of a previous translation reused as target prefix, as they
+# translated the end of a sentence that was still being typed
+_PREFIX_MARGIN_TOKENS = 2
+
+# Where over-long sentences are split, tried in order: clauses, commas, then words. Text
+# without whitespace is then cut into windows of tokens, see `TranslatorABC._token_windows`
+_SEGMENT_BOUNDARY_RES = [
+    re.compile(r"(?<=[;:])\s+|\s+(?=[—–]\s)"),
+    re.compile(r"(?<=,)\s+"),
+    re.compile(r"\s+"),
+]
+# Byte fallback pieces of the second and later bytes of a UTF-8 character
+_CONTINUATION_BYTE_RE = re.compile(r"<0x[89AB][0-9A-F]>")
+
+
+class _PendingSentences:
+    """Sentences of one translation call and their progress through the pipeline"""
+
+    def __init__(self, sentences: List[str], stats: Optional[dict] = None):
+        self.sentences = sentences
+        # Per-call statistics reported to hooks, see `TranslatorABC.add_hook`
+        self.stats = {} if stats is None else stats
+        self.translated: List[Optional[str]] = [None] * len(sentences)
+        # Indices of the sentences that still need decoding, and their tokens
+        self.pending: List[int] = []
+        self.input_text: List[List[str]] = []
+        self.cache_key: Optional[tuple] = None
+        # (index, index of first occurrence) of repeated sentences
+        self.duplicates: List[tuple] = []
+        # Spans masked in each pending sentence, see `TranslatorABC._mask_spans`
+        self.masked_spans: Optional[List[List[str]]] = None
+
+    def complete(self, translations: List[str]) -> List[str]:
+        """Fill in the translations of the pending sentences and copy them to their repeats"""
+        for idx, text in zip(self.pending, translations):
+            self.translated[idx] = text
+        for idx, first in self.duplicates:
+            self.translated[idx] = self.translated[first]
+        return self.translated
+
+
+class _GenerationStep:
+    """Decoded token, with the attributes of CTranslate2's GenerationStepResult that are used"""
+
+    def __init__(self, step: int, token: str, is_last: bool):
+        self.step = step
+        self.token = token
+        self.is_last = is_last
+
+
+class _ResultPoller:
+    """Resolve asyncio futures with CTranslate2 results submitted with `asynchronous=True`
+
+    One poller serves every coroutine of a translator on an event loop, so the loop runs one
+    polling task however many requests are waiting. The polling interval backs off from
+    `poll_interval` to `max_poll_interval` while nothing finishes, and is reset when a result
+    is waited for or comes in.
+    """
+
+    def __init__(self, poll_interval: float = 0.0005, max_poll_interval: float = 0.002):
+        self.loop = asyncio.get_running_loop()
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.delay = poll_interval
+        # (CTranslate2 result, future) pairs not resolved yet
+        self.waiting: List[tuple] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def wait(self, result) -> asyncio.Future:
+        """Future resolved with `result.result()` once the result is done"""
+        future = self.loop.create_future()
+        self.waiting.append((result, future))
+        self.delay = self.poll_interval
+        if self.task is None:
+            self.task = self.loop.create_task(self._poll())
+        return future
+
+    async def _poll(self):
+        try:
+            while self.waiting:
+                waiting = []
+                for result, future in self.waiting:
+                    if future.cancelled():
+                        continue
+                    if not result.done():
+                        waiting.append((result, future))
+                        continue
+                    try:
+                        future.set_result(result.result())
+                    except Exception as e:
+                        future.set_exception(e)
+                if len(waiting) < len(self.waiting):
+                    self.delay = self.poll_interval
+                self.waiting = waiting
+                if waiting:
+                    await asyncio.sleep(self.delay)
+                    self.delay = min(2 * self.delay, self.max_poll_interval)
+        finally:
+            self.task = None
+
+
+class _DocumentVersion:
+    """Segmentation and translation of the last version of a document, see `TranslatorABC.translate_document`"""
+
+    def __init__(
+        self,
+        options: tuple,
+        paragraphs: List[str],
+        sentences: List[List[str]],
+        translations: List[List[str]],
+        revision: Optional[int] = None,
+    ):
+        # Translation args, versions translated with other args are not reused
+        self.options = options
+        self.revision = revision
+        # Lines of the document, with their sentences and the translation of each sentence
+        self.paragraphs = paragraphs
+        self.sentences = sentences
+        self.translations = translations
+
 
 class TranslatorABC(ABC):
-    def __init__(self, model_path: DirectoryPath, **kwargs):
+    def __init__(
+        self,
+        model_path: DirectoryPath,
+        sentence_cache_size: int = 0,
+        quantized_cache: bool = False,
+        max_decoding_length_ratio: Optional[float] = None,
+        max_decoding_length_offset: int = 10,
+        use_vmap: bool = False,
+        document_cache_size: int = 0,
+        **kwargs,
+    ):
         """Create quickmt translation object
 
         Args:
             model_path (DirectoryPath): Path to quickmt model folder
+            sentence_cache_size (int, optional): Number of sentence translations to memoize across calls (LRU eviction). 0 disables the cache. Defaults to 0.
+            quantized_cache (bool, optional): Load the model from an on-disk copy already converted to `compute_type` (created on first use in ~/.cache/quickmt/quantized) instead of converting the weights on every load. Defaults to False.
+            max_decoding_length_ratio (Optional[float], optional): If set, limit each translation to `ratio * source tokens + offset` tokens (capped by `max_decoding_length`), so a degenerate repeating output of a short sentence stops early. Defaults to None.
+            max_decoding_length_offset (int, optional): Offset added to the source-length based limit. Defaults to 10.
+            use_vmap (bool, optional): Restrict the output vocabulary with the model's vmap.txt, see `quickmt.vmap`. Ignored if the model has none. Defaults to False.
+            document_cache_size (int, optional): Number of documents whose last version is kept for `translate_document` (LRU eviction). 0 disables incremental re-translation. Defaults to 0.
             **kwargs: CTranslate2 Translator arguments - see https://opennmt.net/CTranslate2/python/ctranslate2.Translator.html
         """
         self.model_path = Path(model_path)
-        self.translator = ctranslate2.Translator(str(model_path), **kwargs)
+        ct2_model_path = self.model_path
+        if quantized_cache:
+            ct2_model_path = self._quantized_model_path(
+                self.model_path,
+                kwargs.get("device", "cpu"),
+                kwargs.get("compute_type", "default"),
+            )
+        self.translator = ctranslate2.Translator(str(ct2_model_path), **kwargs)
+        self.counters: Counter = Counter()
+        # Calls run in several executor threads at once
+        self.counters_lock = Lock()
+        self.sentence_cache: Optional[LRUCache] = (
+            LRUCache(maxsize=sentence_cache_size) if sentence_cache_size > 0 else None
+        )
+        self.sentence_cache_lock = Lock()
+        self.document_cache: Optional[LRUCache] = (
+            LRUCache(maxsize=document_cache_size) if document_cache_size > 0 else None
+        )
+        self.document_cache_lock = Lock()
+        self.hooks: List[Callable[[dict], None]] = []
+        self._poller: Optional[_ResultPoller] = None
+        self.max_decoding_length_ratio = max_decoding_length_ratio
+        self.max_decoding_length_offset = max_decoding_length_offset
+        self.use_vmap = use_vmap and (ct2_model_path / "vmap.txt").exists()
+        if use_vmap and not self.use_vmap:
+            logger.warning(f"No vmap.txt in {self.model_path}, use_vmap is ignored")
+
+    @staticmethod
+    def _quantized_model_path(model_path: Path, device: str, compute_type: str) -> Path:
+        """Path of the model pre-converted to `compute_type`, or `model_path` if not applicable"""
+        if device == "auto":
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        # Unsupported compute types fall back to another one at load time
+        if compute_type not in ctranslate2.get_supported_compute_types(device):
+            return model_path
+        try:
+            return cached_model_path(model_path, compute_type)
+        except Exception:
+            logger.exception(f"Failed to cache {model_path} as {compute_type}")
+            return model_path
+
+    def add_hook(self, hook: Callable[[dict], None]) -> None:
+        """Register a callback that receives the statistics of every translation call
+
+        The callback is called with a dict holding the time in seconds spent in each stage
+        (`split_time`, `tokenize_time`, `translate_batch_time`, `detokenize_time`, `join_time`)
+        and the counts of the call (`inputs`, `sentences`, `decoded_sentences`, `batches`,
+        `source_tokens`, `target_tokens`, ...). Stages that did not run are absent.
+
+        Args:
+            hook (Callable[[dict], None]): Callback to register
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[dict], None]) -> None:
+        """Unregister a callback added with `add_hook`"""
+        self.hooks.remove(hook)
+
+    def _report(self, stats: dict) -> None:
+        """Add the statistics of one call to `counters` and pass them to the hooks"""
+        with self.counters_lock:
+            self.counters.update(stats)
+        for hook in self.hooks:
+            try:
+                hook(stats)
+            except Exception:
+                logger.exception(f"Error in translation hook {hook!r}")
 
     @staticmethod
     @validate_call
     def _sentence_split(src: List[str]):
         """Split sentences with Blingfire
 
+        Validating wrapper of `_split_sentences` returning plain lists.
+
         Args:
             src (List[str]): Input list of strings to split by sentences
 
         Returns:
             List[int], List[int], List[str]: List of input ids, list of paragraph ids and sentences
         """
-        input_ids = []
-        paragraph_ids = []
+        input_ids, paragraph_ids, sentences = TranslatorABC._split_sentences(src)
+        return list(input_ids), list(paragraph_ids), sentences
+
+    @staticmethod
+    def _split_sentences(src: List[str]):
+        """Split sentences with Blingfire, without validating the input
+
+        Sentences shorter than 5 characters are merged into the previous sentence of the same
+        paragraph. Input and paragraph ids are returned as arrays, which take a fraction of the
+        memory of lists of ints for large inputs.
+
+        Args:
+            src (List[str]): Input list of strings to split by sentences
+
+        Returns:
+            array, array, List[str]: Input ids, paragraph ids and sentences
+        """
+        input_ids = array("l")
+        paragraph_ids = array("l")
         sentences = []
+        last_idx = last_paragraph = -1
         for idx, i in enumerate(src):
             for paragraph, j in enumerate(i.splitlines(keepends=True)):
-                sents = text_to_sentences(j).splitlines()
-                for sent in sents:
-                    stripped_sent = sent.strip()
-                    if len(stripped_sent) > 0:
-                        if (
-                            len(stripped_sent) < 5
-                            and len(paragraph_ids) > 0
-                            and paragraph == paragraph_ids[-1]
-                            and len(input_ids) > 0
-                            and input_ids[-1] == idx
-                        ):
-                            sentences[-1] += " " + stripped_sent
-                        else:
-                            input_ids.append(idx)
-                            paragraph_ids.append(paragraph)
-                            sentences.append(stripped_sent)
+                for sent in text_to_sentences(j).splitlines():
+                    sent = sent.strip()
+                    if not sent:
+                        continue
+                    if (
+                        len(sent) < 5
+                        and idx == last_idx
+                        and paragraph == last_paragraph
+                    ):
+                        sentences[-1] += " " + sent
+                    else:
+                        input_ids.append(idx)
+                        paragraph_ids.append(paragraph)
+                        sentences.append(sent)
+                        last_idx, last_paragraph = idx, paragraph
 
         return input_ids, paragraph_ids, sentences
 
@@ -68,6 +343,8 @@ class TranslatorABC(ABC):
     ):
         """Sentence joiner
 
+        Validating wrapper of `_join_sentences`.
+
         Args:
             input_ids (List[int]): List of input IDs
             paragraph_ids (List[int]): List of paragraph IDs
@@ -75,6 +352,40 @@ class TranslatorABC(ABC):
             paragraph_join_str (str, optional): str to use to join paragraphs. Defaults to "\n".
             sent_join_str (str, optional): str to join up sentences. Defaults to " ".
 
+        Returns:
+            List[str]: Joined up sentences
+        """
+        return TranslatorABC._join_sentences(
+            input_ids,
+            paragraph_ids,
+            sentences,
+            paragraph_join_str=paragraph_join_str,
+            sent_join_str=sent_join_str,
+            length=length,
+        )
+
+    @staticmethod
+    def _join_sentences(
+        input_ids: Sequence[int],
+        paragraph_ids: Sequence[int],
+        sentences: List[str],
+        paragraph_join_str: str = "\n",
+        sent_join_str: str = " ",
+        length: Optional[int] = None,
+    ) -> List[str]:
+        """Join sentences back into their inputs, without validating the input
+
+        The pieces of each input are collected in one pass and joined once, instead of growing
+        strings, so the cost is linear in the size of the output.
+
+        Args:
+            input_ids (Sequence[int]): Input id of each sentence
+            paragraph_ids (Sequence[int]): Paragraph id of each sentence
+            sentences (List[str]): Sentences to join up by input and paragraph ids
+            paragraph_join_str (str, optional): str to use to join paragraphs. Defaults to "\n".
+            sent_join_str (str, optional): str to join up sentences. Defaults to " ".
+            length (Optional[int], optional): Number of inputs. Defaults to the largest input id + 1.
+
         Returns:
             List[str]: Joined up sentences
         """
@@ -82,19 +393,687 @@ class TranslatorABC(ABC):
             return [""] * (length or 0)
 
         target_len = length if length is not None else (max(input_ids) + 1)
-        ret = [""] * target_len
+        parts = [[] for _ in range(target_len)]
+        # Whether an input has non-empty text so far, separators only go between text
+        filled = bytearray(target_len)
         last_paragraph = 0
         for idx, paragraph, text in zip(input_ids, paragraph_ids, sentences):
-            if len(ret[idx]) > 0:
-                if paragraph == last_paragraph:
-                    ret[idx] += sent_join_str + text
+            if filled[idx]:
+                parts[idx].append(
+                    sent_join_str if paragraph == last_paragraph else paragraph_join_str
+                )
+                parts[idx].append(text)
+            else:
+                parts[idx] = [text]
+                filled[idx] = len(text) > 0
+            last_paragraph = paragraph
+        return ["".join(pieces) for pieces in parts]
+
+    def _segment_long_sentences(
+        self,
+        input_ids: Sequence[int],
+        paragraph_ids: Sequence[int],
+        sentences: List[str],
+        max_sentence_tokens: int,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        stats: Optional[dict] = None,
+    ):
+        """Split sentences longer than `max_sentence_tokens` tokens into shorter pieces
+
+        Pieces keep the input and paragraph ids of their sentence, so `_join_sentences` puts
+        them back together. Sentences are split at clause boundaries (; : and dashes) first,
+        then at commas, then into windows of words, and words that are still too long (text
+        without spaces, such as Chinese or Thai, or long URLs) into windows of tokens.
+
+        Args:
+            input_ids (Sequence[int]): Input ids from `_split_sentences`
+            paragraph_ids (Sequence[int]): Paragraph ids from `_split_sentences`
+            sentences (List[str]): Sentences from `_split_sentences`
+            max_sentence_tokens (int): Maximum number of tokens of a sentence, as tokenized for the model
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+            stats (Optional[dict], optional): Per-call statistics to update. Defaults to None.
+
+        Returns:
+            array, array, List[str]: Input ids, paragraph ids and sentences
+        """
+
+        def count_tokens(texts):
+            if not texts:
+                return []
+            return [
+                len(i)
+                for i in self.tokenize(texts, src_lang=src_lang, tgt_lang=tgt_lang)
+            ]
+
+        # Byte fallback pieces make some characters several tokens, so every sentence is counted
+        long_sentences = {
+            idx
+            for idx, length in enumerate(count_tokens(sentences))
+            if length > max_sentence_tokens
+        }
+        if stats is not None:
+            stats["segmented_sentences"] = len(long_sentences)
+        if not long_sentences:
+            return input_ids, paragraph_ids, sentences
+
+        def segment(sentence, level=0):
+            if level == len(_SEGMENT_BOUNDARY_RES):
+                return self._token_windows(
+                    sentence, max_sentence_tokens, src_lang=src_lang, tgt_lang=tgt_lang
+                )
+            parts = _SEGMENT_BOUNDARY_RES[level].split(sentence)
+            pieces = []
+            current = []
+            current_length = 0
+            for part, length in zip(parts, count_tokens(parts)):
+                if current and (
+                    length > max_sentence_tokens
+                    or current_length + length > max_sentence_tokens
+                ):
+                    pieces.append(" ".join(current))
+                    current = []
+                    current_length = 0
+                if length > max_sentence_tokens:
+                    pieces.extend(segment(part, level + 1))
                 else:
-                    ret[idx] += paragraph_join_str + text
-                last_paragraph = paragraph
+                    current.append(part)
+                    current_length += length
+            if current:
+                pieces.append(" ".join(current))
+            return pieces
+
+        new_input_ids, new_paragraph_ids, new_sentences = array("l"), array("l"), []
+        for idx, (input_id, paragraph_id, sent) in enumerate(
+            zip(input_ids, paragraph_ids, sentences)
+        ):
+            pieces = segment(sent) if idx in long_sentences else [sent]
+            new_input_ids.extend([input_id] * len(pieces))
+            new_paragraph_ids.extend([paragraph_id] * len(pieces))
+            new_sentences.extend(pieces)
+        return new_input_ids, new_paragraph_ids, new_sentences
+
+    def _token_windows(
+        self,
+        text: str,
+        max_tokens: int,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ) -> List[str]:
+        """Cut text without word boundaries into pieces of at most `max_tokens` tokens
+
+        Translators without a separate source tokenizer halve the text until each half is
+        short enough.
+
+        Args:
+            text (str): Text to cut
+            max_tokens (int): Maximum number of tokens of a piece, as tokenized for the model
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+
+        Returns:
+            List[str]: Pieces, in order
+        """
+        length = len(self.tokenize([text], src_lang=src_lang, tgt_lang=tgt_lang)[0])
+        if length <= max_tokens or len(text) < 2:
+            return [text]
+        middle = len(text) // 2
+        return self._token_windows(
+            text[:middle], max_tokens, src_lang=src_lang, tgt_lang=tgt_lang
+        ) + self._token_windows(
+            text[middle:], max_tokens, src_lang=src_lang, tgt_lang=tgt_lang
+        )
+
+    @staticmethod
+    def _is_untranslatable(sentence: str) -> bool:
+        """Whether a sentence has nothing to translate
+
+        True for sentences made only of numbers, prices, punctuation, symbols, emoji, URLs,
+        e-mail addresses and hashes, i.e. with no letters outside of verbatim spans.
+        """
+        return not any(c.isalpha() for c in _VERBATIM_SPAN_RE.sub("", sentence))
+
+    @staticmethod
+    def _mask_spans(sentence: str) -> tuple:
+        """Replace URLs, paths, inline code, entities, codes and numbers with placeholders
+
+        Each span becomes a short numbered placeholder (`[1]`, `[2]`, ...), so it costs a
+        few tokens instead of many and cannot be altered by the model. Repeated spans share
+        a placeholder.
+
+        Args:
+            sentence (str): Sentence to mask
+
+        Returns:
+            tuple: The masked sentence and the list of masked spans, placeholder `[n]` standing for `spans[n - 1]`
+        """
+        spans = []
+        numbers = {}
+
+        def placeholder(match):
+            span = match.group()
+            if span not in numbers:
+                spans.append(span)
+                numbers[span] = len(spans)
+            return PLACEHOLDER.format(numbers[span])
+
+        return _MASKED_SPAN_RE.sub(placeholder, sentence), spans
+
+    @staticmethod
+    def _unmask_spans(text: str, spans: List[str]) -> tuple:
+        """Restore the spans masked by `_mask_spans` in a translation
+
+        Returns:
+            tuple: The restored translation and the number of placeholders missing from it
+        """
+        found = set()
+
+        def restore(match):
+            number = int(match.group(1))
+            if not 0 < number <= len(spans):
+                return match.group()
+            found.add(number)
+            return spans[number - 1]
+
+        return PLACEHOLDER_RE.sub(restore, text), len(spans) - len(found)
+
+    @staticmethod
+    def _token_batches(
+        lengths: List[int], max_batch_tokens: int, max_batch_size: int = 0
+    ) -> List[List[int]]:
+        """Group sentences into length-sorted batches under a token budget
+
+        Sentences are sorted by tokenized length so that each batch holds
+        sentences of similar length and little padding. A batch is closed when
+        adding the next sentence would make its padded size (batch size times
+        longest sentence) exceed `max_batch_tokens`.
+
+        Args:
+            lengths (List[int]): Tokenized length of each sentence
+            max_batch_tokens (int): Maximum number of padded tokens per batch
+            max_batch_size (int, optional): Maximum number of sentences per batch. 0 for no limit. Defaults to 0.
+
+        Returns:
+            List[List[int]]: Batches of indices into `lengths`
+        """
+        batches = []
+        batch = []
+        for idx in sorted(range(len(lengths)), key=lengths.__getitem__):
+            # Sorted ascending, so the new sentence is the longest in the batch
+            too_many_tokens = (len(batch) + 1) * lengths[idx] > max_batch_tokens
+            too_many_sents = max_batch_size > 0 and len(batch) >= max_batch_size
+            if batch and (too_many_tokens or too_many_sents):
+                batches.append(batch)
+                batch = []
+            batch.append(idx)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _decode_steps(
+        self,
+        input_text: List[List[str]],
+        max_batch_size: int = 32,
+        max_batch_tokens: Optional[int] = None,
+        adaptive_beam_threshold: Optional[float] = None,
+        stats: Optional[dict] = None,
+        **kwargs,
+    ):
+        """Plan the `translate_batch` calls needed to translate tokenized sentences
+
+        This is a generator so that the same decoding logic can be driven synchronously
+        (`_run_decode`) or from asyncio (`_run_decode_async`). It yields rounds of
+        `translate_batch` calls as lists of (tokenized batch, kwargs), is sent back one list of
+        results per call, and returns one CTranslate2 result per sentence in input order.
+
+        With `adaptive_beam_threshold`, all sentences are first decoded greedily and only those
+        whose length-normalized log-probability falls below the threshold are decoded again
+        with `beam_size`. Their number is counted in `stats["escalated_sentences"]`.
+        Final translations that reach their decoding limit (see `_decoding_limits`) are
+        counted in `stats["length_limit_hits"]`, once per sentence.
+
+        Args:
+            input_text (List[List[str]]): Tokenized sentences
+            max_batch_size (int, optional): Maximum batch size. Defaults to 32.
+            max_batch_tokens (Optional[int], optional): If set, sort sentences by length and batch them by padded token count. Defaults to None.
+            adaptive_beam_threshold (Optional[float], optional): If set, decode greedily first and re-decode with beam search only the sentences scoring below this mean token log-probability (e.g. -0.5). Defaults to None.
+            stats (Optional[dict], optional): Per-call statistics to update. Defaults to None.
+            **kwargs: Other `translate_batch` args
+        """
+        if adaptive_beam_threshold is None or kwargs.get("beam_size") == 1:
+            results = yield from self._decode_batches(
+                input_text, max_batch_size, max_batch_tokens, **kwargs
+            )
+            self._count_length_limit_hits(input_text, results, stats, **kwargs)
+            return results
+
+        # With a length penalty of 1, scores are the mean log-probability per token
+        results = yield from self._decode_batches(
+            input_text,
+            max_batch_size,
+            max_batch_tokens,
+            **dict(kwargs, beam_size=1, length_penalty=1.0, return_scores=True),
+        )
+        escalated = [
+            idx
+            for idx, result in enumerate(results)
+            if result.scores[0] < adaptive_beam_threshold
+        ]
+        if stats is not None:
+            stats["escalated_sentences"] = stats.get("escalated_sentences", 0) + len(
+                escalated
+            )
+        if escalated:
+            if kwargs.get("target_prefix") is not None:
+                kwargs["target_prefix"] = [
+                    kwargs["target_prefix"][idx] for idx in escalated
+                ]
+            beam_results = yield from self._decode_batches(
+                [input_text[idx] for idx in escalated],
+                max_batch_size,
+                max_batch_tokens,
+                **kwargs,
+            )
+            for idx, result in zip(escalated, beam_results):
+                results[idx] = result
+        self._count_length_limit_hits(input_text, results, stats, **kwargs)
+        return results
+
+    def _count_length_limit_hits(
+        self,
+        input_text: List[List[str]],
+        results: List,
+        stats: Optional[dict],
+        max_decoding_length: int = 256,
+        **kwargs,
+    ):
+        """Count the translations that reached their decoding limit in `stats["length_limit_hits"]`"""
+        if stats is None:
+            return
+        limits = self._decoding_limits(input_text, max_decoding_length)
+        hits = sum(
+            len(result.hypotheses[0]) >= limit for result, limit in zip(results, limits)
+        )
+        stats["length_limit_hits"] = stats.get("length_limit_hits", 0) + hits
+
+    def _decoding_limits(
+        self, input_text: List[List[str]], max_decoding_length: int
+    ) -> List[int]:
+        """Maximum translation length of each sentence, from its length in tokens
+
+        Limits are rounded up to a multiple of 16 so sentences of similar length share a batch.
+        """
+        if self.max_decoding_length_ratio is None:
+            return [max_decoding_length] * len(input_text)
+        limits = []
+        for tokens in input_text:
+            limit = (
+                self.max_decoding_length_ratio * len(tokens)
+                + self.max_decoding_length_offset
+            )
+            limits.append(min(max_decoding_length, 16 * ceil(limit / 16)))
+        return limits
+
+    def _decode_batches(
+        self,
+        input_text: List[List[str]],
+        max_batch_size: int = 32,
+        max_batch_tokens: Optional[int] = None,
+        max_decoding_length: int = 256,
+        **kwargs,
+    ):
+        """One round of `translate_batch` calls over all sentences, see `_decode_steps`
+
+        Sentences are grouped by decoding limit (see `_decoding_limits`) and each group is
+        decoded with its own `max_decoding_length`. All the calls are yielded as one round, so
+        the groups are decoded at the same time rather than one after the other. A
+        `target_prefix` (one per sentence) is split along with the sentences.
+        """
+        target_prefix = kwargs.pop("target_prefix", None)
+        groups = {}
+        limits = self._decoding_limits(input_text, max_decoding_length)
+        for idx, limit in enumerate(limits):
+            groups.setdefault(limit, []).append(idx)
+
+        calls = []
+        for limit, group in sorted(groups.items()):
+            call_kwargs = dict(kwargs, max_decoding_length=limit)
+            if not max_batch_tokens:
+                calls.append((group, dict(call_kwargs, max_batch_size=max_batch_size)))
+                continue
+            lengths = [len(input_text[i]) for i in group]
+            for batch in self._token_batches(lengths, max_batch_tokens, max_batch_size):
+                calls.append(
+                    (
+                        [group[i] for i in batch],
+                        dict(call_kwargs, max_batch_size=len(batch)),
+                    )
+                )
+
+        if target_prefix is not None:
+            for indices, call_kwargs in calls:
+                call_kwargs["target_prefix"] = [target_prefix[i] for i in indices]
+
+        batch_results = yield [
+            ([input_text[i] for i in indices], call_kwargs)
+            for indices, call_kwargs in calls
+        ]
+
+        results = [None] * len(input_text)
+        for (indices, _), batch_result in zip(calls, batch_results):
+            for idx, result in zip(indices, batch_result):
+                results[idx] = result
+        return results
+
+    @staticmethod
+    def _count_batches(calls: List[tuple]) -> int:
+        """Number of batches CTranslate2 runs for a round of (batch, kwargs) calls
+
+        `translate_batch` splits each call into batches of at most `max_batch_size` sentences.
+        """
+        return sum(
+            (
+                ceil(len(batch) / kwargs["max_batch_size"])
+                if kwargs.get("max_batch_size")
+                else 1
+            )
+            for batch, kwargs in calls
+        )
+
+    def _submit_decode(self, calls: List[tuple], stats: dict) -> List[List]:
+        """Submit a round of `_decode_steps` calls with `asynchronous=True`"""
+        stats["batches"] = stats.get("batches", 0) + self._count_batches(calls)
+        return [
+            self.translate_batch(batch, asynchronous=True, **kwargs)
+            for batch, kwargs in calls
+        ]
+
+    def _run_decode(
+        self,
+        steps,
+        stats: Optional[dict] = None,
+        submitted: Optional[List[List]] = None,
+    ):
+        """Run a `_decode_steps` generator, blocking until each round is decoded
+
+        All the `translate_batch` calls of a round are submitted with `asynchronous=True`
+        before any result is waited for, so CTranslate2 can decode them at the same time on
+        its `inter_threads` replicas. `submitted` is the first round, if it was already
+        submitted with `_submit_decode`.
+        """
+        stats = {} if stats is None else stats
+        try:
+            if submitted is None:
+                submitted = self._submit_decode(next(steps), stats)
+            while True:
+                calls = steps.send(
+                    [[r.result() for r in results] for results in submitted]
+                )
+                submitted = self._submit_decode(calls, stats)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _run_decode_async(self, steps, stats: Optional[dict] = None):
+        """Run a `_decode_steps` generator without blocking the event loop
+
+        Batches are submitted with `asynchronous=True` and awaited through the translator's
+        `_ResultPoller`, so no thread is held while CTranslate2 decodes and concurrent
+        requests share one polling task.
+        """
+        stats = {} if stats is None else stats
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.loop is not loop:
+            self._poller = _ResultPoller()
+        try:
+            calls = next(steps)
+            while True:
+                pending = [
+                    [self._poller.wait(result) for result in results]
+                    for results in self._submit_decode(calls, stats)
+                ]
+                calls = steps.send(
+                    [await asyncio.gather(*futures) for futures in pending]
+                )
+        except StopIteration as stop:
+            return stop.value
+
+    def _translate_tokens(
+        self, input_text: List[List[str]], stats: Optional[dict] = None, **kwargs
+    ):
+        """Translate tokenized sentences, see `_decode_steps` for args
+
+        Returns:
+            List: One CTranslate2 result per sentence, in input order
+        """
+        return self._run_decode(
+            self._decode_steps(input_text, stats=stats, **kwargs), stats
+        )
+
+    def _sentence_cache_key(
+        self,
+        src_lang: Optional[str],
+        tgt_lang: Optional[str],
+        decoding_kwargs: dict,
+    ) -> Optional[tuple]:
+        """Build the part of the sentence cache key shared by all sentences of a call
+
+        Returns None if the sentence cache is disabled or the decoding arguments are not hashable.
+        """
+        if self.sentence_cache is None:
+            return None
+        key = (src_lang, tgt_lang, tuple(sorted(decoding_kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def sentence_cache_info(self) -> dict:
+        """Sentence cache statistics
+
+        Returns:
+            dict: Hits, misses, current size and maximum size of the sentence cache
+        """
+        return {
+            "hits": self.counters["sentence_cache_hits"],
+            "misses": self.counters["sentence_cache_misses"],
+            "size": len(self.sentence_cache) if self.sentence_cache is not None else 0,
+            "maxsize": (
+                self.sentence_cache.maxsize if self.sentence_cache is not None else 0
+            ),
+        }
+
+    def _prepare_sentences(
+        self,
+        sentences: List[str],
+        verbose: bool = False,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        stats: Optional[dict] = None,
+        **kwargs,
+    ) -> "_PendingSentences":
+        """Deduplicate sentences, look them up in the sentence cache and tokenize the rest
+
+        Sentences with nothing to translate are copied to the output as they are. Repeated
+        sentences are decoded once and their translation is copied to every occurrence.
+
+        Args:
+            sentences (List[str]): Sentences to translate
+            verbose (bool, optional): Print intermediate results. Defaults to False.
+            skip_untranslatable (bool, optional): Copy sentences without any text to translate instead of decoding them. Defaults to True.
+            mask_placeholders (bool, optional): Replace URLs, paths, inline code, entities, codes and numbers with placeholders before tokenizing, see `_mask_spans`. Defaults to False.
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+            stats (Optional[dict], optional): Per-call statistics to update. Defaults to None.
+            **kwargs: Decoding args passed to `translate_batch`
+
+        Returns:
+            _PendingSentences: Cached translations and the tokenized sentences left to decode
+        """
+        job = _PendingSentences(sentences, stats)
+        unique = []
+        first_seen = {}
+        passthrough = 0
+        for idx, sent in enumerate(sentences):
+            if skip_untranslatable and self._is_untranslatable(sent):
+                job.translated[idx] = sent
+                passthrough += 1
+                continue
+            first = first_seen.setdefault(sent, idx)
+            if first == idx:
+                unique.append(idx)
             else:
-                ret[idx] = text
-                last_paragraph = paragraph
-        return ret
+                job.duplicates.append((idx, first))
+        job.stats["sentences"] = len(sentences)
+        job.stats["passthrough_sentences"] = passthrough
+        job.stats["deduplicated_sentences"] = len(job.duplicates)
+
+        job.cache_key = self._sentence_cache_key(
+            src_lang, tgt_lang, dict(kwargs, mask_placeholders=mask_placeholders)
+        )
+        if job.cache_key is None:
+            job.pending = unique
+        else:
+            with self.sentence_cache_lock:
+                for idx in unique:
+                    hit = self.sentence_cache.get((sentences[idx], job.cache_key))
+                    if hit is None:
+                        job.pending.append(idx)
+                    else:
+                        job.translated[idx] = hit
+            job.stats["sentence_cache_hits"] = len(unique) - len(job.pending)
+            job.stats["sentence_cache_misses"] = len(job.pending)
+
+        job.stats["decoded_sentences"] = len(job.pending)
+        if job.pending:
+            t0 = perf_counter()
+            pending_sentences = [sentences[i] for i in job.pending]
+            if mask_placeholders:
+                masked = [self._mask_spans(sent) for sent in pending_sentences]
+                pending_sentences = [sent for sent, _ in masked]
+                job.masked_spans = [spans for _, spans in masked]
+                job.stats["masked_spans"] = sum(len(i) for i in job.masked_spans)
+            job.input_text = self.tokenize(
+                pending_sentences,
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+            )
+            job.stats["tokenize_time"] = perf_counter() - t0
+            if verbose:
+                print(f"Tokenized input: {job.input_text}")
+        return job
+
+    def _finish_sentences(
+        self,
+        job: "_PendingSentences",
+        results: List,
+        verbose: bool = False,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ) -> List[str]:
+        """Detokenize decoded sentences, fill them into the sentence cache and merge with the cache hits
+
+        Returns:
+            List[str]: One translation per sentence of `job`
+        """
+        output_tokens = [i.hypotheses[0] for i in results]
+        job.stats["source_tokens"] = sum(len(i) for i in job.input_text)
+        job.stats["target_tokens"] = sum(len(i) for i in output_tokens)
+
+        if verbose:
+            print(f"Tokenized output: {output_tokens}")
+
+        t0 = perf_counter()
+        translated_pending = self.detokenize(
+            output_tokens, src_lang=src_lang, tgt_lang=tgt_lang
+        )
+        job.stats["detokenize_time"] = perf_counter() - t0
+        if job.masked_spans is not None:
+            missing = 0
+            for i, spans in enumerate(job.masked_spans):
+                if spans:
+                    translated_pending[i], n = self._unmask_spans(
+                        translated_pending[i], spans
+                    )
+                    missing += n
+            job.stats["missing_placeholders"] = missing
+            if missing:
+                logger.warning(f"{missing} masked spans missing from translations")
+        if job.cache_key is not None:
+            with self.sentence_cache_lock:
+                for idx, text in zip(job.pending, translated_pending):
+                    self.sentence_cache[(job.sentences[idx], job.cache_key)] = text
+
+        return job.complete(translated_pending)
+
+    def _translate_sentences(
+        self,
+        sentences: List[str],
+        max_batch_size: int = 32,
+        max_batch_tokens: Optional[int] = None,
+        verbose: bool = False,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        stats: Optional[dict] = None,
+        **kwargs,
+    ) -> List[str]:
+        """Translate a list of already split sentences
+
+        Sentences found in the sentence cache are not tokenized or decoded again.
+
+        Args:
+            sentences (List[str]): Sentences to translate
+            max_batch_size (int, optional): Maximum batch size. Defaults to 32.
+            max_batch_tokens (Optional[int], optional): Token budget per batch, see `_decode_steps`. Defaults to None.
+            verbose (bool, optional): Print intermediate results. Defaults to False.
+            skip_untranslatable (bool, optional): Copy sentences without any text to translate, see `_prepare_sentences`. Defaults to True.
+            mask_placeholders (bool, optional): Mask URLs, paths, code and numbers with placeholders, see `_mask_spans`. Defaults to False.
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+            stats (Optional[dict], optional): Per-call statistics to update, see `add_hook`. Defaults to None.
+            **kwargs: Decoding args passed to `translate_batch`
+
+        Returns:
+            List[str]: One translation per sentence
+        """
+        job = self._prepare_sentences(
+            sentences,
+            verbose=verbose,
+            skip_untranslatable=skip_untranslatable,
+            mask_placeholders=mask_placeholders,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            stats=stats,
+            **kwargs,
+        )
+        if not job.pending:
+            return job.complete([])
+        if kwargs.get("target_prefix") is not None:
+            # Lists are not hashable, so prefixed sentences also bypass the sentence cache
+            kwargs["target_prefix"] = [kwargs["target_prefix"][i] for i in job.pending]
+
+        t0 = perf_counter()
+        results = self._translate_tokens(
+            job.input_text,
+            stats=job.stats,
+            max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            **kwargs,
+        )
+        job.stats["translate_batch_time"] = perf_counter() - t0
+        if verbose:
+            print(f"Translation time: {job.stats['translate_batch_time']}")
+
+        return self._finish_sentences(
+            job, results, verbose=verbose, src_lang=src_lang, tgt_lang=tgt_lang
+        )
 
     @abstractmethod
     def tokenize(
@@ -112,6 +1091,19 @@ class TranslatorABC(ABC):
         tgt_lang: Optional[str] = None,
     ): ...
 
+    def _target_tokens(
+        self,
+        sentences: List[str],
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ) -> List[List[str]]:
+        """Tokenize translations with the target tokenizer, to reuse them as target prefix
+
+        Translators without a separate target tokenizer return no tokens, so their documents
+        are translated without target prefixes.
+        """
+        return [[] for _ in sentences]
+
     @abstractmethod
     def translate_batch(
         self,
@@ -120,6 +1112,27 @@ class TranslatorABC(ABC):
         tgt_lang: Optional[str] = None,
     ): ...
 
+    def generate_tokens(
+        self,
+        input_tokens: List[str],
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        **kwargs,
+    ) -> Iterator:
+        """Translate one tokenized sentence greedily, token by token
+
+        Translators whose backend cannot stream tokens decode the whole sentence with
+        `translate_batch` and yield its tokens afterwards, so `translate_tokens_stream`
+        still works but only emits each sentence once it is decoded.
+        """
+        kwargs["beam_size"] = 1
+        result = self.translate_batch(
+            [input_tokens], src_lang=src_lang, tgt_lang=tgt_lang, **kwargs
+        )[0]
+        tokens = result.hypotheses[0]
+        for step, token in enumerate(tokens):
+            yield _GenerationStep(step, token, step == len(tokens) - 1)
+
     @abstractmethod
     def unload(self): ...
 
@@ -130,11 +1143,16 @@ class TranslatorABC(ABC):
         max_batch_size: int = 32,
         max_decoding_length: int = 256,
         beam_size: int = 2,
+        max_batch_tokens: Optional[int] = None,
+        adaptive_beam_threshold: Optional[float] = None,
+        max_sentence_tokens: Optional[int] = None,
         patience: int = 1,
         length_penalty: float = 1.0,
         coverage_penalty: float = 0.0,
         repetition_penalty: float = 1.0,
         verbose: bool = False,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
         src_lang: Union[None, str] = None,
         tgt_lang: Union[None, str] = None,
         **kwargs,
@@ -145,8 +1163,13 @@ class TranslatorABC(ABC):
             src (List[str]): Input list of strings to translate
             max_batch_size (int, optional): Maximum batch size, to constrain RAM utilization. Defaults to 32.
             beam_size (int, optional): CTranslate2 Beam size. Defaults to 5.
+            max_batch_tokens (Optional[int], optional): Sort sentences by tokenized length and batch by padded token count instead of sentence count. Defaults to None.
+            adaptive_beam_threshold (Optional[float], optional): Decode greedily first and re-decode with `beam_size` only the sentences whose mean token log-probability is below this threshold (e.g. -0.5). Defaults to None.
+            max_sentence_tokens (Optional[int], optional): Split sentences longer than this many tokens at clause boundaries, commas or word windows and translate the pieces separately. Defaults to None.
             patience (int, optional): CTranslate2 Patience. Defaults to 1.
             max_decoding_length (int, optional): Maximum length of translation
+            skip_untranslatable (bool, optional): Copy sentences made only of numbers, URLs, e-mails, hashes, emoji or punctuation to the output without decoding them. Defaults to True.
+            mask_placeholders (bool, optional): Replace URLs, file paths, inline code, entities, product codes and numbers with numbered placeholders before translating and restore them afterwards. Shortens the sequences and keeps these spans intact. Placeholders dropped by the model are counted in the `missing_placeholders` statistic. Defaults to False.
             **args: Other CTranslate2 translate_batch args, see https://opennmt.net/CTranslate2/python/ctranslate2.Translator.html#ctranslate2.Translator.translate_batch
 
         Returns:
@@ -158,123 +1181,846 @@ class TranslatorABC(ABC):
         else:
             return_string = False
 
-        indices, paragraphs, sentences = self._sentence_split(src)
+        stats = {"inputs": len(src)}
+        t0 = perf_counter()
+        indices, paragraphs, sentences = self._split_sentences(src)
+        if max_sentence_tokens:
+            indices, paragraphs, sentences = self._segment_long_sentences(
+                indices,
+                paragraphs,
+                sentences,
+                max_sentence_tokens,
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+                stats=stats,
+            )
+        stats["split_time"] = perf_counter() - t0
 
         if not sentences:
+            self._report(stats)
             return "" if return_string else [""] * len(src)
 
         if verbose:
             print(f"Split sentences: {sentences}")
 
-        input_text = self.tokenize(sentences, src_lang=src_lang, tgt_lang=tgt_lang)
-        if verbose:
-            print(f"Tokenized input: {input_text}")
+        translated_sents = self._translate_sentences(
+            sentences,
+            max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            verbose=verbose,
+            skip_untranslatable=skip_untranslatable,
+            mask_placeholders=mask_placeholders,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            stats=stats,
+            beam_size=beam_size,
+            adaptive_beam_threshold=adaptive_beam_threshold,
+            patience=patience,
+            length_penalty=length_penalty,
+            coverage_penalty=coverage_penalty,
+            repetition_penalty=repetition_penalty,
+            max_decoding_length=max_decoding_length,
+            **kwargs,
+        )
 
-        t1 = time()
-        results = self.translate_batch(
-            input_text,
+        t0 = perf_counter()
+        ret = self._join_sentences(
+            indices, paragraphs, translated_sents, length=len(src)
+        )
+        stats["join_time"] = perf_counter() - t0
+        self._report(stats)
+
+        if return_string:
+            return ret[0]
+        else:
+            return ret
+
+    async def translate_async(
+        self,
+        src: Union[str, List[str]],
+        max_batch_size: int = 32,
+        max_decoding_length: int = 256,
+        beam_size: int = 2,
+        max_batch_tokens: Optional[int] = None,
+        adaptive_beam_threshold: Optional[float] = None,
+        max_sentence_tokens: Optional[int] = None,
+        patience: int = 1,
+        length_penalty: float = 1.0,
+        coverage_penalty: float = 0.0,
+        repetition_penalty: float = 1.0,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
+        src_lang: Union[None, str] = None,
+        tgt_lang: Union[None, str] = None,
+        **kwargs,
+    ) -> Union[str, List[str]]:
+        """Translate a list of strings with quickmt model from asyncio code
+
+        Same arguments and result as `__call__`. Sentence splitting, tokenization and
+        detokenization run in a worker thread, and decoding is submitted to CTranslate2 with
+        `asynchronous=True` and awaited without holding a thread, so many translations can be
+        in flight at once.
+
+        Returns:
+            Union[str, List[str]]: Translation of the input
+        """
+        return_string = isinstance(src, str)
+        if return_string:
+            src = [src]
+
+        decoding_kwargs = dict(
             beam_size=beam_size,
+            adaptive_beam_threshold=adaptive_beam_threshold,
             patience=patience,
             length_penalty=length_penalty,
             coverage_penalty=coverage_penalty,
             repetition_penalty=repetition_penalty,
             max_decoding_length=max_decoding_length,
+            **kwargs,
+        )
+
+        stats = {"inputs": len(src)}
+
+        def prepare():
+            t0 = perf_counter()
+            indices, paragraphs, sentences = self._split_sentences(src)
+            if max_sentence_tokens:
+                indices, paragraphs, sentences = self._segment_long_sentences(
+                    indices,
+                    paragraphs,
+                    sentences,
+                    max_sentence_tokens,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    stats=stats,
+                )
+            stats["split_time"] = perf_counter() - t0
+            job = self._prepare_sentences(
+                sentences,
+                skip_untranslatable=skip_untranslatable,
+                mask_placeholders=mask_placeholders,
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+                stats=stats,
+                **decoding_kwargs,
+            )
+            return indices, paragraphs, job
+
+        def finish(results):
+            if job.pending:
+                translated_sents = self._finish_sentences(
+                    job, results, src_lang=src_lang, tgt_lang=tgt_lang
+                )
+            else:
+                translated_sents = job.complete([])
+            t0 = perf_counter()
+            ret = self._join_sentences(
+                indices, paragraphs, translated_sents, length=len(src)
+            )
+            stats["join_time"] = perf_counter() - t0
+            return ret
+
+        indices, paragraphs, job = await asyncio.to_thread(prepare)
+        results = []
+        if job.pending:
+            t0 = perf_counter()
+            results = await self._run_decode_async(
+                self._decode_steps(
+                    job.input_text,
+                    max_batch_size=max_batch_size,
+                    max_batch_tokens=max_batch_tokens,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    stats=stats,
+                    **decoding_kwargs,
+                ),
+                stats,
+            )
+            stats["translate_batch_time"] = perf_counter() - t0
+        ret = await asyncio.to_thread(finish, results)
+        self._report(stats)
+
+        return ret[0] if return_string else ret
+
+    def translate_segments(
+        self,
+        src: Union[List[str], List[List[str]]],
+        input_format: str = "sentences",
+        output_format: str = "text",
+        max_batch_size: int = 32,
+        max_batch_tokens: Optional[int] = None,
+        beam_size: int = 2,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        **kwargs,
+    ) -> Union[List[str], List[List[str]]]:
+        """Translate input that is already split into sentences, or already tokenized
+
+        Unlike `__call__`, inputs are not split with Blingfire or joined back: each input is
+        translated as one sentence. Pre-tokenized inputs are not tokenized again either, and
+        go straight to `translate_batch`.
+
+        Args:
+            src (Union[List[str], List[List[str]]]): Sentences, or SentencePiece pieces of each sentence
+            input_format (str, optional): 'sentences' or 'tokens'. Defaults to "sentences".
+            output_format (str, optional): 'text', or 'tokens' for the target pieces before detokenization. Defaults to "text".
+            max_batch_size (int, optional): Maximum batch size. Defaults to 32.
+            max_batch_tokens (Optional[int], optional): Token budget per batch, see `_decode_steps`. Defaults to None.
+            beam_size (int, optional): CTranslate2 Beam size. Defaults to 2.
+            skip_untranslatable (bool, optional): Copy sentences without text to translate, see `__call__`. Only for sentences translated to text. Defaults to True.
+            mask_placeholders (bool, optional): Mask URLs, paths, code and numbers, see `__call__`. Only for sentences translated to text. Defaults to False.
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+            **kwargs: Other translation args, see `__call__`
+
+        Returns:
+            Union[List[str], List[List[str]]]: One translation, or list of target pieces, per input
+        """
+        if input_format not in ("sentences", "tokens"):
+            raise ValueError(f"Unsupported input_format {input_format!r}")
+        if output_format not in ("text", "tokens"):
+            raise ValueError(f"Unsupported output_format {output_format!r}")
+
+        stats = {"inputs": len(src)}
+        if not src:
+            self._report(stats)
+            return []
+        kwargs.update(
             max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            beam_size=beam_size,
             src_lang=src_lang,
             tgt_lang=tgt_lang,
-            **kwargs,
         )
-        t2 = time()
-        if verbose:
-            print(f"Translation time: {t2 - t1}")
 
-        output_tokens = [i.hypotheses[0] for i in results]
+        if input_format == "sentences" and output_format == "text":
+            ret = self._translate_sentences(
+                src,
+                skip_untranslatable=skip_untranslatable,
+                mask_placeholders=mask_placeholders,
+                stats=stats,
+                **kwargs,
+            )
+            self._report(stats)
+            return ret
 
-        if verbose:
-            print(f"Tokenized output: {output_tokens}")
+        stats["sentences"] = stats["decoded_sentences"] = len(src)
+        if input_format == "tokens":
+            input_text = [
+                pieces if pieces and pieces[-1] == "</s>" else list(pieces) + ["</s>"]
+                for pieces in src
+            ]
+        else:
+            t0 = perf_counter()
+            input_text = self.tokenize(src, src_lang=src_lang, tgt_lang=tgt_lang)
+            stats["tokenize_time"] = perf_counter() - t0
 
-        translated_sents = self.detokenize(
-            output_tokens, src_lang=src_lang, tgt_lang=tgt_lang
+        t0 = perf_counter()
+        results = self._translate_tokens(input_text, stats=stats, **kwargs)
+        stats["translate_batch_time"] = perf_counter() - t0
+        ret = [i.hypotheses[0] for i in results]
+        stats["source_tokens"] = sum(len(i) for i in input_text)
+        stats["target_tokens"] = sum(len(i) for i in ret)
+
+        if output_format == "text":
+            t0 = perf_counter()
+            ret = self.detokenize(ret, src_lang=src_lang, tgt_lang=tgt_lang)
+            stats["detokenize_time"] = perf_counter() - t0
+        self._report(stats)
+        return ret
+
+    def translate_document(
+        self,
+        src: str,
+        document_id: Hashable,
+        beam_size: int = 2,
+        max_sentence_tokens: Optional[int] = None,
+        reuse_prefix: bool = False,
+        revision: Optional[int] = None,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        """Translate a new version of a document, only decoding what changed since the last one
+
+        The segmentation and translation of the last version of each document are kept in a
+        bounded store (see `document_cache_size`). The lines of the new version are diffed
+        against it: unchanged lines are neither split nor translated again, and in edited or
+        new lines only the sentences the last version did not have are decoded. The result is
+        the same as translating the whole document with `__call__`.
+
+        For text being typed, `reuse_prefix` also reuses the translation of a sentence that
+        was extended: it is decoded again with its previous translation, less its last
+        tokens, as `target_prefix`, so only its new end is searched.
+
+        Args:
+            src (str): Full text of the new version of the document
+            document_id (Hashable): Key of the document in the store
+            beam_size (int, optional): CTranslate2 Beam size. Defaults to 2.
+            reuse_prefix (bool, optional): Decode sentences that extend a sentence of the last version with its translation as target prefix. The result then differs from `__call__`. Defaults to False.
+            revision (Optional[int], optional): Revision of the document. A version older than the stored one is translated but does not replace it, so late requests cannot roll it back. Defaults to None.
+            max_sentence_tokens (Optional[int], optional): Split longer sentences, see `__call__`. Defaults to None.
+            src_lang (Optional[str], optional): Source language. Defaults to None.
+            tgt_lang (Optional[str], optional): Target language. Defaults to None.
+            **kwargs: Other translation args, see `__call__`
+
+        Returns:
+            str: Translation of the document
+        """
+        stats = {"inputs": 1}
+        t0 = perf_counter()
+        kwargs["beam_size"] = beam_size
+        paragraphs = src.splitlines(keepends=True)
+        options = (
+            src_lang,
+            tgt_lang,
+            max_sentence_tokens,
+            tuple(sorted(kwargs.items())),
         )
+        sentences: List[Optional[List[str]]] = [None] * len(paragraphs)
+        translations: List[Optional[List[str]]] = [None] * len(paragraphs)
 
-        ret = self._sentence_join(
-            indices, paragraphs, translated_sents, length=len(src)
+        previous = None
+        if self.document_cache is not None:
+            with self.document_cache_lock:
+                previous = self.document_cache.get(document_id)
+        known = {}
+        if previous is not None and previous.options == options:
+            matcher = SequenceMatcher(
+                None, previous.paragraphs, paragraphs, autojunk=False
+            )
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == "equal":
+                    sentences[j1:j2] = previous.sentences[i1:i2]
+                    translations[j1:j2] = previous.translations[i1:i2]
+            for sents, trans in zip(previous.sentences, previous.translations):
+                known.update(zip(sents, trans))
+
+        # Split the changed lines
+        changed = [j for j, sents in enumerate(sentences) if sents is None]
+        input_ids, paragraph_ids, new_sentences = self._split_sentences(
+            [paragraphs[j] for j in changed]
         )
+        if max_sentence_tokens:
+            input_ids, paragraph_ids, new_sentences = self._segment_long_sentences(
+                input_ids,
+                paragraph_ids,
+                new_sentences,
+                max_sentence_tokens,
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+                stats=stats,
+            )
+        for j in changed:
+            sentences[j] = []
+        for idx, sent in zip(input_ids, new_sentences):
+            sentences[changed[idx]].append(sent)
+        stats["split_time"] = perf_counter() - t0
 
-        if return_string:
-            return ret[0]
-        else:
-            return ret
+        # Translate the sentences the last version did not have
+        pending = [sent for sent in dict.fromkeys(new_sentences) if sent not in known]
+        if pending and reuse_prefix and known and not kwargs.get("mask_placeholders"):
+            prefixes = self._previous_prefixes(pending, previous, sentences, tgt_lang)
+            if any(prefixes):
+                kwargs["target_prefix"] = prefixes
+                stats["prefixed_sentences"] = sum(1 for i in prefixes if i)
+        if pending:
+            known.update(
+                zip(
+                    pending,
+                    self._translate_sentences(
+                        pending,
+                        src_lang=src_lang,
+                        tgt_lang=tgt_lang,
+                        stats=stats,
+                        **kwargs,
+                    ),
+                )
+            )
+        for j in changed:
+            translations[j] = [known[sent] for sent in sentences[j]]
+        stats["sentences"] = sum(len(i) for i in sentences)
+        stats["reused_paragraphs"] = len(paragraphs) - len(changed)
+        stats["reused_sentences"] = stats["sentences"] - len(pending)
+
+        t0 = perf_counter()
+        paragraph_ids = array("l")
+        translated_sents = []
+        for j, trans in enumerate(translations):
+            paragraph_ids.extend([j] * len(trans))
+            translated_sents.extend(trans)
+        ret = self._join_sentences(
+            array("l", [0]) * len(translated_sents),
+            paragraph_ids,
+            translated_sents,
+            length=1,
+        )[0]
+        stats["join_time"] = perf_counter() - t0
+
+        if self.document_cache is not None:
+            with self.document_cache_lock:
+                latest = self.document_cache.get(document_id)
+                if (
+                    revision is None
+                    or latest is None
+                    or latest.revision is None
+                    or revision >= latest.revision
+                ):
+                    self.document_cache[document_id] = _DocumentVersion(
+                        options, paragraphs, sentences, translations, revision
+                    )
+        self._report(stats)
+        return ret
+
+    def _previous_prefixes(
+        self,
+        pending: List[str],
+        previous: "_DocumentVersion",
+        sentences: List[List[str]],
+        tgt_lang: Optional[str] = None,
+    ) -> List[Optional[List[str]]]:
+        """Target prefix of each pending sentence that extends a sentence of the last version
+
+        The prefix is the translation of the longest such sentence, tokenized, less its last
+        `_PREFIX_MARGIN_TOKENS` tokens, which translated the unfinished end of the sentence.
+
+        Returns:
+            List[Optional[List[str]]]: Prefix tokens, or None, for each pending sentence
+        """
+        current = {sent for sents in sentences for sent in sents}
+        removed = {
+            sent: trans
+            for sents, translations in zip(previous.sentences, previous.translations)
+            for sent, trans in zip(sents, translations)
+            if sent not in current
+        }
+        extended = [
+            max((i for i in removed if sent.startswith(i)), key=len, default=None)
+            for sent in pending
+        ]
+        matched = [i for i in extended if i is not None]
+        if not matched:
+            return [None] * len(pending)
+        tokens = iter(
+            self._target_tokens([removed[i] for i in matched], tgt_lang=tgt_lang)
+        )
+        prefixes = []
+        for sent in extended:
+            prefix = next(tokens)[:-_PREFIX_MARGIN_TOKENS] if sent is not None else None
+            prefixes.append(prefix or None)
+        return prefixes
+
+    def translate_markup(
+        self, src: Union[str, List[str]], markup_format: str = "html", **kwargs
+    ) -> Union[str, List[str]]:
+        """Translate HTML or XML documents, leaving their markup untouched
+
+        Only the text of the documents is translated, in a single call batched across all
+        documents. Inline tags are kept around the words they enclose, and elements such as
+        `<code>`, `<script>` or `<pre>` are not translated, see `quickmt.markup`.
+
+        Args:
+            src (Union[str, List[str]]): HTML or XML document(s) to translate
+            markup_format (str, optional): 'html' or 'xml'. Defaults to "html".
+            **kwargs: Translation args, see `__call__`
+
+        Returns:
+            Union[str, List[str]]: Translated document(s)
+        """
+        return_string = isinstance(src, str)
+        documents = [
+            MarkupDocument(i, markup_format) for i in ([src] if return_string else src)
+        ]
+        segments = [segment for document in documents for segment in document.segments]
+        translations = iter(self(segments, **kwargs) if segments else [])
+
+        ret = []
+        for document in documents:
+            ret.append(
+                document.rebuild([next(translations) for _ in document.segments])
+            )
+            if document.missing_tags:
+                with self.counters_lock:
+                    self.counters["missing_markup_tags"] += document.missing_tags
+                logger.warning(
+                    f"{document.missing_tags} inline tags missing from translations"
+                )
+        return ret[0] if return_string else ret
+
+    def translate_json(
+        self, src: Any, selectors: Optional[List[str]] = None, **kwargs
+    ) -> Any:
+        """Translate the strings of a JSON document, keeping its structure
+
+        The strings selected by `selectors` are deduplicated and translated in a single call,
+        see `quickmt.structured`.
+
+        Args:
+            src (Any): Document to translate, as loaded by `json.loads`
+            selectors (Optional[List[str]], optional): Paths of the strings to translate, such as `items.*.name` or `**.description`. Defaults to every string.
+            **kwargs: Translation args, see `__call__`
+
+        Returns:
+            Any: Copy of the document with the selected strings translated
+        """
+        document = JsonDocument(src, selectors)
+        translations = self(document.segments, **kwargs) if document.segments else []
+        return document.rebuild(translations)
 
     @validate_call
-    def translate_file(self, input_file: str, output_file: str, **kwargs) -> None:
+    def translate_file(
+        self,
+        input_file: str,
+        output_file: str,
+        chunk_size: int = 1000,
+        resume: bool = False,
+        checkpoint_file: Optional[str] = None,
+        **kwargs,
+    ) -> None:
         """Translate a file with a quickmt model
 
+        The input is read and translated `chunk_size` lines at a time and each chunk is appended to
+        the output as soon as it is translated, so memory use does not depend on the file size.
+        After every chunk the number of lines written is saved to a checkpoint file, which is
+        removed once the whole file is translated.
+
         Args:
-            file_path (str): Path to plain-text file to translate
+            input_file (str): Path to plain-text file to translate
+            output_file (str): Path to write translations to, one line per input line
+            chunk_size (int, optional): Number of lines to translate at a time. Defaults to 1000.
+            resume (bool, optional): Continue an interrupted job from its checkpoint. Defaults to False.
+            checkpoint_file (Optional[str], optional): Path of the checkpoint file. Defaults to `output_file` + ".checkpoint".
+            **kwargs: Translation args, see `__call__`
         """
-        with open(input_file, "rt") as myfile:
-            src = myfile.readlines()
+        checkpoint_path = Path(checkpoint_file or f"{output_file}.checkpoint")
+
+        lines_done = 0
+        if resume and checkpoint_path.exists():
+            lines_done = int(checkpoint_path.read_text().strip() or 0)
+            if lines_done > 0 and not Path(output_file).exists():
+                logger.warning(
+                    f"Checkpoint {checkpoint_path} found but {output_file} is missing, "
+                    "translating from the start"
+                )
+                lines_done = 0
+
+        if lines_done > 0:
+            # Drop any output written after the last checkpoint
+            with open(output_file, "r+b") as myfile:
+                for _ in range(lines_done):
+                    myfile.readline()
+                myfile.truncate(myfile.tell())
+
+        with (
+            open(input_file, "rt") as infile,
+            open(output_file, "at" if lines_done > 0 else "wt") as outfile,
+        ):
+            for _ in islice(infile, lines_done):
+                pass
 
-        # Remove newlines
-        src = [i.strip() for i in src]
+            while True:
+                # Remove newlines
+                src = [i.strip() for i in islice(infile, chunk_size)]
+                if not src:
+                    break
 
-        # Translate
-        mt = self(src, **kwargs)
+                # Translate
+                mt = self(src, **kwargs)
 
-        # Replace newlines to ensure output is the same number of lines
-        mt = [i.replace("\n", "\t") for i in mt]
+                # Replace newlines to ensure output is the same number of lines
+                outfile.write("".join([i.replace("\n", "\t") + "\n" for i in mt]))
+                outfile.flush()
+                os.fsync(outfile.fileno())
 
-        with open(output_file, "wt") as myfile:
-            myfile.write("".join([i + "\n" for i in mt]))
+                lines_done += len(src)
+                self._write_checkpoint(checkpoint_path, lines_done)
+
+        checkpoint_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_path: Path, lines_done: int) -> None:
+        """Atomically record the number of lines written to the output file"""
+        tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+        tmp_path.write_text(str(lines_done))
+        os.replace(tmp_path, checkpoint_path)
 
     @validate_call
     def translate_stream(
         self,
-        src: Union[str, List[str]],
+        src: Union[str, Iterable[str]],
         max_batch_size: int = 32,
         max_decoding_length: int = 256,
         beam_size: int = 5,
+        max_batch_tokens: Optional[int] = None,
+        adaptive_beam_threshold: Optional[float] = None,
+        max_sentence_tokens: Optional[int] = None,
         patience: int = 1,
+        length_penalty: float = 1.0,
+        coverage_penalty: float = 0.0,
+        repetition_penalty: float = 1.0,
+        skip_untranslatable: bool = True,
+        mask_placeholders: bool = False,
         src_lang: Union[None, str] = None,
         tgt_lang: Union[None, str] = None,
+        prefetch: int = 1,
         **kwargs,
     ):
-        """Translate a list of strings with quickmt model
+        """Translate a stream of strings with quickmt model
+
+        `src` is consumed lazily, one batch of about `max_batch_size` sentences at a time. Each
+        batch is submitted to CTranslate2 asynchronously, and the following batches are split
+        and tokenized while it decodes. Memory use stays flat for unbounded inputs such as
+        message queues or log streams.
+
+        Batches go through the same steps as `__call__`: untranslatable and repeated sentences,
+        the sentence cache, decoding limits and adaptive beam search, so a sentence gets the
+        same translation streamed or not.
 
         Args:
-            src (List[str]): Input list of strings to translate
+            src (Union[str, Iterable[str]]): Input string, or any iterable or generator of strings to translate
             max_batch_size (int, optional): Maximum batch size, to constrain RAM utilization. Defaults to 32.
             beam_size (int, optional): CTranslate2 Beam size. Defaults to 5.
-            patience (int, optional): CTranslate2 Patience. Defaults to 1.
-            max_decoding_length (int, optional): Maximum length of translation
-            **args: Other CTranslate2 translate_batch args, see https://opennmt.net/CTranslate2/python/ctranslate2.Translator.html#ctranslate2.Translator.translate_batch
+            prefetch (int, optional): Number of batches to prepare ahead of the one being decoded. Defaults to 1.
+            **kwargs: Other translation args, see `__call__`
+
+        Yields:
+            dict: Input index, paragraph index, input sentence and translation of each sentence, in input order
         """
         if isinstance(src, str):
             src = [src]
+        decoding_kwargs = dict(
+            beam_size=beam_size,
+            adaptive_beam_threshold=adaptive_beam_threshold,
+            patience=patience,
+            length_penalty=length_penalty,
+            coverage_penalty=coverage_penalty,
+            repetition_penalty=repetition_penalty,
+            max_decoding_length=max_decoding_length,
+            **kwargs,
+        )
+
+        inputs = enumerate(src)
+        pending = deque()
+        while True:
+            while len(pending) <= prefetch:
+                batch = self._next_stream_batch(
+                    inputs,
+                    max_batch_size,
+                    max_sentence_tokens=max_sentence_tokens,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                )
+                if batch is None:
+                    break
+                indices, paragraphs, sentences, stats = batch
+                job = self._prepare_sentences(
+                    sentences,
+                    skip_untranslatable=skip_untranslatable,
+                    mask_placeholders=mask_placeholders,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    stats=stats,
+                    **decoding_kwargs,
+                )
+                steps = submitted = None
+                if job.pending:
+                    steps = self._decode_steps(
+                        job.input_text,
+                        max_batch_size=max_batch_size,
+                        max_batch_tokens=max_batch_tokens,
+                        src_lang=src_lang,
+                        tgt_lang=tgt_lang,
+                        stats=stats,
+                        **decoding_kwargs,
+                    )
+                    submitted = self._submit_decode(next(steps), stats)
+                pending.append((indices, paragraphs, job, steps, submitted))
 
-        indices, paragraphs, sentences = self._sentence_split(src)
+            if not pending:
+                break
+
+            indices, paragraphs, job, steps, submitted = pending.popleft()
+            if steps is None:
+                translations = job.complete([])
+            else:
+                # Only the time spent waiting counts, decoding overlaps with preparing the next batches
+                t0 = perf_counter()
+                results = self._run_decode(steps, job.stats, submitted)
+                job.stats["translate_batch_time"] = perf_counter() - t0
+                translations = self._finish_sentences(
+                    job, results, src_lang=src_lang, tgt_lang=tgt_lang
+                )
+            self._report(job.stats)
 
-        input_text = self.tokenize(sentences, src_lang=src_lang, tgt_lang=tgt_lang)
+            for idx, para, sent, translation in zip(
+                indices, paragraphs, job.sentences, translations
+            ):
+                yield {
+                    "input_idx": idx,
+                    "sentence_idx": para,
+                    "input_text": sent,
+                    "translation": translation,
+                }
 
-        translations_iterator = self.translator.translate_iterable(
-            input_text,
-            beam_size=beam_size,
-            patience=patience,
+    def _next_stream_batch(
+        self,
+        inputs: Iterator,
+        max_batch_size: int,
+        max_sentence_tokens: Optional[int] = None,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ):
+        """Split inputs until at least `max_batch_size` sentences are collected
+
+        Args:
+            inputs (Iterator): Iterator of (input index, input string)
+            max_batch_size (int): Number of sentences to collect
+            max_sentence_tokens (Optional[int], optional): Split longer sentences, see `__call__`. Defaults to None.
+
+        Returns:
+            Optional[tuple]: Input ids, paragraph ids, sentences and statistics of the batch, or None once `inputs` is exhausted
+        """
+        stats = {"inputs": 0}
+        indices, paragraphs, sentences = array("l"), array("l"), []
+        t0 = perf_counter()
+        for input_idx, text in inputs:
+            _, text_paragraphs, text_sentences = self._split_sentences([text])
+            stats["inputs"] += 1
+            indices.extend([input_idx] * len(text_sentences))
+            paragraphs.extend(text_paragraphs)
+            sentences.extend(text_sentences)
+            if len(sentences) >= max_batch_size:
+                break
+        if max_sentence_tokens and sentences:
+            indices, paragraphs, sentences = self._segment_long_sentences(
+                indices,
+                paragraphs,
+                sentences,
+                max_sentence_tokens,
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+                stats=stats,
+            )
+        stats["split_time"] = perf_counter() - t0
+
+        if not sentences:
+            return None
+        return indices, paragraphs, sentences, stats
+
+    @validate_call
+    def translate_tokens_stream(
+        self,
+        src: str,
+        max_decoding_length: int = 256,
+        repetition_penalty: float = 1.0,
+        skip_untranslatable: bool = True,
+        src_lang: Union[None, str] = None,
+        tgt_lang: Union[None, str] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        """Translate a string with quickmt model, yielding the translation as it is decoded
+
+        Sentences are decoded one after the other with CTranslate2's `generate_tokens`, and
+        the text decoded so far is detokenized after each token. Each new piece of text is
+        yielded as soon as it is known, so the first words of a long sentence are shown while
+        the rest of it decodes. Decoding is greedy, as `generate_tokens` does not support beam
+        search, and the translations are shared with `__call__(..., beam_size=1)` through the
+        sentence cache.
+
+        Args:
+            src (str): Input string to translate
+            max_decoding_length (int, optional): Maximum length of translation. Defaults to 256.
+            repetition_penalty (float, optional): Penalty applied to previously generated tokens. Defaults to 1.0.
+            skip_untranslatable (bool, optional): Copy sentences without any text to translate instead of decoding them. Defaults to True.
+            **kwargs: Other CTranslate2 generate_tokens args, see https://opennmt.net/CTranslate2/python/ctranslate2.Translator.html#ctranslate2.Translator.generate_tokens
+
+        Yields:
+            str: Pieces of the translation, which join up into the translation of `src`
+        """
+        stats = {"inputs": 1}
+        t0 = perf_counter()
+        indices, paragraphs, sentences = self._split_sentences([src])
+        stats["split_time"] = perf_counter() - t0
+        job = self._prepare_sentences(
+            sentences,
+            skip_untranslatable=skip_untranslatable,
+            src_lang=src_lang,
+            tgt_lang=tgt_lang,
+            stats=stats,
+            # Same cache key as a greedy `__call__` with these args
+            beam_size=1,
+            adaptive_beam_threshold=None,
+            patience=1,
+            length_penalty=1.0,
+            coverage_penalty=0.0,
+            repetition_penalty=repetition_penalty,
             max_decoding_length=max_decoding_length,
-            max_batch_size=max_batch_size,
             **kwargs,
         )
+        input_text = dict(zip(job.pending, job.input_text))
+        duplicates = dict(job.duplicates)
+        stats["source_tokens"] = sum(len(i) for i in job.input_text)
+        stats["target_tokens"] = 0
+        stats["translate_batch_time"] = 0.0
 
-        for idx, para, sent, output in zip(
-            indices, paragraphs, sentences, translations_iterator
-        ):
-            yield {
-                "input_idx": idx,
-                "sentence_idx": para,
-                "input_text": sent,
-                "translation": self.detokenize([output.hypotheses[0]])[0],
-            }
+        t_start = perf_counter()
+        filled = False
+        try:
+            for idx, paragraph in enumerate(paragraphs):
+                # Same separators as `_join_sentences`
+                if filled:
+                    yield " " if paragraph == paragraphs[idx - 1] else "\n"
+                if idx in duplicates:
+                    job.translated[idx] = job.translated[duplicates[idx]]
+                if job.translated[idx] is not None:
+                    yield job.translated[idx]
+                    filled = filled or len(job.translated[idx]) > 0
+                    continue
+
+                tokens = input_text[idx]
+                output_tokens = []
+                emitted = ""
+                t0 = perf_counter()
+                for step in self.generate_tokens(
+                    tokens,
+                    max_decoding_length=self._decoding_limits(
+                        [tokens], max_decoding_length
+                    )[0],
+                    repetition_penalty=repetition_penalty,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    **kwargs,
+                ):
+                    output_tokens.append(step.token)
+                    text = self.detokenize(
+                        [output_tokens], src_lang=src_lang, tgt_lang=tgt_lang
+                    )[0]
+                    # Wait for the rest of a split character, or for text that changed
+                    # with the last token to settle
+                    if text.endswith("\ufffd") or not text.startswith(emitted):
+                        continue
+                    if len(text) > len(emitted):
+                        if "first_token_time" not in stats:
+                            stats["first_token_time"] = perf_counter() - t_start
+                        yield text[len(emitted) :]
+                        emitted = text
+                stats["translate_batch_time"] += perf_counter() - t0
+                stats["target_tokens"] += len(output_tokens)
+
+                text = self.detokenize(
+                    [output_tokens], src_lang=src_lang, tgt_lang=tgt_lang
+                )[0]
+                if text.startswith(emitted) and len(text) > len(emitted):
+                    yield text[len(emitted) :]
+                job.translated[idx] = text
+                filled = filled or len(text) > 0
+                if job.cache_key is not None:
+                    with self.sentence_cache_lock:
+                        self.sentence_cache[(sentences[idx], job.cache_key)] = text
+        finally:
+            self._report(stats)
 
     def translate(self, *args, **kwargs):
         return self.__call__(*args, **kwargs)
@@ -286,6 +2032,12 @@ class Translator(TranslatorABC):
         model_path: str | DirectoryPath,
         inter_threads: int = 1,
         intra_threads: int = 0,
+        sentence_cache_size: int = 0,
+        quantized_cache: bool = False,
+        max_decoding_length_ratio: Optional[float] = None,
+        max_decoding_length_offset: int = 10,
+        use_vmap: bool = False,
+        document_cache_size: int = 0,
         **kwargs,
     ):
         """Create quickmt translation object
@@ -294,6 +2046,12 @@ class Translator(TranslatorABC):
             model_path (str | DirectoryPath): Quickmt Model ID or path to quickmt model folder
             inter_threads (int): Number of simultaneous translations
             intra_threads (int): Number of threads for each translation
+            sentence_cache_size (int): Number of sentence translations to memoize across calls. 0 disables the cache
+            quantized_cache (bool): Keep a copy of the model converted to `compute_type` on disk and load from it
+            max_decoding_length_ratio (Optional[float]): Limit each translation to `ratio * source tokens + offset` tokens
+            max_decoding_length_offset (int): Offset of the source-length based limit
+            use_vmap (bool): Restrict the output vocabulary with the model's vmap.txt
+            document_cache_size (int): Number of documents kept for incremental re-translation with `translate_document`. 0 disables it
             **kwargs: CTranslate2 Translator arguments - see https://opennmt.net/CTranslate2/python/ctranslate2.Translator.html
         """
         # snapshot_download returns the local path in the HF cache.
@@ -315,6 +2073,12 @@ class Translator(TranslatorABC):
 
         super().__init__(
             model_folder,
+            sentence_cache_size=sentence_cache_size,
+            quantized_cache=quantized_cache,
+            max_decoding_length_ratio=max_decoding_length_ratio,
+            max_decoding_length_offset=max_decoding_length_offset,
+            use_vmap=use_vmap,
+            document_cache_size=document_cache_size,
             inter_threads=inter_threads,
             intra_threads=intra_threads,
             **kwargs,
@@ -357,6 +2121,71 @@ class Translator(TranslatorABC):
     ):
         return self.target_tokenizer.decode(sentences)
 
+    def _target_tokens(
+        self,
+        sentences: List[str],
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ) -> List[List[str]]:
+        return self.target_tokenizer.encode(sentences, out_type=str)
+
+    def _token_windows(
+        self,
+        text: str,
+        max_tokens: int,
+        src_lang: Optional[str] = None,
+        tgt_lang: Optional[str] = None,
+    ) -> List[str]:
+        pieces = self.source_tokenizer.encode(text, out_type=str)
+        # Room for </s>, and for the word boundary a window gets when it is tokenized again
+        size = max(max_tokens - 2, 1)
+        windows = []
+        start = 0
+        while start < len(pieces):
+            end = min(start + size, len(pieces))
+            # Do not cut between the bytes of one character
+            while start + 1 < end < len(pieces) and _CONTINUATION_BYTE_RE.match(
+                pieces[end]
+            ):
+                end -= 1
+            windows.append(self.source_tokenizer.decode(pieces[start:end]))
+            start = end
+        return [i for i in windows if i.strip()]
+
+    def generate_tokens(
+        self,
+        input_tokens: List[str],
+        max_decoding_length: int = 256,
+        disable_unk: bool = True,
+        repetition_penalty: float = 1.0,
+        src_lang: str = None,
+        tgt_lang: str = None,
+        use_vmap: Optional[bool] = None,
+        **kwargs,
+    ):
+        """Translate one tokenized sentence greedily, token by token
+
+        Args:
+            input_tokens (List[str]): Tokens of the sentence to translate
+            max_decoding_length (int, optional): Max decoding length for model. Defaults to 256.
+            disable_unk (bool, optional): Disable generating unk token. Defaults to True.
+            repetition_penalty (float, optional): Repetition penalty. Defaults to 1.0.
+            src_lang (str, optional): Source language. Only needed for multilingual models. Defaults to None.
+            tgt_lang (str, optional): Target language. Only needed for multilingual models. Defaults to None.
+            use_vmap (Optional[bool], optional): Restrict the output vocabulary with the model's vmap.txt. Defaults to the `use_vmap` of the translator.
+
+        Returns:
+            Iterator: CTranslate2 GenerationStepResult of each decoded token
+        """
+        return self.translator.generate_tokens(
+            input_tokens,
+            max_decoding_length=max_decoding_length,
+            disable_unk=disable_unk,
+            repetition_penalty=repetition_penalty,
+            use_vmap=self.use_vmap if use_vmap is None else use_vmap,
+            **kwargs,
+        )
+
     def unload(self):
         """Explicitly release CTranslate2 translator resources"""
         if hasattr(self, "translator"):
@@ -376,6 +2205,7 @@ class Translator(TranslatorABC):
         repetition_penalty: float = 1.0,
         src_lang: str = None,
         tgt_lang: str = None,
+        use_vmap: Optional[bool] = None,
         **kwargs,
     ):
         """Translate a list of strings
@@ -392,6 +2222,7 @@ class Translator(TranslatorABC):
             coverage_penalty (float, optional): Coverage penalty. Defaults to 0.0.
             src_lang (str, optional): Source language. Only needed for multilingual models. Defaults to None.
             tgt_lang (str, optional): Target language. Only needed for multilingual models. Defaults to None.
+            use_vmap (Optional[bool], optional): Restrict the output vocabulary with the model's vmap.txt. Defaults to the `use_vmap` of the translator.
 
         Returns:
             List[str]: Translated text
@@ -407,5 +2238,6 @@ class Translator(TranslatorABC):
             length_penalty=length_penalty,
             coverage_penalty=coverage_penalty,
             repetition_penalty=repetition_penalty,
+            use_vmap=self.use_vmap if use_vmap is None else use_vmap,
             **kwargs,
         )
@@ -0,0 +1,158 @@
+"""Build vocabulary maps (vmap.txt) to restrict the output vocabulary of a model.
+
+With `use_vmap`, CTranslate2 only scores the target tokens that the vocabulary map
+associates with the source tokens of the batch, plus a fixed list of frequent
+tokens, instead of the whole vocabulary. The output projection is a large part of
+the decoding time on CPU, so this makes decoding faster at a small risk to quality.
+
+The map is learned from a parallel corpus, or from a monolingual source corpus
+translated by the model itself, by keeping for each source token the target tokens
+that most often appear in the same sentence pairs (Dice coefficient).
+
+Usage:
+    quickmt-vmap quickmt/quickmt-fr-en --source corpus.fr
+    quickmt-vmap quickmt/quickmt-fr-en --source corpus.fr --target corpus.en
+"""
+
+import argparse
+from collections import Counter, defaultdict
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from quickmt.translator import Translator
+
+
+def build_vmap(
+    translator: Translator,
+    source: Iterable[str],
+    target: Optional[Iterable[str]] = None,
+    top_k: int = 20,
+    num_fixed: int = 200,
+    min_count: int = 2,
+    chunk_size: int = 1000,
+    **kwargs,
+) -> Dict[str, List[str]]:
+    """Learn a vocabulary map from a corpus.
+
+    Args:
+        translator: Translator of the model, used to tokenize (and translate).
+        source: Source sentences, one per item.
+        target: Reference translations aligned with `source`. If None, `source` is
+            translated with `translator` and its output is used instead.
+        top_k: Maximum number of target tokens kept for each source token.
+        num_fixed: Number of most frequent target tokens that are always allowed.
+        min_count: Minimum number of sentence pairs a source and target token must
+            share to be associated.
+        chunk_size: Number of sentences tokenized (and translated) at a time.
+        **kwargs: Translation args used when `target` is None, see `Translator.__call__`.
+
+    Returns:
+        Dict of source token to target tokens. The empty key holds the fixed tokens.
+    """
+    source_counts: Counter = Counter()
+    target_counts: Counter = Counter()
+    pair_counts: Dict[str, Counter] = defaultdict(Counter)
+
+    source = iter(source)
+    target = iter(target) if target is not None else None
+    while True:
+        src_chunk = list(islice(source, chunk_size))
+        if not src_chunk:
+            break
+        src_tokens = translator.tokenize(src_chunk)
+        if target is None:
+            results = translator._translate_tokens(src_tokens, **kwargs)
+            tgt_tokens = [result.hypotheses[0] for result in results]
+        else:
+            tgt_chunk = list(islice(target, len(src_chunk)))
+            tgt_tokens = translator.target_tokenizer.encode(tgt_chunk, out_type=str)
+
+        for src, tgt in zip(src_tokens, tgt_tokens):
+            src, tgt = set(src) - {"</s>"}, set(tgt)
+            source_counts.update(src)
+            target_counts.update(tgt)
+            for token in src:
+                pair_counts[token].update(tgt)
+
+    fixed = [token for token, _ in target_counts.most_common(num_fixed)]
+    vmap = {"": fixed}
+    fixed = set(fixed)
+    for token, counts in pair_counts.items():
+        dice = {
+            tgt: 2 * count / (source_counts[token] + target_counts[tgt])
+            for tgt, count in counts.items()
+            if count >= min_count and tgt not in fixed
+        }
+        if dice:
+            vmap[token] = sorted(dice, key=dice.get, reverse=True)[:top_k]
+    return vmap
+
+
+def save_vmap(vmap: Dict[str, List[str]], path: Path):
+    """Write a vocabulary map in CTranslate2's vmap.txt format.
+
+    Each line is a source token, a tab and the space-separated target tokens.
+    """
+    with open(path, "wt") as myfile:
+        for source, targets in vmap.items():
+            myfile.write(f"{source}\t{' '.join(targets)}\n")
+
+
+def load_vmap(path: Path) -> Dict[str, List[str]]:
+    """Read a vmap.txt file."""
+    vmap = {}
+    with open(path, "rt") as myfile:
+        for line in myfile:
+            source, _, targets = line.rstrip("\n").partition("\t")
+            vmap[source] = targets.split()
+    return vmap
+
+
+def _read_lines(path: str, max_lines: Optional[int] = None) -> Iterable[str]:
+    with open(path, "rt") as myfile:
+        yield from islice((i.strip() for i in myfile), max_lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for the quickmt-vmap CLI."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "model", help="Quickmt Model ID or path to quickmt model folder"
+    )
+    parser.add_argument(
+        "--source", required=True, help="Source corpus, one sentence per line"
+    )
+    parser.add_argument(
+        "--target", help="Aligned target corpus. If omitted, the source is translated"
+    )
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--num-fixed", type=int, default=200)
+    parser.add_argument("--min-count", type=int, default=2)
+    parser.add_argument(
+        "--max-lines", type=int, help="Only use the first lines of the corpus"
+    )
+    parser.add_argument("--beam-size", type=int, default=2)
+    parser.add_argument(
+        "--output", help="Output file. Defaults to vmap.txt in the model folder"
+    )
+    args = parser.parse_args(argv)
+
+    translator = Translator(args.model)
+    vmap = build_vmap(
+        translator,
+        _read_lines(args.source, args.max_lines),
+        _read_lines(args.target) if args.target else None,
+        top_k=args.top_k,
+        num_fixed=args.num_fixed,
+        min_count=args.min_count,
+        beam_size=args.beam_size,
+    )
+
+    output = Path(args.output or translator.model_path / "vmap.txt")
+    save_vmap(vmap, output)
+    print(f"Saved vocabulary map for {len(vmap) - 1} source tokens to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import os
 from typing import AsyncGenerator
 from quickmt.rest_server import app
 from httpx import AsyncClient
+from quickmt.benchmark import build_synthetic_model
 
 
 @pytest.fixture(scope="session")
@@ -14,3 +15,13 @@ def base_url() -> str:
 async def client(base_url: str) -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(base_url=base_url, timeout=60.0) as client:
         yield client
+
+
+@pytest.fixture(scope="session")
+def synthetic_model(tmp_path_factory) -> str:
+    """Small random-weight model that can be loaded without a download."""
+    model_dir = tmp_path_factory.mktemp("synthetic_model")
+    build_synthetic_model(
+        model_dir, num_layers=1, d_model=32, ffn_dim=64, vocab_size=200
+    )
+    return str(model_dir)
@@ -1,3 +1,4 @@
+import json
 import pytest
 import asyncio
 from httpx import AsyncClient
@@ -84,6 +85,129 @@ async def test_translate_list(client: AsyncClient):
     assert data["model_used"] == [model["model_id"], model["model_id"]]
 
 
+@pytest.mark.asyncio
+async def test_translate_html(client: AsyncClient):
+    models_res = await client.get("/api/models")
+    models = models_res.json()["models"]
+    if not models:
+        pytest.skip("No models available")
+
+    model = models[0]
+    payload = {
+        "src": '<p class="intro">Hello <b>world</b></p><pre>x = 1</pre>',
+        "src_lang": model["src_lang"],
+        "tgt_lang": model["tgt_lang"],
+        "format": "html",
+    }
+
+    response = await client.post("/api/translate", json=payload)
+    assert response.status_code == 200
+    translation = response.json()["translation"]
+    # Markup and skipped elements are kept as they are
+    assert translation.startswith('<p class="intro">')
+    assert translation.endswith("</p><pre>x = 1</pre>")
+    assert "<b>" in translation and "</b>" in translation
+
+
+@pytest.mark.asyncio
+async def test_translate_sentences(client: AsyncClient):
+    models_res = await client.get("/api/models")
+    models = models_res.json()["models"]
+    if not models:
+        pytest.skip("No models available")
+
+    model = models[0]
+    payload = {
+        "src": ["Hello world. How are you?", "Goodbye"],
+        "src_lang": model["src_lang"],
+        "tgt_lang": model["tgt_lang"],
+        "input_format": "sentences",
+        "output_format": "tokens",
+    }
+
+    response = await client.post("/api/translate", json=payload)
+    assert response.status_code == 200
+    translation = response.json()["translation"]
+    # One list of target pieces per input sentence
+    assert len(translation) == 2
+    assert all(isinstance(i, list) and i for i in translation)
+
+
+@pytest.mark.asyncio
+async def test_translate_tokens_identity(client: AsyncClient):
+    # Source and target languages are the same, so no model is needed
+    payload = {
+        "src": [["▁Hello", "▁world", "."]],
+        "src_lang": "en",
+        "tgt_lang": "en",
+        "input_format": "tokens",
+    }
+
+    response = await client.post("/api/translate", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["translation"] == ["Hello world."]
+    assert data["model_used"] == ["identity"]
+
+    payload = {
+        "src": ["Hello world."],
+        "src_lang": "en",
+        "tgt_lang": "en",
+        "input_format": "sentences",
+        "output_format": "tokens",
+    }
+    response = await client.post("/api/translate", json=payload)
+    assert response.status_code == 200
+    assert response.json()["translation"] == [["▁Hello", "▁world."]]
+
+
+@pytest.mark.asyncio
+async def test_translate_stream(client: AsyncClient):
+    models_res = await client.get("/api/models")
+    models = models_res.json()["models"]
+    if not models:
+        pytest.skip("No models available")
+
+    model = models[0]
+    payload = {
+        "src": "Hello world. How are you?",
+        "src_lang": model["src_lang"],
+        "tgt_lang": model["tgt_lang"],
+    }
+
+    response = await client.post("/api/translate/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [e for e in response.text.split("\n\n") if e]
+    pieces = [json.loads(e[len("data: ") :])["translation"] for e in events[:-1]]
+    assert pieces and "".join(pieces)
+    assert events[-1].startswith("event: done")
+
+
+@pytest.mark.asyncio
+async def test_translate_json(client: AsyncClient):
+    models_res = await client.get("/api/models")
+    models = models_res.json()["models"]
+    if not models:
+        pytest.skip("No models available")
+
+    model = models[0]
+    payload = {
+        "src": {"title": "Hello world", "items": [{"name": "Hello world", "id": 7}]},
+        "selectors": ["title", "items.*.name"],
+        "src_lang": model["src_lang"],
+        "tgt_lang": model["tgt_lang"],
+    }
+
+    response = await client.post("/api/translate/json", json=payload)
+    assert response.status_code == 200
+    translation = response.json()["translation"]
+    assert translation["title"]
+    # Repeated strings get the same translation
+    assert translation["items"][0]["name"] == translation["title"]
+    assert translation["items"][0]["id"] == 7
+
+
 @pytest.mark.asyncio
 async def test_dynamic_batching(client: AsyncClient):
     """Verify that multiple concurrent requests work correctly (triggering batching logic)."""
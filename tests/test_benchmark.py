@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from quickmt import Translator
+from quickmt.benchmark import (
+    benchmark_split_join,
+    compare,
+    main,
+    run_benchmark,
+    synthetic_sentences,
+)
+
+
+def test_synthetic_sentences():
+    sentences = synthetic_sentences(50, distribution="short", seed=3)
+    assert len(sentences) == 50
+    assert all(3 <= len(s.split()) <= 8 for s in sentences)
+    assert sentences == synthetic_sentences(50, distribution="short", seed=3)
+
+
+def test_benchmark_split_join():
+    metrics = benchmark_split_join(200)
+    # Speedups are measured against the former list based splitter and joiner
+    for metric in ("split", "join", "document_join"):
+        assert metrics[f"baseline_{metric}_sentences_per_sec"] > 0
+        assert metrics[f"{metric}_speedup"] > 0
+
+
+def test_synthetic_model_translates(synthetic_model):
+    t = Translator(synthetic_model)
+    result = t(["Bonjour le monde.", "Une autre phrase."], max_decoding_length=8)
+    assert len(result) == 2
+    assert all(isinstance(r, str) for r in result)
+
+
+def test_run_benchmark(synthetic_model):
+    results = run_benchmark(
+        synthetic_model,
+        batch_sizes=[4],
+        beam_sizes=[1],
+        threads=[(1, 1)],
+        distributions=["short"],
+        num_sentences=8,
+        split_join_sentences=100,
+        max_decoding_length=8,
+    )
+    names = [r["name"] for r in results["results"]]
+    assert names == [
+        "translate/short/batch=4/beam=1/threads=1x1",
+        "split_join/sentences=100",
+    ]
+    metrics = results["results"][0]["metrics"]
+    assert metrics["sentences_per_sec"] > 0
+    assert metrics["latency_p95_ms"] >= metrics["latency_p50_ms"]
+    assert compare(results, results) == []
+
+
+def test_compare():
+    baseline = {
+        "results": [
+            {"name": "a", "metrics": {"tokens_per_sec": 100.0, "latency_p50_ms": 10.0}}
+        ]
+    }
+    current = {
+        "results": [
+            {"name": "a", "metrics": {"tokens_per_sec": 85.0, "latency_p50_ms": 10.5}},
+            {"name": "b", "metrics": {"tokens_per_sec": 1.0}},
+        ]
+    }
+    regressions = compare(current, baseline, tolerance=0.1)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("a tokens_per_sec")
+    assert compare(current, baseline, tolerance=0.2) == []
+
+
+def test_main_baseline(synthetic_model, tmp_path):
+    output = tmp_path / "results.json"
+    args = [
+        "--model-dir",
+        synthetic_model,
+        "--output",
+        str(output),
+        "--batch-sizes",
+        "2",
+        "--beam-sizes",
+        "1",
+        "--threads",
+        "1x1",
+        "--distributions",
+        "short",
+        "--num-sentences",
+        "4",
+        "--split-join-sentences",
+        "0",
+    ]
+    main(args)
+    results = json.loads(output.read_text())
+    assert len(results["results"]) == 1
+
+    # Make the baseline impossibly fast
+    results["results"][0]["metrics"]["sentences_per_sec"] *= 1000
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(results))
+    with pytest.raises(SystemExit) as excinfo:
+        main(args + ["--baseline", str(baseline)])
+    assert excinfo.value.code == 1
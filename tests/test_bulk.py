@@ -0,0 +1,63 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from quickmt.bulk import BulkTranslator, init_worker, translate_worker
+
+
+class FakeTranslator:
+    def __init__(self, model_path, **kwargs):
+        self.counters = Counter()
+
+    def __call__(self, src, **kwargs):
+        self.counters["source_tokens"] += sum(len(i.split()) for i in src)
+        self.counters["target_tokens"] += sum(len(i.split()) for i in src)
+        return [f"T {i}" for i in src]
+
+
+@pytest.fixture
+def bulk_translator(tmp_path):
+    def thread_pool(max_workers, mp_context, initializer, initargs):
+        return ThreadPoolExecutor(
+            max_workers, initializer=initializer, initargs=initargs
+        )
+
+    with (
+        patch("quickmt.bulk.Translator", FakeTranslator),
+        patch("quickmt.bulk.ProcessPoolExecutor", thread_pool),
+    ):
+        with BulkTranslator(tmp_path, num_workers=2, chunk_size=3) as bulk:
+            yield bulk
+
+
+def test_translate_worker():
+    with patch("quickmt.bulk.Translator", FakeTranslator):
+        init_worker("/tmp/model", inter_threads=1, intra_threads=2)
+        translations, stats = translate_worker(["a b", "c"], {})
+    assert translations == ["T a b", "T c"]
+    assert stats["lines"] == 2
+    assert stats["source_tokens"] == 3
+
+
+def test_translate_iterable_ordered(bulk_translator):
+    src = (f"line {i}" for i in range(10))
+    result = list(bulk_translator.translate_iterable(src, beam_size=1))
+    assert result == [f"T line {i}" for i in range(10)]
+
+    stats = bulk_translator.stats
+    assert stats["lines"] == 10
+    assert stats["source_tokens"] == 20
+    assert sum(w["lines"] for w in stats["workers"].values()) == 10
+
+
+def test_translate_file(bulk_translator, tmp_path):
+    input_file = tmp_path / "input.txt"
+    output_file = tmp_path / "output.txt"
+    input_file.write_text("".join(f"Line {i}\n" for i in range(7)))
+
+    stats = bulk_translator.translate_file(str(input_file), str(output_file))
+    assert output_file.read_text() == "".join(f"T Line {i}\n" for i in range(7))
+    assert stats["lines"] == 7
+    assert stats["lines_per_sec"] > 0
@@ -0,0 +1,54 @@
+import json
+from unittest.mock import patch
+
+from quickmt.calibrate import (
+    calibrate,
+    calibration_path,
+    default_thread_splits,
+    load_calibration,
+    load_or_calibrate,
+)
+
+
+def test_default_thread_splits():
+    assert default_thread_splits(8) == [(1, 8), (2, 4), (4, 2)]
+    assert default_thread_splits(1) == [(1, 1)]
+
+
+def test_calibrate(synthetic_model):
+    calibration = calibrate(
+        synthetic_model,
+        compute_types=["int8", "float32"],
+        thread_splits=[(1, 1)],
+        batch_sizes=[2, 8],
+        num_sentences=8,
+        max_decoding_length=8,
+    )
+    assert len(calibration["results"]) == 4
+    # Ranked by tokens, as outputs differ in length between compute types
+    assert all(r["tokens_per_sec"] > 0 for r in calibration["results"])
+    best = max(calibration["results"], key=lambda x: x["tokens_per_sec"])
+    assert calibration["best"] == {
+        "compute_type": best["compute_type"],
+        "inter_threads": 1,
+        "intra_threads": 1,
+        "max_batch_size": best["max_batch_size"],
+    }
+
+
+def test_load_or_calibrate_persists(tmp_path):
+    calibration = {
+        "best": {"compute_type": "int8", "max_batch_size": 16},
+        "machine": None,
+    }
+    with patch("quickmt.calibrate.calibrate", return_value=calibration) as mock:
+        with patch("quickmt.calibrate.machine_info", return_value=None):
+            assert load_or_calibrate("/tmp/model", cache_dir=tmp_path) == calibration
+            assert load_or_calibrate("/tmp/model", cache_dir=tmp_path) == calibration
+        assert mock.call_count == 1
+
+    path = calibration_path("/tmp/model", cache_dir=tmp_path)
+    assert json.loads(path.read_text()) == calibration
+
+    # Not reused on other hardware
+    assert load_calibration("/tmp/model", cache_dir=tmp_path) is None
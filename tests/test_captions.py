@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+from quickmt.captions import CaptionTranslator, SentenceStream
+
+
+def test_sentence_boundaries():
+    stream = SentenceStream()
+    assert stream.feed("Hello") == []
+    assert stream.feed(" world.") == []
+    # The next sentence has started, but its first word may still grow
+    assert stream.feed(" How") == []
+    assert stream.feed(" are you?") == ["Hello world."]
+    assert stream.pending == "How are you?"
+    # Abbreviations are not split once the following word is known
+    assert stream.feed(" I met Dr.") == ["How are you?"]
+    assert stream.feed(" Smith ") == []
+    assert stream.pending == "I met Dr. Smith"
+    assert stream.flush() == ["I met Dr. Smith"]
+    assert stream.pending == ""
+
+
+def test_line_breaks():
+    stream = SentenceStream()
+    assert stream.feed("Line one\nLine two. Three") == ["Line one"]
+    assert stream.pending == "Line two. Three"
+    assert stream.feed("\n") == ["Line two.", "Three"]
+
+
+def test_max_chars():
+    stream = SentenceStream(max_chars=40)
+    assert stream.feed(
+        "I met Dr. Smith today, and we talked about many things, some of them"
+    ) == ["I met Dr. Smith today, and we talked about many things,"]
+    assert stream.pending == "some of them"
+
+    # Without clauses, the text is cut at its last complete word
+    stream = SentenceStream(max_chars=10)
+    assert stream.feed("one two three four fi") == ["one two three four"]
+    assert stream.pending == "fi"
+    assert stream.feed("veeeeeeeeeeee") == []
+
+
+def test_caption_translator():
+    translator = MagicMock(side_effect=lambda src, **kwargs: [s.upper() for s in src])
+    captions = CaptionTranslator(translator, provisional=True, beam_size=1)
+
+    update = captions.feed("Hello world. Bye")
+    assert update == {
+        "sentences": [],
+        "translations": [],
+        "pending": "Hello world. Bye",
+        "provisional": "HELLO WORLD. BYE",
+    }
+
+    update = captions.feed(" now ")
+    assert update["translations"] == ["HELLO WORLD."]
+    assert update["provisional"] == "BYE NOW"
+    # Final sentences and the provisional caption share one call
+    translator.assert_called_with(["Hello world.", "Bye now"], beam_size=1)
+
+    update = captions.flush()
+    assert update["translations"] == ["BYE NOW"]
+    assert update["provisional"] is None
+
+    translator.reset_mock()
+    assert captions.flush()["translations"] == []
+    translator.assert_not_called()
+
+
+def test_caption_translator_final_only():
+    translator = MagicMock(side_effect=lambda src, **kwargs: [s.upper() for s in src])
+    captions = CaptionTranslator(translator)
+    assert captions.feed("Hello")["provisional"] is None
+    translator.assert_not_called()
+    assert captions.feed(" world. Bye now")["translations"] == ["HELLO WORLD."]
+    translator.assert_called_once_with(["Hello world."])
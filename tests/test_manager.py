@@ -43,6 +43,92 @@ class TestBatchTranslator:
         await bt.stop_worker()
         assert bt.worker_task is None
 
+    @pytest.mark.asyncio
+    async def test_worker_batch_size(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path", max_batch_size=2)
+        mock_translator.side_effect = lambda texts, **kwargs: [t.upper() for t in texts]
+
+        results = await asyncio.gather(*[bt.translate(t) for t in ["a", "b", "c"]])
+        assert results == ["A", "B", "C"]
+        # Requests are collected up to the model's batch size, not the global setting
+        assert [len(c.args[0]) for c in mock_translator.call_args_list] == [2, 1]
+
+        await bt.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_translate_document(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path")
+        mock_translator.translate_document.return_value = "Hola\nMundo"
+
+        result = await bt.translate_document("Hello\nWorld", "doc-1", src_lang="en", tgt_lang="es")
+        assert result == "Hola\nMundo"
+        args, kwargs = mock_translator.translate_document.call_args
+        assert args == ("Hello\nWorld", "doc-1")
+        assert kwargs["src_lang"] == "en"
+        assert kwargs["max_batch_size"] == bt.max_batch_size
+        assert "max_sentence_tokens" in kwargs
+
+        await bt.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_translate_segments(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path")
+        mock_translator.translate_segments.return_value = [["▁Hola"]]
+
+        result = await bt.translate_segments([["▁Hello"]], src_lang="en", tgt_lang="es", input_format="tokens", output_format="tokens")
+        assert result == [["▁Hola"]]
+        args, kwargs = mock_translator.translate_segments.call_args
+        assert args == ([["▁Hello"]],)
+        assert kwargs["input_format"] == "tokens"
+        assert kwargs["max_batch_size"] == bt.max_batch_size
+        # Inputs are single sentences, so they are never split
+        assert "max_sentence_tokens" not in kwargs
+
+        await bt.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_translate_markup(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path")
+        mock_translator.translate_markup.return_value = ["<p>Hola</p>"]
+
+        result = await bt.translate_markup(["<p>Hello</p>"], "html", src_lang="en", tgt_lang="es")
+        assert result == ["<p>Hola</p>"]
+        args, kwargs = mock_translator.translate_markup.call_args
+        assert args == (["<p>Hello</p>"], "html")
+        assert kwargs["max_batch_size"] == bt.max_batch_size
+
+        await bt.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_translate_json(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path")
+        mock_translator.translate_json.return_value = {"a": "Hola"}
+
+        result = await bt.translate_json({"a": "Hello"}, ["a"], src_lang="en", tgt_lang="es")
+        assert result == {"a": "Hola"}
+        args, kwargs = mock_translator.translate_json.call_args
+        assert args == ({"a": "Hello"}, ["a"])
+        assert kwargs["max_batch_size"] == bt.max_batch_size
+
+        await bt.stop_worker()
+
+    @pytest.mark.asyncio
+    async def test_translate_tokens_stream(self, mock_translator):
+        bt = BatchTranslator("test-id", "/tmp/path")
+        mock_translator.translate_tokens_stream.return_value = iter(["Hola", " mundo"])
+
+        pieces = [p async for p in bt.translate_tokens_stream("Hello world", src_lang="en", tgt_lang="es")]
+        assert pieces == ["Hola", " mundo"]
+        args, kwargs = mock_translator.translate_tokens_stream.call_args
+        assert args == ("Hello world",)
+        assert kwargs["tgt_lang"] == "es"
+
+        mock_translator.translate_tokens_stream.side_effect = RuntimeError("boom")
+        with pytest.raises(RuntimeError):
+            [p async for p in bt.translate_tokens_stream("Hello")]
+
+        await bt.stop_worker()
+
 class TestModelManager:
     @pytest.mark.asyncio
     async def test_fetch_hf_models(self, mock_hf):
@@ -0,0 +1,77 @@
+import pytest
+
+from quickmt.markup import MarkupDocument
+
+
+def test_segments_and_rebuild():
+    source = (
+        "<html><head><title>My page</title><style>p { color: red }</style></head>\n"
+        '<body><h1 class="title">Fish &amp; chips</h1>\n'
+        '<p>Click <a href="/a?x=1&amp;y=2">this\n  link</a> to run <code>ls -l</code>.</p>\n'
+        "<!-- note --><ul><li>One</li><li>   </li></ul><pre>  keep   this </pre>\n"
+        '<script>if (a < b) { x = "<p>" }</script></body></html>'
+    )
+    document = MarkupDocument(source)
+    assert document.segments == [
+        "My page",
+        "Fish & chips",
+        "Click [1]this link[2] to run [3].",
+        "One",
+    ]
+    translations = [
+        "Ma page",
+        "Poisson & frites",
+        "Cliquez [1]ce lien[2] pour lancer [3].",
+        "Un",
+    ]
+    assert document.rebuild(translations) == (
+        "<html><head><title>Ma page</title><style>p { color: red }</style></head>\n"
+        '<body><h1 class="title">Poisson &amp; frites</h1>\n'
+        '<p>Cliquez <a href="/a?x=1&amp;y=2">ce lien</a> pour lancer <code>ls -l</code>.</p>\n'
+        "<!-- note --><ul><li>Un</li><li>   </li></ul><pre>  keep   this </pre>\n"
+        '<script>if (a < b) { x = "<p>" }</script></body></html>'
+    )
+    assert document.missing_tags == 0
+
+
+def test_untranslated_elements():
+    source = (
+        '<p translate="no">Brand <b>Name</b></p><div class="x notranslate">Keep</div>'
+        "<p>Copy <span>[1]</span> as is</p>"
+    )
+    document = MarkupDocument(source)
+    # Text that looks like a placeholder is masked with the tags
+    assert document.segments == ["Copy [1][2][3] as is"]
+    assert document.rebuild(document.segments) == source
+
+
+def test_missing_and_repeated_tags():
+    document = MarkupDocument("<p>Hello <b>big</b> world</p>")
+    assert document.segments == ["Hello [1]big[2] world"]
+    # Repeated placeholders are dropped and missing ones are appended to the block
+    assert document.rebuild(["Bonjour [1]grand[1] < monde"]) == (
+        "<p>Bonjour <b>grand &lt; monde</b></p>"
+    )
+    assert document.missing_tags == 1
+
+
+def test_xml():
+    source = (
+        '<?xml version="1.0"?>\n<resources>\n'
+        '  <string name="hello">Hello <b>World</b></string>\n'
+        '  <string name="brand" translate="no">Quickmt</string>\n'
+        "  <![CDATA[ raw ]]>\n</resources>"
+    )
+    document = MarkupDocument(source, "xml")
+    # Every element is a block in XML
+    assert document.segments == ["Hello", "World"]
+    assert document.rebuild(["Bonjour", "Monde"]) == source.replace(
+        "Hello <b>World", "Bonjour <b>Monde"
+    )
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        MarkupDocument("<p>Hi</p>", "markdown")
+    with pytest.raises(ValueError):
+        MarkupDocument("<p>Hi</p>").rebuild([])
@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from quickmt import Translator
+from quickmt.benchmark import synthetic_sentences
+from quickmt.quantize import (
+    cached_model_path,
+    convert_model,
+    needs_conversion,
+    read_model,
+)
+
+
+@pytest.mark.parametrize("compute_type", ["int8", "int16", "float16"])
+def test_convert_model(synthetic_model, tmp_path, compute_type):
+    assert needs_conversion(synthetic_model, compute_type)
+    convert_model(synthetic_model, tmp_path, compute_type)
+    assert not needs_conversion(tmp_path, compute_type)
+    assert (tmp_path / "joint.spm.model").exists()
+
+    _, _, variables, _ = read_model(tmp_path / "model.bin")
+    dtypes = {name: dtype for name, dtype, _ in variables}
+    weight = "decoder/projection/weight"
+    assert dtypes[weight] == compute_type
+    assert (weight + "_scale" in dtypes) == compute_type.startswith("int")
+
+
+def test_needs_conversion(synthetic_model):
+    assert not needs_conversion(synthetic_model, "float32")
+    assert not needs_conversion(synthetic_model, "default")
+    assert not needs_conversion(synthetic_model, "auto")
+
+
+@pytest.mark.parametrize("compute_type", ["int8", "int16"])
+def test_cached_model_same_translations(
+    synthetic_model, compute_type, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    src = synthetic_sentences(10)
+    expected = Translator(synthetic_model, compute_type=compute_type)(
+        src, max_decoding_length=8
+    )
+    cached = Translator(
+        synthetic_model, compute_type=compute_type, quantized_cache=True
+    )
+    assert cached(src, max_decoding_length=8) == expected
+    assert (tmp_path / "quickmt" / "quantized").exists()
+
+
+def test_cached_model_path(synthetic_model, tmp_path):
+    path = cached_model_path(synthetic_model, "int8", cache_dir=tmp_path)
+    assert path.parent == tmp_path
+    assert path.name.endswith("-int8")
+    mtime = (path / "model.bin").stat().st_mtime_ns
+
+    # Reused on later loads
+    assert cached_model_path(synthetic_model, "int8", cache_dir=tmp_path) == path
+    assert (path / "model.bin").stat().st_mtime_ns == mtime
+    assert cached_model_path(path, "int8") == path
+
+    # Another compute type replaces the previous copy
+    other = cached_model_path(synthetic_model, "int16", cache_dir=tmp_path)
+    assert list(tmp_path.iterdir()) == [other]
+
+    # So does an updated model
+    model_bin = Path(synthetic_model) / "model.bin"
+    stat = model_bin.stat()
+    os.utime(model_bin, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    updated = cached_model_path(synthetic_model, "int16", cache_dir=tmp_path)
+    assert updated != other
+    assert list(tmp_path.iterdir()) == [updated]
+
+    # Nothing to convert
+    assert cached_model_path(synthetic_model, "default") == Path(synthetic_model)
@@ -0,0 +1,69 @@
+import pytest
+
+from quickmt.structured import JsonDocument
+
+CATALOG = {
+    "title": "Hello",
+    "id": "x1",
+    "items": [
+        {"name": "Apple", "sku": "A-1", "description": "Red fruit"},
+        {"name": "Hello", "tags": ["fruit", " "], "price": 3},
+    ],
+    "messages": {"ok_label": "OK", "nested": {"cancel_label": "Cancel"}},
+}
+
+
+def test_all_strings():
+    document = JsonDocument(CATALOG)
+    # Repeated strings are translated once, blank strings not at all
+    assert document.segments == [
+        "Hello",
+        "x1",
+        "Apple",
+        "A-1",
+        "Red fruit",
+        "fruit",
+        "OK",
+        "Cancel",
+    ]
+
+
+@pytest.mark.parametrize(
+    "selectors, segments",
+    [
+        (["title", "items.*.name"], ["Hello", "Apple"]),
+        (["**.description", "messages.*_label"], ["Red fruit", "OK"]),
+        (["**.*_label"], ["OK", "Cancel"]),
+        # Selecting an object or a list selects all the strings inside it
+        (["messages", "items.1.tags"], ["fruit", "OK", "Cancel"]),
+        (["missing"], []),
+    ],
+)
+def test_selectors(selectors, segments):
+    assert JsonDocument(CATALOG, selectors).segments == segments
+
+
+def test_rebuild():
+    document = JsonDocument(CATALOG, ["title", "items.*.name", "items.*.tags"])
+    result = document.rebuild([s.upper() for s in document.segments])
+    assert result == {
+        "title": "HELLO",
+        "id": "x1",
+        "items": [
+            {"name": "APPLE", "sku": "A-1", "description": "Red fruit"},
+            {"name": "HELLO", "tags": ["FRUIT", " "], "price": 3},
+        ],
+        "messages": {"ok_label": "OK", "nested": {"cancel_label": "Cancel"}},
+    }
+    # The document itself is not modified
+    assert CATALOG["title"] == "Hello"
+
+    with pytest.raises(ValueError):
+        document.rebuild([])
+
+
+def test_string_document():
+    document = JsonDocument("Hello")
+    assert document.segments == ["Hello"]
+    assert document.rebuild(["Bonjour"]) == "Bonjour"
+    assert JsonDocument([1, None, True]).rebuild([]) == [1, None, True]
@@ -37,3 +37,64 @@ async def test_threading_config_propagation():
             assert kwargs["intra_threads"] == intra
             assert kwargs["device"] == "cpu"
             assert kwargs["compute_type"] == "int8"
+
+
+@pytest.mark.asyncio
+async def test_calibration_overrides_config():
+    """Verify that a calibrated configuration replaces the configured one."""
+    calibration = {
+        "best": {
+            "compute_type": "int16",
+            "inter_threads": 2,
+            "intra_threads": 2,
+            "max_batch_size": 16,
+        }
+    }
+    with (
+        patch("quickmt.manager.Translator") as mock_translator_cls,
+        patch(
+            "quickmt.manager.load_or_calibrate", return_value=calibration
+        ) as mock_calibrate,
+    ):
+        manager = ModelManager(
+            max_loaded=1, device="cpu", compute_type="int8", calibrate=True
+        )
+        manager.hf_collection_models = [
+            {"model_id": "test/model", "src_lang": "en", "tgt_lang": "fr"}
+        ]
+
+        with patch("quickmt.manager.snapshot_download", return_value="/tmp/model"):
+            model = await manager.get_model("en", "fr")
+
+        mock_calibrate.assert_called_once()
+        args, kwargs = mock_translator_cls.call_args
+        assert kwargs["compute_type"] == "int16"
+        assert kwargs["inter_threads"] == 2
+        assert kwargs["intra_threads"] == 2
+        assert model.max_batch_size == 16
+
+
+@pytest.mark.asyncio
+async def test_decoding_length_ratio_per_pair():
+    """Verify that a per language pair decoding length ratio overrides the global one."""
+    with (
+        patch("quickmt.manager.Translator") as mock_translator_cls,
+        patch.multiple(
+            "quickmt.manager.settings",
+            max_decoding_length_ratio=1.5,
+            max_decoding_length_ratios={"en-zh": 2.5},
+        ),
+    ):
+        manager = ModelManager(max_loaded=2, device="cpu")
+        manager.hf_collection_models = [
+            {"model_id": "test/en-zh", "src_lang": "en", "tgt_lang": "zh"},
+            {"model_id": "test/en-fr", "src_lang": "en", "tgt_lang": "fr"},
+        ]
+
+        with patch("quickmt.manager.snapshot_download", return_value="/tmp/model"):
+            await manager.get_model("en", "zh")
+            ratio = mock_translator_cls.call_args.kwargs["max_decoding_length_ratio"]
+            assert ratio == 2.5
+            await manager.get_model("en", "fr")
+            ratio = mock_translator_cls.call_args.kwargs["max_decoding_length_ratio"]
+            assert ratio == 1.5
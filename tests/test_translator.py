@@ -1,6 +1,10 @@
+import asyncio
 import pytest
+import threading
+from array import array
+from functools import partial
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from quickmt.translator import Translator, TranslatorABC
 
 
@@ -27,6 +31,11 @@ def temp_model_dir(tmp_path):
     return model_dir
 
 
+def as_async(results):
+    """Wrap CTranslate2 results as returned by `translate_batch(..., asynchronous=True)`"""
+    return [MagicMock(**{"result.return_value": result}) for result in results]
+
+
 @pytest.fixture
 def translator_instance(temp_model_dir, mock_ctranslate2, mock_sentencepiece):
     return Translator(temp_model_dir)
@@ -57,6 +66,106 @@ class TestTranslatorABC:
     def test_sentence_join_empty(self):
         assert TranslatorABC._sentence_join([], [], [], length=5) == [""] * 5
 
+    def test_split_sentences_fast(self):
+        src = ["Hello world. Hi.\nNew paragraph.", "", "Second input."]
+        input_ids, paragraph_ids, sentences = TranslatorABC._split_sentences(src)
+        assert isinstance(input_ids, array)
+        assert (list(input_ids), list(paragraph_ids), sentences) == (
+            TranslatorABC._sentence_split(src)
+        )
+        assert sentences == ["Hello world. Hi.", "New paragraph.", "Second input."]
+
+    def test_join_sentences_fast(self):
+        input_ids = array("l", [0, 0, 0, 2, 2])
+        paragraph_ids = array("l", [0, 0, 1, 0, 0])
+        # Separators only go between non-empty text
+        sentences = ["", "A.", "B.", "C.", "D."]
+        joined = TranslatorABC._join_sentences(
+            input_ids, paragraph_ids, sentences, length=3
+        )
+        assert joined == ["A.\nB.", "", "C. D."]
+        assert joined == TranslatorABC._sentence_join(
+            list(input_ids), list(paragraph_ids), sentences, length=3
+        )
+
+    @pytest.mark.parametrize(
+        "sentence",
+        [
+            "$1,299.99",
+            "12:30",
+            "https://example.com/path?q=1",
+            "support@example.com",
+            "3f9a2c1e7b",
+            "😀👍",
+            "!!!",
+        ],
+    )
+    def test_is_untranslatable(self, sentence):
+        assert TranslatorABC._is_untranslatable(sentence)
+
+    @pytest.mark.parametrize(
+        "sentence", ["Hello", "3 kg", "日本", "Visit https://example.com"]
+    )
+    def test_is_translatable(self, sentence):
+        assert not TranslatorABC._is_untranslatable(sentence)
+
+    def test_mask_spans(self):
+        sentence = (
+            "Run `pip install quickmt` from https://example.com/docs, "
+            "see /usr/local/lib/x.py and SKU AB-1234 for 1,299.99 (2024) [1]."
+        )
+        masked, spans = TranslatorABC._mask_spans(sentence)
+        assert masked == "Run [1] from [2], see [3] and SKU [4] for [5] ([6]) [7]."
+        assert spans == [
+            "`pip install quickmt`",
+            "https://example.com/docs",
+            "/usr/local/lib/x.py",
+            "AB-1234",
+            "1,299.99",
+            "2024",
+            "[1]",
+        ]
+        assert TranslatorABC._unmask_spans(masked, spans) == (sentence, 0)
+
+    def test_mask_spans_repeated(self):
+        masked, spans = TranslatorABC._mask_spans("Call 5551234 or 5551234, 3 times")
+        assert masked == "Call [1] or [1], 3 times"
+        assert spans == ["5551234"]
+
+    def test_unmask_spans_missing(self):
+        spans = ["https://a.com", "2024", "x.py"]
+        # Placeholders can be reordered or respaced, unknown numbers are left as is
+        text, missing = TranslatorABC._unmask_spans("[ 2 ] on [1] [9]", spans)
+        assert text == "2024 on https://a.com [9]"
+        assert missing == 1
+
+    def test_token_batches(self):
+        lengths = [3, 200, 4, 5, 190]
+        batches = TranslatorABC._token_batches(lengths, max_batch_tokens=400)
+        # Short sentences are grouped together, long ones are not padded against them
+        assert batches == [[0, 2, 3], [4, 1]]
+
+    def test_token_batches_max_batch_size(self):
+        batches = TranslatorABC._token_batches(
+            [1] * 5, max_batch_tokens=100, max_batch_size=2
+        )
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    def test_token_batches_oversized(self):
+        # A sentence over the budget still gets its own batch
+        assert TranslatorABC._token_batches([50, 2], max_batch_tokens=10) == [[1], [0]]
+
+    def test_default_hooks(self, translator_instance):
+        # Subclasses only need the tokenizers and translate_batch
+        assert "generate_tokens" not in TranslatorABC.__abstractmethods__
+        assert TranslatorABC._target_tokens(translator_instance, ["a", "b"]) == [[], []]
+        with patch.object(Translator, "translate_batch") as mock_trans:
+            mock_trans.return_value = [MagicMock(hypotheses=[["▁Hi", "."]])]
+            steps = list(TranslatorABC.generate_tokens(translator_instance, ["x"]))
+            assert [s.token for s in steps] == ["▁Hi", "."]
+            assert [s.is_last for s in steps] == [False, True]
+            assert mock_trans.call_args.kwargs["beam_size"] == 1
+
 
 class TestTranslator:
     def test_init_joint_tokens(self, tmp_path, mock_ctranslate2, mock_sentencepiece):
@@ -103,7 +212,7 @@ class TestTranslator:
             mock_tok.return_value = [["tok"]]
             mock_res = MagicMock()
             mock_res.hypotheses = [["hypo"]]
-            mock_trans.return_value = [mock_res]
+            mock_trans.return_value = as_async([mock_res])
             mock_detok.return_value = ["Translated sentence."]
 
             result = translator_instance("Source text.")
@@ -113,25 +222,754 @@ class TestTranslator:
             mock_trans.assert_called_once()
             mock_detok.assert_called_once()
 
+    def test_call_max_batch_tokens(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            events = []
+
+            def translate_batch(toks, **kwargs):
+                events.append("submit")
+                return [
+                    MagicMock(
+                        **{
+                            "result.side_effect": lambda t=t: events.append("result")
+                            or MagicMock(hypotheses=[[t[0]]])
+                        }
+                    )
+                    for t in toks
+                ]
+
+            mock_tok.return_value = [["a"] * 10, ["b"], ["c"] * 9]
+            mock_trans.side_effect = translate_batch
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            result = translator_instance(
+                ["First one. Second one. Third one."], max_batch_tokens=20
+            )
+            # Original sentence order is restored before joining
+            assert result == ["a b c"]
+            assert mock_trans.call_count == 2
+            batch_sizes = [len(c.args[0]) for c in mock_trans.call_args_list]
+            assert batch_sizes == [2, 1]
+            # Every batch is submitted before waiting for any of them
+            assert events[:2] == ["submit", "submit"]
+            assert all(c.kwargs["asynchronous"] for c in mock_trans.call_args_list)
+
+    def test_adaptive_beam(self, translator_instance):
+        stats = []
+        translator_instance.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            # Greedy decoding is unsure about the second sentence only
+            scores = {"First one.": -0.1, "Second one.": -2.0, "Third one.": -0.3}
+            mock_trans.side_effect = lambda toks, beam_size, **kwargs: as_async(
+                [
+                    MagicMock(
+                        hypotheses=[[f"{t[0]}/{beam_size}"]], scores=[scores[t[0]]]
+                    )
+                    for t in toks
+                ]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            result = translator_instance(
+                "First one. Second one. Third one.",
+                beam_size=5,
+                adaptive_beam_threshold=-1.0,
+            )
+            assert result == "First one./1 Second one./5 Third one./1"
+
+            greedy, beam = mock_trans.call_args_list
+            assert greedy.kwargs["beam_size"] == 1
+            assert greedy.kwargs["return_scores"] is True
+            assert beam.args[0] == [["Second one."]]
+            assert "return_scores" not in beam.kwargs
+            assert stats[0]["escalated_sentences"] == 1
+            assert stats[0]["batches"] == 2
+
+    def test_adaptive_beam_greedy_requested(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.return_value = [["a"]]
+            mock_trans.return_value = as_async([MagicMock(hypotheses=[["a"]])])
+            mock_detok.return_value = ["a"]
+            translator_instance(
+                "Hello world.", beam_size=1, adaptive_beam_threshold=-1.0
+            )
+            assert mock_trans.call_count == 1
+            assert "return_scores" not in mock_trans.call_args.kwargs
+
+    def test_decoding_length_ratio(self, translator_instance):
+        translator_instance.max_decoding_length_ratio = 1.5
+        stats = []
+        translator_instance.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            waited_at = []
+
+            def result(hypothesis):
+                waited_at.append(mock_trans.call_count)
+                return MagicMock(hypotheses=[hypothesis])
+
+            mock_tok.return_value = [["a"] * 4, ["b"] * 30, ["c"] * 3]
+            # The first sentence degenerates and runs until its limit
+            mock_trans.side_effect = lambda toks, max_decoding_length, **kwargs: [
+                MagicMock(
+                    **{
+                        "result.side_effect": partial(
+                            result, [t[0]] * (max_decoding_length if t[0] == "a" else 2)
+                        )
+                    }
+                )
+                for t in toks
+            ]
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            result = translator_instance(
+                "First one. Second one. Third one.", max_decoding_length=50
+            )
+            assert result == "a b c"
+
+            # Two length classes, the long one capped by max_decoding_length
+            calls = [
+                (len(c.args[0]), c.kwargs["max_decoding_length"])
+                for c in mock_trans.call_args_list
+            ]
+            assert calls == [(2, 16), (1, 50)]
+            assert stats[0]["length_limit_hits"] == 1
+            # Both length classes are submitted before either is waited for
+            assert waited_at == [2, 2, 2]
+
+    def test_length_limit_hits_adaptive_beam(self, translator_instance):
+        stats = []
+        translator_instance.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            # Every sentence degenerates, greedily and with beam search
+            mock_trans.side_effect = (
+                lambda toks, max_decoding_length, **kwargs: as_async(
+                    [
+                        MagicMock(
+                            hypotheses=[["x"] * max_decoding_length], scores=[-2.0]
+                        )
+                        for t in toks
+                    ]
+                )
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            translator_instance(
+                "First one. Second one. Third one.",
+                max_decoding_length=8,
+                adaptive_beam_threshold=-1.0,
+            )
+            assert mock_trans.call_count == 2
+            # Discarded greedy translations are not counted
+            assert stats[0]["length_limit_hits"] == 3
+
+    def test_decoding_limits_disabled(self, translator_instance):
+        assert translator_instance._decoding_limits([["a"] * 5, ["b"]], 256) == [
+            256,
+            256,
+        ]
+
+    def test_max_sentence_tokens(self, translator_instance):
+        stats = []
+        translator_instance.add_hook(stats.append)
+        src = "One two three; four five six, seven eight nine ten eleven\nShort one."
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [
+                s.split() + ["</s>"] for s in sents
+            ]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t[:-1]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [" ".join(t) for t in toks]
+
+            result = translator_instance(src, max_sentence_tokens=4)
+            # Pieces are translated separately and joined back in place
+            assert result == src
+            assert mock_trans.call_args.args[0] == [
+                ["One", "two", "three;", "</s>"],
+                ["four", "five", "six,", "</s>"],
+                ["seven", "eight", "</s>"],
+                ["nine", "ten", "</s>"],
+                ["eleven", "</s>"],
+                ["Short", "one.", "</s>"],
+            ]
+            assert stats[0]["segmented_sentences"] == 1
+
+    def test_max_sentence_tokens_short(self, translator_instance):
+        with patch.object(Translator, "tokenize") as mock_tok:
+            mock_tok.side_effect = lambda sents, **kwargs: [
+                s.split() + ["</s>"] for s in sents
+            ]
+            result = translator_instance._segment_long_sentences(
+                [0, 0], [0, 1], ["Short one.", "Another one."], 50
+            )
+            assert result == ([0, 0], [0, 1], ["Short one.", "Another one."])
+            # All sentences are counted in one call
+            mock_tok.assert_called_once()
+
+    def test_max_sentence_tokens_no_spaces(self, translator_instance):
+        # Byte fallback: each character is three pieces, so "abcd" is 13 tokens with </s>
+        pieces = lambda text: [
+            f"<0x{b:02X}>" for c in text for b in chr(0x4E00 + ord(c)).encode()
+        ]
+        tokenizer = translator_instance.source_tokenizer
+        tokenizer.encode.side_effect = lambda texts, **kwargs: (
+            [pieces(t) for t in texts] if isinstance(texts, list) else pieces(texts)
+        )
+        tokenizer.decode.side_effect = lambda toks: "".join(
+            chr(ord(c) - 0x4E00) for c in bytes(int(t[3:5], 16) for t in toks).decode()
+        )
+
+        result = translator_instance._segment_long_sentences([0], [0], ["abcd"], 9)
+        # Windows of up to 7 pieces, cut back so no character is split
+        assert list(result[2]) == ["ab", "cd"]
+        assert list(result[0]) == [0, 0]
+
+    def test_mask_placeholders(self, translator_instance):
+        stats = []
+        translator_instance.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [s.split() for s in sents]
+            # The model reorders the placeholders and drops the last one
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[["Voir", "[2]", "ou", "[1]"]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [" ".join(t) for t in toks]
+
+            result = translator_instance(
+                "See https://example.com/a or v2.0.1 in 2024.", mask_placeholders=True
+            )
+            assert mock_tok.call_args.args[0] == ["See [1] or [2] in [3]."]
+            assert result == "Voir v2.0.1 ou https://example.com/a"
+            assert stats[0]["masked_spans"] == 3
+            assert stats[0]["missing_placeholders"] == 1
+            assert "mask_placeholders" not in mock_trans.call_args.kwargs
+
+    def test_translate_segments(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+            patch.object(Translator, "_split_sentences") as mock_split,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [
+                s.split() + ["</s>"] for s in sents
+            ]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[[p.upper() for p in t[:-1]]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [" ".join(t) for t in toks]
+
+            # Sentences are not split again, even with several sentences in one
+            result = translator_instance.translate_segments(
+                ["Hi there. Bye.", "Ok then"]
+            )
+            assert result == ["HI THERE. BYE.", "OK THEN"]
+            assert mock_tok.call_args.args[0] == ["Hi there. Bye.", "Ok then"]
+
+            # Tokens go straight to translate_batch
+            mock_tok.reset_mock()
+            result = translator_instance.translate_segments(
+                [["▁Hi", "▁there"], ["▁Ok", "</s>"]],
+                input_format="tokens",
+                output_format="tokens",
+            )
+            assert result == [["▁HI", "▁THERE"], ["▁OK"]]
+            assert mock_trans.call_args.args[0] == [
+                ["▁Hi", "▁there", "</s>"],
+                ["▁Ok", "</s>"],
+            ]
+            mock_tok.assert_not_called()
+            mock_split.assert_not_called()
+
+        with pytest.raises(ValueError):
+            translator_instance.translate_segments(["Hi"], input_format="text")
+
+    def test_translate_document(
+        self, temp_model_dir, mock_ctranslate2, mock_sentencepiece
+    ):
+        translator = Translator(temp_model_dir, document_cache_size=2)
+        stats = []
+        translator.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [f"T({t[0]})" for t in toks]
+
+            doc = "First line. Second one.\nThird line.\nFourth line."
+            assert translator.translate_document(doc, "doc") == translator(doc)
+
+            edited = "First line. Second one.\nThird line, edited.\n\nFourth line."
+            result = translator.translate_document(edited, "doc")
+            assert result == translator(edited)
+            assert mock_tok.call_args_list[-2].args[0] == ["Third line, edited."]
+            assert stats[-2]["reused_paragraphs"] == 2
+            assert stats[-2]["reused_sentences"] == 3
+            assert mock_trans.call_args.kwargs["beam_size"] == 2
+
+            # Other translation args do not reuse the last version
+            translator.translate_document(edited, "doc", beam_size=4)
+            assert mock_tok.call_args.args[0] == [
+                "First line.",
+                "Second one.",
+                "Third line, edited.",
+                "Fourth line.",
+            ]
+
+    def test_translate_document_reuse_prefix(
+        self, temp_model_dir, mock_ctranslate2, mock_sentencepiece
+    ):
+        translator = Translator(temp_model_dir, document_cache_size=2)
+        stats = []
+        translator.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+            patch.object(Translator, "_target_tokens") as mock_target,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [s.split() for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[[w.upper() for w in t]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [" ".join(t) for t in toks]
+            mock_target.side_effect = lambda sents, **kwargs: [s.split() for s in sents]
+
+            translator.translate_document(
+                "Done here. The cat sat", "s", reuse_prefix=True, revision=1
+            )
+            result = translator.translate_document(
+                "Done here. The cat sat on the mat", "s", reuse_prefix=True, revision=2
+            )
+            assert result == "DONE HERE. THE CAT SAT ON THE MAT"
+            # Only the extended sentence is decoded, its previous translation less 2 tokens is the prefix
+            assert mock_trans.call_args.args[0] == [
+                ["The", "cat", "sat", "on", "the", "mat"]
+            ]
+            assert mock_trans.call_args.kwargs["target_prefix"] == [["THE"]]
+            assert stats[-1]["prefixed_sentences"] == 1
+
+            # A late request for an older revision does not replace the stored version
+            translator.translate_document(
+                "Done here.", "s", reuse_prefix=True, revision=1
+            )
+            assert translator.document_cache["s"].revision == 2
+
+    def test_target_prefix_batches(self, translator_instance):
+        with patch.object(Translator, "translate_batch") as mock_trans:
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [
+                    MagicMock(hypotheses=[p or ["x"]])
+                    for t, p in zip(toks, kwargs["target_prefix"])
+                ]
+            )
+            results = translator_instance._translate_tokens(
+                [["a"] * 9, ["b"], ["c"] * 5],
+                max_batch_tokens=10,
+                target_prefix=[["A"], None, ["C"]],
+            )
+            # Prefixes follow their sentences through length-sorted batching
+            assert [r.hypotheses[0] for r in results] == [["A"], ["x"], ["C"]]
+
+    def test_translate_markup(self, translator_instance):
+        with patch.object(Translator, "__call__") as mock_call:
+            mock_call.side_effect = lambda src, **kwargs: [s.upper() for s in src]
+            result = translator_instance.translate_markup(
+                ["<p>Hello <b>world</b></p><pre>x</pre>", "<div><p>Bye</p></div>", ""],
+                beam_size=1,
+            )
+            assert result == [
+                "<p>HELLO <b>WORLD</b></p><pre>x</pre>",
+                "<div><p>BYE</p></div>",
+                "",
+            ]
+            # The text of all documents is translated in one call
+            mock_call.assert_called_once_with(["Hello [1]world[2]", "Bye"], beam_size=1)
+
+    def test_translate_json(self, translator_instance):
+        with patch.object(Translator, "__call__") as mock_call:
+            mock_call.side_effect = lambda src, **kwargs: [s.upper() for s in src]
+            result = translator_instance.translate_json(
+                {"a": "Hi", "b": [{"c": "Hi"}, {"c": "Bye", "d": "id"}]},
+                selectors=["a", "b.*.c"],
+                beam_size=1,
+            )
+            assert result == {"a": "HI", "b": [{"c": "HI"}, {"c": "BYE", "d": "id"}]}
+            # One call with each selected string once
+            mock_call.assert_called_once_with(["Hi", "Bye"], beam_size=1)
+
+            assert translator_instance.translate_json({"a": 1}) == {"a": 1}
+            assert mock_call.call_count == 1
+
+    def test_sentence_cache(self, temp_model_dir, mock_ctranslate2, mock_sentencepiece):
+        translator = Translator(temp_model_dir, sentence_cache_size=10)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [f"T({t[0]})" for t in toks]
+
+            translator("Hello world. Shared sentence.")
+            result = translator("Shared sentence. Something new.")
+            assert result == "T(Shared sentence.) T(Something new.)"
+
+            # Only the new sentence is tokenized and decoded on the second call
+            assert mock_tok.call_args.args[0] == ["Something new."]
+            assert translator.sentence_cache_info()["hits"] == 1
+            assert translator.sentence_cache_info()["misses"] == 3
+
+            # Different decoding parameters do not share cache entries
+            translator("Shared sentence.", beam_size=1)
+            assert mock_tok.call_args.args[0] == ["Shared sentence."]
+
+    def test_deduplicate_sentences(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [f"T({t[0]})" for t in toks]
+
+            footer = "All rights reserved."
+            result = translator_instance(
+                [f"Item one. {footer}", f"Item two. {footer}", footer]
+            )
+            assert result == [
+                "T(Item one.) T(All rights reserved.)",
+                "T(Item two.) T(All rights reserved.)",
+                "T(All rights reserved.)",
+            ]
+            # Each distinct sentence is decoded once
+            assert mock_tok.call_args.args[0] == [
+                "Item one.",
+                footer,
+                "Item two.",
+            ]
+            assert translator_instance.counters["deduplicated_sentences"] == 2
+
+    def test_skip_untranslatable(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [f"T({t[0]})" for t in toks]
+
+            src = ["Hello there.", "$1,299.99", "https://quickmt.com"]
+            result = translator_instance(src)
+            assert result == ["T(Hello there.)", "$1,299.99", "https://quickmt.com"]
+            mock_tok.assert_called_once()
+            assert mock_tok.call_args.args[0] == ["Hello there."]
+            assert translator_instance.counters["passthrough_sentences"] == 2
+
+            result = translator_instance(src, skip_untranslatable=False)
+            assert result[1] == "T($1,299.99)"
+
+    def test_hooks(self, translator_instance):
+        calls = []
+        translator_instance.add_hook(calls.append)
+        translator_instance.add_hook(MagicMock(side_effect=RuntimeError("broken")))
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s, "</s>"] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t[:1]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            # A failing hook does not fail the translation
+            result = translator_instance(["First one. Second one.", "Third one."])
+            assert result == ["First one. Second one.", "Third one."]
+
+        (stats,) = calls
+        for stage in ["split", "tokenize", "translate_batch", "detokenize", "join"]:
+            assert stats[f"{stage}_time"] >= 0
+        assert stats["inputs"] == 2
+        assert stats["sentences"] == 3
+        assert stats["batches"] == 1
+        assert stats["source_tokens"] == 6
+        assert stats["target_tokens"] == 3
+        assert translator_instance.counters["sentences"] == 3
+
+        translator_instance.remove_hook(calls.append)
+        translator_instance.hooks.clear()
+
+    def test_report_threads(self, translator_instance):
+        threads = [
+            threading.Thread(
+                target=lambda: [
+                    translator_instance._report({"inputs": 1, "sentences": 2})
+                    for _ in range(1000)
+                ]
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert translator_instance.counters["inputs"] == 8000
+        assert translator_instance.counters["sentences"] == 16000
+
+    def test_hooks_count_batches(self, translator_instance):
+        calls = []
+        translator_instance.add_hook(calls.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s, "</s>"] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t[:1]]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            translator_instance([f"Sentence {i}." for i in range(5)], max_batch_size=2)
+
+        # One translate_batch call, which CTranslate2 runs as three batches
+        assert mock_trans.call_count == 1
+        assert calls[0]["batches"] == 3
+
+    def test_sentence_cache_disabled(self, translator_instance):
+        assert translator_instance.sentence_cache is None
+        assert translator_instance.sentence_cache_info()["maxsize"] == 0
+
+    async def test_translate_async(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: [
+                MagicMock(
+                    **{"done.return_value": True, "result.return_value.hypotheses": [t]}
+                )
+                for t in toks
+            ]
+            mock_detok.side_effect = lambda toks, **kwargs: [f"T({t[0]})" for t in toks]
+
+            result = await translator_instance.translate_async(
+                ["First one. Second one.", "", "Third one."]
+            )
+            assert result == ["T(First one.) T(Second one.)", "", "T(Third one.)"]
+            assert mock_trans.call_args.kwargs["asynchronous"] is True
+
+            assert await translator_instance.translate_async("") == ""
+
+    async def test_translate_async_polling(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+            patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: [
+                MagicMock(
+                    **{
+                        "done.side_effect": [False] * 10 + [True],
+                        "result.return_value.hypotheses": [t],
+                    }
+                )
+                for t in toks
+            ]
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            assert await translator_instance.translate_async("One more.") == "One more."
+            # Polling backs off, but never sleeps more than a couple of milliseconds
+            delays = [c.args[0] for c in mock_sleep.call_args_list]
+            assert len(delays) == 10
+            assert delays[0] < delays[-1] <= 0.002
+
+            # Concurrent requests share one polling task
+            pollers = []
+            mock_sleep.side_effect = lambda delay: pollers.append(
+                sum(
+                    task.get_coro().__qualname__ == "_ResultPoller._poll"
+                    for task in asyncio.all_tasks()
+                )
+            )
+            results = await asyncio.gather(
+                *[
+                    translator_instance.translate_async(f"Request {i}.")
+                    for i in range(5)
+                ]
+            )
+            assert results == [f"Request {i}." for i in range(5)]
+            assert pollers and set(pollers) == {1}
+
     def test_translate_stream(self, translator_instance):
-        translator_instance.translator.translate_iterable = MagicMock(
-            return_value=[
-                MagicMock(hypotheses=[["hypo1"]]),
-                MagicMock(hypotheses=[["hypo2"]]),
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: [
+                MagicMock(**{"result.return_value.hypotheses": [t]}) for t in toks
+            ]
+            mock_detok.side_effect = lambda toks, **kwargs: [
+                f"Detok {t[0]}" for t in toks
             ]
+
+            src = (f"Sentence {i}." for i in range(5))
+            results = list(translator_instance.translate_stream(src, max_batch_size=2))
+            assert len(results) == 5
+            assert results[0]["translation"] == "Detok Sentence 0."
+            assert results[4]["translation"] == "Detok Sentence 4."
+            assert [r["input_idx"] for r in results] == [0, 1, 2, 3, 4]
+
+            # Batches are decoded asynchronously and detokenized together
+            assert mock_trans.call_count == 3
+            assert mock_trans.call_args.kwargs["asynchronous"] is True
+            assert mock_detok.call_count == 3
+
+    def test_translate_stream_matches_call(
+        self, temp_model_dir, mock_ctranslate2, mock_sentencepiece
+    ):
+        translator = Translator(
+            temp_model_dir, sentence_cache_size=10, max_decoding_length_ratio=1.0
         )
+        stats = []
+        translator.add_hook(stats.append)
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: as_async(
+                [MagicMock(hypotheses=[t]) for t in toks]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            src = ["Hello there.", "Hello there.", "12:30", "Bye now."]
+            results = list(translator.translate_stream(src, max_batch_size=8))
+            assert [r["translation"] for r in results] == src
+            # Repeats and untranslatable sentences are not decoded, limits follow the ratio
+            assert mock_trans.call_args.args[0] == [["Hello there."], ["Bye now."]]
+            assert mock_trans.call_args.kwargs["max_decoding_length"] == 16
+            assert stats[0]["deduplicated_sentences"] == 1
+            assert stats[0]["passthrough_sentences"] == 1
+
+            # The sentence cache is shared with __call__
+            mock_trans.reset_mock()
+            assert translator(src, beam_size=5) == src
+            mock_trans.assert_not_called()
+
+    def test_translate_stream_lazy(self, translator_instance):
+        consumed = []
+
+        def source():
+            for i in range(100):
+                consumed.append(i)
+                yield f"Sentence {i}."
 
         with (
             patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "translate_batch") as mock_trans,
             patch.object(Translator, "detokenize") as mock_detok,
         ):
-            mock_tok.return_value = [["tok1"], ["tok2"]]
-            mock_detok.side_effect = lambda x: [f"Detok {x[0][0]}"]
+            mock_tok.side_effect = lambda sents, **kwargs: [[s] for s in sents]
+            mock_trans.side_effect = lambda toks, **kwargs: [
+                MagicMock(**{"result.return_value.hypotheses": [t]}) for t in toks
+            ]
+            mock_detok.side_effect = lambda toks, **kwargs: [t[0] for t in toks]
+
+            stream = translator_instance.translate_stream(
+                source(), max_batch_size=4, prefetch=1
+            )
+            next(stream)
+            # Only the current batch and one batch of look-ahead were read
+            assert len(consumed) == 8
 
-            results = list(translator_instance.translate_stream(["Sent 1.", "Sent 2."]))
-            assert len(results) == 2
-            assert results[0]["translation"] == "Detok hypo1"
-            assert results[1]["translation"] == "Detok hypo2"
+    def test_translate_tokens_stream(self, translator_instance):
+        with (
+            patch.object(Translator, "tokenize") as mock_tok,
+            patch.object(Translator, "generate_tokens") as mock_gen,
+            patch.object(Translator, "translate_batch") as mock_trans,
+            patch.object(Translator, "detokenize") as mock_detok,
+        ):
+            mock_tok.side_effect = lambda sents, **kwargs: [
+                s.split() + ["</s>"] for s in sents
+            ]
+            mock_gen.side_effect = lambda toks, **kwargs: iter(
+                MagicMock(token=t.upper()) for t in toks[:-1]
+            )
+            mock_detok.side_effect = lambda toks, **kwargs: [" ".join(t) for t in toks]
+
+            pieces = list(
+                translator_instance.translate_tokens_stream(
+                    "Hi there. How are you?\n42"
+                )
+            )
+            # Token by token, with the separators of `__call__`
+            assert pieces == ["HI", " THERE.", " ", "HOW", " ARE", " YOU?", "\n", "42"]
+            assert mock_gen.call_count == 2
+            mock_trans.assert_not_called()
+
+            # Text is held back while the last token ends in a split character
+            mock_detok.side_effect = lambda toks, **kwargs: [
+                " ".join(t).replace("<0XC3> <0XA9>", "é").replace("<0XC3>", "\ufffd")
+                for t in toks
+            ]
+            pieces = list(
+                translator_instance.translate_tokens_stream("caf <0xC3> <0xA9>")
+            )
+            assert pieces == ["CAF", " é"]
 
     def test_translate_file(self, translator_instance, tmp_path):
         input_file = tmp_path / "input.txt"
@@ -145,6 +983,57 @@ class TestTranslator:
             content = output_file.read_text()
             assert content == "Trans 1\nTrans 2\n"
 
+    def test_translate_file_chunked(self, translator_instance, tmp_path):
+        input_file = tmp_path / "input.txt"
+        output_file = tmp_path / "output.txt"
+        input_file.write_text("".join(f"Line {i}\n" for i in range(5)))
+
+        with patch.object(Translator, "__call__") as mock_call:
+            mock_call.side_effect = lambda src, **kwargs: [f"T {i}" for i in src]
+            translator_instance.translate_file(
+                str(input_file), str(output_file), chunk_size=2
+            )
+
+            assert mock_call.call_count == 3
+            assert output_file.read_text() == "".join(f"T Line {i}\n" for i in range(5))
+            # Checkpoint is removed once the file is done
+            assert not (tmp_path / "output.txt.checkpoint").exists()
+
+    def test_translate_file_resume(self, translator_instance, tmp_path):
+        input_file = tmp_path / "input.txt"
+        output_file = tmp_path / "output.txt"
+        input_file.write_text("Line 0\nLine 1\nLine 2\n")
+        # Interrupted job: 1 line checkpointed, a partial chunk written after it
+        output_file.write_text("T Line 0\nT Line 1\n")
+        (tmp_path / "output.txt.checkpoint").write_text("1")
+
+        with patch.object(Translator, "__call__") as mock_call:
+            mock_call.side_effect = lambda src, **kwargs: [f"T {i}" for i in src]
+            translator_instance.translate_file(
+                str(input_file), str(output_file), resume=True
+            )
+
+            mock_call.assert_called_once()
+            assert mock_call.call_args.args[0] == ["Line 1", "Line 2"]
+            assert output_file.read_text() == "T Line 0\nT Line 1\nT Line 2\n"
+
+    def test_translate_file_resume_missing_output(self, translator_instance, tmp_path):
+        input_file = tmp_path / "input.txt"
+        output_file = tmp_path / "output.txt"
+        input_file.write_text("Line 0\nLine 1\n")
+        (tmp_path / "output.txt.checkpoint").write_text("1")
+
+        with patch.object(Translator, "__call__") as mock_call:
+            mock_call.side_effect = lambda src, **kwargs: [f"T {i}" for i in src]
+            translator_instance.translate_file(
+                str(input_file), str(output_file), resume=True
+            )
+
+        # The output was deleted, so the whole file is translated again
+        assert mock_call.call_args.args[0] == ["Line 0", "Line 1"]
+        assert output_file.read_text() == "T Line 0\nT Line 1\n"
+        assert not (tmp_path / "output.txt.checkpoint").exists()
+
     def test_translate_batch(self, translator_instance):
         translator_instance.translate_batch(
             [["tok"]],
@@ -0,0 +1,51 @@
+import shutil
+from unittest.mock import MagicMock
+
+from quickmt import Translator
+from quickmt.benchmark import synthetic_sentences
+from quickmt.vmap import build_vmap, load_vmap, save_vmap
+
+
+def test_build_vmap_parallel():
+    translator = MagicMock()
+    translator.tokenize.side_effect = lambda sents: [
+        s.split() + ["</s>"] for s in sents
+    ]
+    translator.target_tokenizer.encode.side_effect = lambda sents, out_type: [
+        s.split() for s in sents
+    ]
+    source = ["chat noir", "chat blanc", "chien noir", "chat"]
+    target = ["the black cat", "the white cat", "the black dog", "the cat"]
+
+    vmap = build_vmap(translator, source, target, num_fixed=1, min_count=1, top_k=2)
+    assert vmap[""] == ["the"]
+    assert vmap["chat"] == ["cat", "white"]
+    assert vmap["noir"] == ["black", "dog"]
+    assert "</s>" not in vmap
+
+
+def test_save_load_vmap(tmp_path):
+    vmap = {"": ["the", "."], "chat": ["cat"]}
+    save_vmap(vmap, tmp_path / "vmap.txt")
+    assert (tmp_path / "vmap.txt").read_text() == "\tthe .\nchat\tcat\n"
+    assert load_vmap(tmp_path / "vmap.txt") == vmap
+
+
+def test_use_vmap(synthetic_model, tmp_path):
+    model_dir = tmp_path / "model"
+    shutil.copytree(synthetic_model, model_dir)
+    src = synthetic_sentences(20)
+
+    vmap = build_vmap(Translator(model_dir), src, num_fixed=5, max_decoding_length=8)
+    save_vmap(vmap, model_dir / "vmap.txt")
+    allowed = {token for tokens in vmap.values() for token in tokens}
+
+    translator = Translator(model_dir, use_vmap=True)
+    assert translator.use_vmap
+    input_text = translator.tokenize(src)
+    for result in translator.translate_batch(input_text, max_decoding_length=8):
+        assert set(result.hypotheses[0]) <= allowed | {"<unk>", "<s>", "</s>"}
+
+
+def test_use_vmap_missing(synthetic_model):
+    assert not Translator(synthetic_model, use_vmap=True).use_vmap